@@ -1,9 +1,11 @@
 # Streamlit portfolio prototype (equal-weight, monthly rebalance)
 # Reads: data_raw/equities_de_daily.csv  with columns: date, Ticker, Close_EUR
+#        (or the columnar store data_raw/equities_de_daily.arrow next to it, if present)
 
 from __future__ import annotations
-import math
-from typing import Optional, Tuple
+import os
+import time
+from typing import Callable, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -12,247 +14,235 @@ import streamlit as st
 import plotly.graph_objects as go
 import plotly.express as px
 
+from backtest import data, diagnostics, duck, riskfree
+from backtest.covariance import CovarianceEngine
+from backtest.cache import ResultCache, cache_key, dataset_version
+from backtest.diagnostics import stage
+from backtest.downsample import POINT_BUDGET, WINDOWS, downsample, window
+from backtest.garch import GarchCache, garch_panel, try_garch
+from backtest.jobs import Job, JobQueue, QueueFull
+from backtest.panel import ReturnPanel
+from backtest.rebalance import WEIGHTS, calendar_rows, live_targets, portfolio_engine
+from backtest.rolling import rolling_risk
+from backtest.simulate import bootstrap_var_es
+from backtest.store import PriceStore, normalize_prices, store_path_for
+from backtest.windows import WindowIndex, calendar_windows, rolling_windows
+
 # ---------- Settings ----------
 DEFAULT_TICKERS = ["SAP.DE", "SIE.DE", "ALV.DE", "BAS.DE", "BMW.DE"]
-TRADING_DAYS = 252
-
-# ---------- Utils ----------
-def norm_ppf(p: float) -> float:
-    """Inverse CDF of standard normal (Acklam's rational approximation).
-       No SciPy dependency; good to ~1e-6 on (0,1).
-    """
-    if not (0.0 < p < 1.0):
-        raise ValueError("p must be in (0,1)")
-    a = [-3.969683028665376e+01,  2.209460984245205e+02,
-         -2.759285104469687e+02,  1.383577518672690e+02,
-         -3.066479806614716e+01,  2.506628277459239e+00]
-    b = [-5.447609879822406e+01,  1.615858368580409e+02,
-         -1.556989798598866e+02,  6.680131188771972e+01,
-         -1.328068155288572e+01]
-    c = [-7.784894002430293e-03, -3.223964580411365e-01,
-         -2.400758277161838e+00, -2.549732539343734e+00,
-          4.374664141464968e+00,  2.938163982698783e+00]
-    d = [ 7.784695709041462e-03,  3.224671290700398e-01,
-          2.445134137142996e+00,  3.754408661907416e+00]
-    plow = 0.02425
-    phigh = 1 - plow
-    if p < plow:
-        q = math.sqrt(-2 * math.log(p))
-        return (((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / \
-               ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
-    if phigh < p:
-        q = math.sqrt(-2 * math.log(1 - p))
-        return -(((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / \
-                 ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
-    q = p - 0.5
-    r = q*q
-    return (((((a[0]*r + a[1])*r + a[2])*r + a[3])*r + a[4])*r + a[5]) * q / \
-           (((((b[0]*r + b[1])*r + b[2])*r + b[3])*r + b[4])*r + 1)
-
-def month_key(d: pd.Series) -> pd.Series:
-    return d.dt.to_period("M").dt.to_timestamp()
-
-def max_drawdown(equity: pd.Series) -> float:
-    roll_max = equity.cummax()
-    return (equity / roll_max - 1.0).min()
-
-def cagr(equity: pd.Series, trading_days=TRADING_DAYS) -> float:
-    if equity.empty:
-        return np.nan
-    total_return = equity.iloc[-1] / equity.iloc[0] - 1.0
-    years = len(equity) / trading_days
-    return (1.0 + total_return) ** (1.0 / years) - 1.0 if years > 0 else np.nan
+WEIGHTINGS = {"Equal": "equal", "Inverse volatility (63D)": "inverse_vol", "Minimum variance (126D)": "min_variance"}
+REBALANCES = {"Monthly": "monthly", "Weekly": "weekly", "Daily": "daily", "Drift band": "threshold"}
+BACKENDS = {"pandas": "pandas", "DuckDB (SQL pushdown, equal weight / monthly)": "duckdb"}
+GARCH_MODES = {"Full sample": "full", "Expanding refits (21D)": "expanding", "Rolling refits (1000D window, 21D)": "rolling"}
+RISK_FREE = {"Constant": None, "Bund 0.5Y": 0.5, "Bund 1Y": 1.0, "Bund 5Y": 5.0, "Bund 10Y": 10.0,
+             "Bund curve (interpolated maturity)": "custom"}
+GL_THRESHOLD = 5000  # points per figure above which traces render with WebGL (Scattergl)
+POLL_SECONDS = 0.5   # rerun interval while a background job is queued / running
 
 # ---------- Data loading / transforms (cached) ----------
 @st.cache_data(show_spinner=False)
 def load_prices(csv_path: Path, sig: Tuple[int, int]) -> pd.DataFrame:
     """Read CSV and normalize columns. 'sig' = (mtime, size) for cache invalidation."""
-    df = pd.read_csv(csv_path)
-    cols = {c.lower().strip(): c for c in df.columns}
-    date_col = cols.get("date") or cols.get("dt")
-    if not date_col:
-        st.error("CSV must contain a 'date' or 'dt' column.")
-        st.stop()
-    if "ticker" not in [c.lower() for c in df.columns]:
-        st.error("CSV must contain a 'Ticker' column.")
-        st.stop()
-    price_col = None
-    for guess in ["Close_EUR", "close_eur", "close", "adj_close", "Adj Close"]:
-        if guess in df.columns:
-            price_col = guess
-            break
-    if price_col is None:
-        st.error("Could not find a price column (e.g., Close_EUR).")
+    try:
+        return normalize_prices(pd.read_csv(csv_path))
+    except ValueError as e:
+        st.error(str(e))
         st.stop()
 
-    df = df.rename(columns={date_col: "dt", "Ticker": "ticker", price_col: "price"})
-    df["dt"] = pd.to_datetime(df["dt"])
-    df["ticker"] = df["ticker"].str.upper()
-    df = df.sort_values(["ticker", "dt"]).dropna(subset=["price"]).reset_index(drop=True)
-    return df[["dt", "ticker", "price"]]
-
-@st.cache_data(show_spinner=False)
-def compute_returns(df_prices: pd.DataFrame) -> pd.DataFrame:
-    df = df_prices.sort_values(["ticker", "dt"]).copy()
-    df["r"] = df.groupby("ticker")["price"].pct_change()
-    return df.dropna(subset=["r"])
+@st.cache_resource(show_spinner=False)
+def open_store(store_path: Path, sig: Tuple[int, int]) -> Optional[PriceStore]:
+    """Memory-mapped columnar store, or None if missing / pyarrow unavailable (CSV fallback)."""
+    try:
+        return PriceStore(store_path)
+    except (ImportError, OSError, KeyError):
+        return None
 
 @st.cache_data(show_spinner=False)
-def run_engine_cached(
-    r_df: pd.DataFrame,
+def load_prices_store(
+    store_path: Path,
+    sig: Tuple[int, int],
     tickers: Tuple[str, ...],
-    start_cash: float,
-    tc_bps: float,
-    rf_annual: float,
     start_date: Optional[pd.Timestamp],
     end_date: Optional[pd.Timestamp],
-    alpha: float,
-):
-    return portfolio_engine_equal_monthly(
-        r_df, list(tickers), start_cash, tc_bps/10000.0, rf_annual, start_date, end_date, alpha
+) -> pd.DataFrame:
+    """Selected tickers / date range only, read from the memory-mapped store."""
+    return open_store(store_path, sig).load(tickers, start_date, end_date)
+
+@st.cache_resource(show_spinner=False)
+def result_cache() -> ResultCache:
+    """Results keyed by dataset version + parameters; the Parquet tier survives restarts."""
+    return ResultCache(Path(__file__).resolve().parent / ".cache" / "results")
+
+@st.cache_resource(show_spinner=False)
+def job_queue() -> JobQueue:
+    """One worker pool per server, shared by all sessions; identical runs are computed once.
+    BACKTEST_JOB_BACKEND (thread|process), BACKTEST_JOB_WORKERS, BACKTEST_JOB_QUEUE."""
+    return JobQueue(
+        backend=os.environ.get("BACKTEST_JOB_BACKEND", "thread"),
+        max_workers=int(os.environ.get("BACKTEST_JOB_WORKERS", "2")),
+        max_queue=int(os.environ.get("BACKTEST_JOB_QUEUE", "32")),
+        store=result_cache(),
     )
 
-# ---------- Engine ----------
-def portfolio_engine_equal_monthly(
-    r_df: pd.DataFrame,
-    tickers: list[str],
+def await_job(job: Job, label: str):
+    """Result of a finished job (its diagnostics records join this run's); otherwise show its
+    progress and poll with a rerun."""
+    if job.status == "done":
+        diagnostics.records().extend({**r, "job": label} for r in job.records)
+        return job.result()
+    if job.status == "failed":
+        st.error(f"{label} failed: {job.message}")
+        st.stop()
+    st.progress(job.progress, text=f"{label}: {job.status}… {job.message}".strip())
+    time.sleep(POLL_SECONDS)
+    st.rerun()
+
+def submit_job(parts: tuple, label: str, fn: Callable, build_args: Callable[[], tuple], **kwargs):
+    """find-or-submit on the shared queue; build_args() only runs if nothing is cached/in flight."""
+    queue = job_queue()
+    job = queue.find(parts)
+    if job is None:
+        try:
+            job = queue.submit(parts, fn, *build_args(), **kwargs)
+        except QueueFull:
+            st.warning(f"{label}: the job queue is full, retrying…")
+            time.sleep(POLL_SECONDS * 4)
+            st.rerun()
+    return await_job(job, label)
+
+@st.cache_resource(show_spinner=False)
+def duck_source(db_path: Path, csv_path: Path):
+    """(connection, price relation): equities_daily in data.duckdb if present, else the raw CSV."""
+    if db_path.exists():
+        return duck.connect(db_path), duck.PRICES
+    return duck.connect(), duck.csv_prices(csv_path)
+
+def run_engine_cached(
+    version: str,
+    load: Callable[[], pd.DataFrame],
+    tickers: Tuple[str, ...],
     start_cash: float,
-    tc_pct: float,
-    rf_annual: float,
+    tc_bps: float,
+    rf_annual,
     start_date: Optional[pd.Timestamp],
     end_date: Optional[pd.Timestamp],
-    alpha: float = 0.95,
+    alpha: float,
+    weights: str,
+    rebalance: str,
+    band: float,
+    backend: str = "pandas",
 ):
-    """Return: daily (DataFrame), summary (dict), wide_ret (DataFrame), turnover (Series by month)."""
-    df = r_df[r_df["ticker"].isin([t.upper() for t in tickers])].copy()
-    if start_date is not None:
-        df = df[df["dt"] >= start_date]
-    if end_date is not None:
-        df = df[df["dt"] <= end_date]
-    if df.empty:
-        return pd.DataFrame(), {}, pd.DataFrame(), pd.Series(dtype=float)
-
-    # Pivot to wide; require full basket each day to keep it simple
-    wide = df.pivot(index="dt", columns="ticker", values="r").sort_index().dropna(how="any")
-    tickers = list(wide.columns)
-
-    mkey = month_key(wide.index.to_series())
-    months = mkey.unique()
-
-    w_equal = pd.Series(1.0 / len(tickers), index=tickers)
-
-    # Monthly gross return per ticker: Π(1+r) - 1
-    g_month = wide.groupby(mkey).apply(lambda g: (1.0 + g).prod() - 1.0).sort_index()
-
-    # Turnover between drifted end-of-month weights and next month's equal target
-    turnover = pd.Series(0.0, index=months)
-    for i, m in enumerate(months):
-        if i == 0:
-            continue
-        prev = months[i - 1]
-        grow = 1.0 + g_month.loc[prev]
-        w_end = (w_equal * grow)
-        w_end = w_end / w_end.sum()
-        turnover.iloc[i] = float((w_end - w_equal).abs().sum())
-
-    # Daily portfolio return (weights = equal within month)
-    r_port = (wide * w_equal.values).sum(axis=1)
-
-    # Apply transaction cost on first trading day of each month (except first)
-    cost_applied = pd.Series(0.0, index=r_port.index)
-    for i, m in enumerate(months):
-        day = r_port.index[mkey[r_port.index] == m][0]
-        if i == 0:
-            continue
-        cost = tc_pct * turnover.iloc[i]
-        cost_applied.loc[day] = cost
-        r_port.loc[day] = r_port.loc[day] - cost
-
-    equity = start_cash * (1.0 + r_port).cumprod()
-
-    # Risk / summary
-    ann_mu = r_port.mean() * TRADING_DAYS
-    ann_sigma = r_port.std(ddof=1) * np.sqrt(TRADING_DAYS)
-    sharpe = (ann_mu - rf_annual) / ann_sigma if ann_sigma > 0 else np.nan
-    mdd = max_drawdown(equity)
-    total_return = equity.iloc[-1] / equity.iloc[0] - 1.0
-    cagr_val = cagr(equity, TRADING_DAYS)
-
-    # VaR/ES (daily) at chosen alpha
-    z = norm_ppf(alpha)
-    mu_d, sd_d = r_port.mean(), r_port.std(ddof=1)
-    var_norm = -(mu_d - z * sd_d)  # VaR reported as positive loss fraction
-    losses = -r_port.dropna()
-    var_hist = losses.quantile(alpha)
-    es_hist = losses[losses >= var_hist].mean()
-
-    daily = pd.DataFrame({
-        "dt": r_port.index,
-        "r_port": r_port.values,
-        "equity": equity.values,
-        "m": mkey[r_port.index].values,
-        "cost_applied": cost_applied.values
-    }).set_index("dt")
-
-    summary = {
-        "Final Equity": float(equity.iloc[-1]),
-        "Total Return": float(total_return),
-        "CAGR": float(cagr_val),
-        "Ann. Vol": float(ann_sigma),
-        "Ann. Sharpe": float(sharpe),
-        "Max Drawdown": float(mdd),
-        "VaR (norm, daily)": float(var_norm),
-        "VaR (hist, daily)": float(var_hist),
-        "ES (hist, daily)": float(es_hist),
-        "Turnover (avg/month)": float(turnover.iloc[1:].mean()) if len(turnover) > 1 else 0.0
-    }
-
-    return daily, summary, wide, turnover
-
-def try_garch(portfolio_returns: pd.Series):
+    """'load' (prices for the selection) is only called on a cache miss (pandas backend).
+    The pandas engine runs as a background job; the DuckDB pushdown runs inline (already
+    multi-threaded inside DuckDB)."""
+    if backend == "duckdb":
+        key = ("engine_duckdb", version, tickers, start_cash, tc_bps, rf_annual, start_date, end_date, alpha)
+        con, prices = duck_source(root / "data.duckdb", csv_path)
+        return result_cache().get_or_compute(key, lambda: duck.portfolio_engine_duckdb(
+            con.cursor(), list(tickers), start_cash, tc_bps/10000.0, rf_annual, start_date, end_date, alpha,
+            prices=prices,
+        ))
+    key = ("engine", version, tickers, start_cash, tc_bps, rf_annual, start_date, end_date, alpha,
+           weights, rebalance, band)
+    return submit_job(key, "Backtest", portfolio_engine, lambda: (
+        data.compute_returns(load()), list(tickers), start_cash, tc_bps/10000.0, rf_annual, start_date, end_date, alpha,
+    ), weights=weights, rebalance=rebalance, band=band)
+
+@st.cache_resource(show_spinner=False)
+def rf_index(version: str) -> Optional[riskfree.RiskFreeIndex]:
+    """As-of index of the Bundesbank curve (cre_macro_yc_wide in data.duckdb, else the raw CSVs),
+    built once per curve version and shared by every run."""
+    db_path = root / "data.duckdb"
+    if db_path.exists():
+        con = duck.connect(db_path)
+        try:
+            if con.execute("SELECT count(*) FROM information_schema.tables "
+                           "WHERE table_name = 'cre_macro_yc_wide'").fetchone()[0]:
+                return riskfree.RiskFreeIndex(riskfree.load_curve(con), version=version)
+        finally:
+            con.close()
     try:
-        from arch import arch_model
-    except Exception as e:
-        return None, f"arch not installed. Run: pip install arch  (error: {e})"
-    r = portfolio_returns.dropna() * 100.0
-    if len(r) < 300:
-        return None, "Not enough data for GARCH (need ~300+ observations)."
-    am = arch_model(r, mean="Constant", vol="GARCH", p=1, q=1, dist="normal")
-    res = am.fit(disp="off")
-    cond_vol = res.conditional_volatility / 100.0
-    return cond_vol, None
+        return riskfree.RiskFreeIndex(riskfree.csv_curve(root / "data_raw"), version=version)
+    except FileNotFoundError:
+        return None
+
+# ---------- Risk extras ----------
+def run_bootstrap_cached(engine_key: tuple, wide_ret: pd.DataFrame, alpha: float) -> pd.DataFrame:
+    return submit_job(("bootstrap", engine_key, alpha), "Bootstrap VaR/ES", bootstrap_var_es,
+                      lambda: (wide_ret,), alpha=alpha, seed=42)
+
+@st.cache_resource(show_spinner=False)
+def garch_cache() -> GarchCache:
+    return GarchCache(Path(__file__).resolve().parent / ".cache" / "garch_fits.json")
+
+def garch_panel_cached(engine_key: tuple, wide_ret: pd.DataFrame, mode: str, n_jobs: int) -> pd.DataFrame:
+    # Per-ticker full-sample fits go through the shared GarchCache (reused / warm-started)
+    return submit_job(("garch_panel", engine_key, mode), "GARCH by ticker", garch_panel,
+                      lambda: (wide_ret, mode), n_jobs=n_jobs, cache=garch_cache())
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def window_index(run_key: tuple, _returns: pd.DataFrame) -> WindowIndex:
+    """Prefix-sum index over portfolio + ticker returns of one engine run (keyed by its parameters)."""
+    return WindowIndex(_returns)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def cov_engine(engine_key: tuple, method: str, window: int, shrinkage: bool, rebalance: str,
+               _wide: pd.DataFrame) -> CovarianceEngine:
+    """Covariance checkpoints at the run's rebalance days (month starts for the drift band)."""
+    calendar = rebalance if rebalance != "threshold" else "monthly"
+    rows = calendar_rows(pd.DatetimeIndex(_wide.index), calendar)
+    return CovarianceEngine(_wide, method, window=window, shrinkage=shrinkage, checkpoint_rows=rows)
+
+def line_figure(data, chart_range: str, n_out: int = POINT_BUDGET) -> go.Figure:
+    """Line traces for a Series or wide DataFrame: the selected range is sliced at full
+    resolution, then LTTB-downsampled to n_out points per trace."""
+    series = downsample(data, n_out, chart_range)
+    if isinstance(series, pd.Series):
+        series = {data.name: series}
+    trace = go.Scattergl if sum(len(v) for v in series.values()) > GL_THRESHOLD else go.Scatter
+    return go.Figure([trace(x=v.index, y=v.to_numpy(), mode="lines", name=str(k)) for k, v in series.items()])
 
 def time_axis_with_rs(fig):
+    # The range selector (1M/3M/1Y/All) is the server-side "Chart range" control, so zooming
+    # re-slices full-resolution data instead of stretching the downsampled points.
+    # Plotly's range slider cannot draw WebGL traces, so it is hidden for those figures.
+    gl = any(t.type == "scattergl" for t in fig.data)
     fig.update_layout(
         margin=dict(l=10, r=10, t=30, b=10),
         height=360,
-        xaxis=dict(
-            rangeslider=dict(visible=True),
-            rangeselector=dict(
-                buttons=[
-                    dict(count=1, step="month", stepmode="backward", label="1M"),
-                    dict(count=3, step="month", stepmode="backward", label="3M"),
-                    dict(count=1, step="year",  stepmode="backward", label="1Y"),
-                    dict(step="all", label="All"),
-                ]
-            ),
-            type="date",
-        ),
+        xaxis=dict(rangeslider=dict(visible=not gl), type="date"),
         hovermode="x unified",
     )
     return fig
 
 # ---------- UI ----------
 st.set_page_config(page_title="Portfolio Prototype", layout="wide")
-st.title("Portfolio Prototype — Equal Weight, Monthly Rebalance")
+st.title("Portfolio Prototype — Rebalanced Basket")
 
 root = Path(__file__).resolve().parent
+# Diagnostics: per-stage timings / memory for this session's run (JSON lines in
+# .cache/diagnostics.jsonl); background jobs submitted from here inherit the setting
+show_diag = st.sidebar.toggle("Diagnostics", value=False)
+diagnostics.use(show_diag, memory=True, log_path=root / ".cache" / "diagnostics.jsonl")
+diagnostics.reset()
 csv_path = (root / "data_raw" / "equities_de_daily.csv").resolve()
-sig = (int(csv_path.stat().st_mtime), int(csv_path.stat().st_size))
-st.caption(f"Data source: {csv_path}")
-
-df_prices = load_prices(csv_path, sig)
-all_tickers = sorted(df_prices["ticker"].unique())
+store_path = store_path_for(csv_path)
+store = None
+if store_path.exists():
+    store_sig = (int(store_path.stat().st_mtime), int(store_path.stat().st_size))
+    store = open_store(store_path, store_sig)
+
+if store is not None:
+    # Columnar store: ticker list and date bounds come from the index, prices are loaded per selection
+    st.caption(f"Data source: {store_path}")
+    all_tickers = store.tickers
+    min_dt, max_dt = store.date_bounds()
+else:
+    sig = (int(csv_path.stat().st_mtime), int(csv_path.stat().st_size))
+    st.caption(f"Data source: {csv_path}")
+    df_prices = load_prices(csv_path, sig)
+    all_tickers = sorted(df_prices["ticker"].unique())
+    min_dt, max_dt = df_prices["dt"].min(), df_prices["dt"].max()
 
 # Put controls in a FORM (recompute on button click)
 with st.sidebar.form("settings"):
@@ -261,10 +251,19 @@ with st.sidebar.form("settings"):
     start_cash = st.number_input("Starting capital (€)", min_value=1000.0, value=100000.0, step=1000.0)
     tc_bps = st.number_input("Rebalance transaction cost (bps of notional traded)", min_value=0.0, value=10.0, step=5.0)
     rf_annual = st.number_input("Risk-free (annual, %)", min_value=0.0, value=2.0, step=0.25) / 100.0
+    rf_source = st.selectbox("Risk-free source", list(RISK_FREE))
+    rf_custom = st.number_input("Curve maturity (years, for 'interpolated')", min_value=0.1, value=2.0, step=0.5)
     alpha = st.slider("VaR/ES confidence", 0.80, 0.99, 0.95)
-    min_dt, max_dt = df_prices["dt"].min(), df_prices["dt"].max()
+    weighting = st.selectbox("Weighting", list(WEIGHTINGS))
+    rebalance = st.selectbox("Rebalance", list(REBALANCES))
+    band = st.number_input("Drift band (abs. weight, for 'Drift band')", min_value=0.005, value=0.05, step=0.005)
+    backend = st.selectbox("Engine backend", list(BACKENDS))
     dr = st.date_input("Date range", (min_dt.date(), max_dt.date()))
-    want_garch = st.checkbox("Fit GARCH(1,1) (if 'arch' installed)")
+    roll_window = st.selectbox("Rolling window (trading days)", [63, 126, 252], index=2)
+    want_garch = st.checkbox("Fit GARCH(1,1)")
+    garch_mode = st.selectbox("GARCH by ticker", list(GARCH_MODES))
+    garch_jobs = st.number_input("GARCH worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1)
+    want_boot = st.checkbox("Bootstrap VaR/ES (1/5/10/21 days, 100k paths)")
     submitted = st.form_submit_button("Run / Update")
 
 # Default run on first load
@@ -273,15 +272,46 @@ if not sel_tickers:
 start_date = pd.to_datetime(dr[0]) if isinstance(dr, tuple) else None
 end_date   = pd.to_datetime(dr[1]) if isinstance(dr, tuple) else None
 
-# Cached computations
-r_df = compute_returns(df_prices)
+# Cached computations (keyed by the data file version, not by hashing frames)
+if store is not None:
+    version = dataset_version(store_path)
+    load = lambda: load_prices_store(store_path, store_sig, tuple(sorted(sel_tickers)), start_date, end_date)
+else:
+    version = dataset_version(csv_path)
+    load = lambda: df_prices
+if BACKENDS[backend] == "duckdb":
+    db_path = root / "data.duckdb"
+    version = dataset_version(db_path if db_path.exists() else csv_path)
+    if (weighting, rebalance) != ("Equal", "Monthly"):
+        st.info("DuckDB backend: equal weight, monthly rebalance (weighting / rebalance settings ignored).")
+    # Everything downstream (run key, risk decomposition, captions) follows what the SQL computes
+    weighting, rebalance = "Equal", "Monthly"
+# Time-varying risk-free rate: the curve's as-of index is shared; rates are keyed by curve version
+rf = rf_annual
+if RISK_FREE[rf_source] is not None:
+    curve_files = sorted((root / "data_raw").glob("Zinsstrukturkurve_*_Y.csv"))
+    db_path = root / "data.duckdb"
+    curve_version = "|".join(dataset_version(p) for p in curve_files + [db_path] if p.exists())
+    index_rf = rf_index(curve_version)
+    if index_rf is None:
+        st.warning("No yield curve found (cre_macro_yc_wide / Zinsstrukturkurve_*.csv); using the constant rate.")
+    else:
+        rf = index_rf.rate(rf_custom if RISK_FREE[rf_source] == "custom" else RISK_FREE[rf_source])
+engine_key = (version, tuple(sel_tickers), start_date, end_date, BACKENDS[backend])
 daily, summary, wide_ret, turnover = run_engine_cached(
-    r_df, tuple(sel_tickers), start_cash, tc_bps, rf_annual, start_date, end_date, alpha
+    version, load, tuple(sel_tickers), start_cash, tc_bps, rf, start_date, end_date, alpha,
+    WEIGHTINGS[weighting], REBALANCES[rebalance], band, BACKENDS[backend],
 )
 
 if daily.empty:
     st.warning("No data for the selection.")
     st.stop()
+# Engine run identity (r_port depends on all parameters; wide_ret only on engine_key)
+run_key = engine_key + (start_cash, tc_bps, rf, weighting, rebalance, band)
+time_varying_rf = isinstance(rf, riskfree.RiskFreeRate)
+if time_varying_rf:
+    # Rolling / sub-window KPIs take a constant rate: the curve's average over the run
+    rf_annual = rf.mean(daily.index)
 
 # ---------- KPI “cards” ----------
 st.markdown("""
@@ -299,46 +329,170 @@ row1[2].metric("CAGR", f"{summary['CAGR']*100:,.2f}%")
 row1[3].metric("Ann. Vol", f"{summary['Ann. Vol']*100:,.2f}%")
 row1[4].metric("Sharpe (ann.)", f"{summary['Ann. Sharpe']:.2f}")
 
-row2 = st.columns(3)
+row2 = st.columns(4)
 row2[0].metric("Max Drawdown", f"{summary['Max Drawdown']*100:,.2f}%")
 row2[1].metric(f"VaR (norm, {int(alpha*100)}%, daily)", f"{summary['VaR (norm, daily)']*100:,.2f}%")
 row2[2].metric(f"ES (hist, {int(alpha*100)}%, daily)", f"{summary['ES (hist, daily)']*100:,.2f}%")
+row2[3].metric("Turnover (avg/rebalance)", f"{summary['Turnover (avg/rebalance)']*100:,.1f}%")
+
+# ---------- Charts (Plotly with zoom/range slider, LTTB-downsampled) ----------
+chart_range = st.radio("Chart range", list(WINDOWS), index=len(WINDOWS) - 1, horizontal=True)
 
-# ---------- Charts (Plotly with zoom/range slider) ----------
 st.subheader("Equity Curve")
-fig_equity = go.Figure()
-fig_equity.add_trace(go.Scatter(x=daily.index, y=daily["equity"], mode="lines", name="Equity"))
-st.plotly_chart(time_axis_with_rs(fig_equity), use_container_width=True, config={"displaylogo": False})
+with stage("plot:equity"):
+    fig_equity = line_figure(daily["equity"].rename("Equity"), chart_range)
+    st.plotly_chart(time_axis_with_rs(fig_equity), use_container_width=True, config={"displaylogo": False})
 
 st.subheader("Daily Return (with monthly cost hits)")
-fig_ret = px.line(daily.reset_index(), x="dt", y="r_port")
-fig_ret.update_yaxes(tickformat=".2%")
-st.plotly_chart(time_axis_with_rs(fig_ret), use_container_width=True, config={"displaylogo": False})
-
-st.subheader("Monthly Turnover (estimate)")
-turn_df = turnover.rename("turnover").to_frame()
-turn_df.index = pd.to_datetime(turn_df.index)
-fig_turn = px.bar(turn_df.reset_index().rename(columns={"index": "month"}), x="month", y="turnover")
-fig_turn.update_yaxes(tickformat=".1%")
-st.plotly_chart(time_axis_with_rs(fig_turn), use_container_width=True, config={"displaylogo": False})
+with stage("plot:daily_return"):
+    fig_ret = line_figure(daily["r_port"], chart_range)
+    fig_ret.update_yaxes(tickformat=".2%")
+    st.plotly_chart(time_axis_with_rs(fig_ret), use_container_width=True, config={"displaylogo": False})
+
+st.subheader("Monthly Turnover")
+with stage("plot:turnover"):
+    turn_df = turnover.rename("turnover").to_frame()
+    turn_df.index = pd.to_datetime(turn_df.index)
+    turn_df = window(turn_df.resample("MS").sum(), chart_range)  # sum of rebalance events per month
+    fig_turn = px.bar(turn_df.reset_index().rename(columns={"index": "month"}), x="month", y="turnover")
+    fig_turn.update_yaxes(tickformat=".1%")
+    st.plotly_chart(time_axis_with_rs(fig_turn), use_container_width=True, config={"displaylogo": False})
+
+st.subheader(f"Rolling Risk ({roll_window}D)")
+with stage("rolling_risk", window=roll_window):
+    roll_port = rolling_risk(daily["r_port"], roll_window, alpha, rf_annual)
+roll_tab = st.tabs(["Vol & Sharpe", "Drawdown", "VaR / ES", "Vol by ticker"])
+with roll_tab[0]:
+    fig_rv = line_figure(roll_port[["vol", "sharpe"]], chart_range)
+    st.plotly_chart(time_axis_with_rs(fig_rv), use_container_width=True, config={"displaylogo": False})
+with roll_tab[1]:
+    fig_rd = line_figure(roll_port[["drawdown", "max_drawdown"]], chart_range)
+    fig_rd.update_yaxes(tickformat=".1%")
+    st.plotly_chart(time_axis_with_rs(fig_rd), use_container_width=True, config={"displaylogo": False})
+with roll_tab[2]:
+    fig_rq = line_figure(roll_port[["var_hist", "es_hist"]], chart_range)
+    fig_rq.update_yaxes(tickformat=".2%")
+    st.plotly_chart(time_axis_with_rs(fig_rq), use_container_width=True, config={"displaylogo": False})
+with roll_tab[3]:
+    roll_vol = rolling_risk(wide_ret, roll_window, alpha, rf_annual)["vol"]
+    fig_tv = line_figure(roll_vol, chart_range)
+    fig_tv.update_yaxes(tickformat=".0%")
+    st.plotly_chart(time_axis_with_rs(fig_tv), use_container_width=True, config={"displaylogo": False})
+
+st.subheader("Sub-window Analysis")
+with stage("window_index"):
+    w_index = window_index(run_key, wide_ret.assign(Portfolio=daily["r_port"]))
+win_tab = st.tabs(["Chart range", "Calendar years", "Rolling 1Y"])
+pct_cols = {m: "{:.2%}" for m in ["Total Return", "CAGR", "Ann. Vol", "Max Drawdown"]}
+with win_tab[0]:
+    shown = window(daily["r_port"], chart_range)
+    st.dataframe(
+        w_index.stats(shown.index[0], shown.index[-1], rf_annual).style.format({**pct_cols, "Ann. Sharpe": "{:.2f}", "Days": "{:,.0f}"}),
+        use_container_width=True,
+    )
+with win_tab[1]:
+    years = w_index.sweep(calendar_windows(w_index.index, "Y"), rf_annual)
+    by_year = years["Total Return"].unstack("series").droplevel("end")
+    by_year.index = by_year.index.year
+    st.dataframe(by_year.style.format("{:.2%}", na_rep=""), use_container_width=True)
+with win_tab[2]:
+    roll_1y = w_index.sweep(rolling_windows(w_index.index), rf_annual)
+    fig_r1 = line_figure(roll_1y["Total Return"].unstack("series").droplevel("end"), chart_range)
+    fig_r1.update_yaxes(tickformat=".0%")
+    st.plotly_chart(time_axis_with_rs(fig_r1), use_container_width=True, config={"displaylogo": False})
+    st.caption("1-year total return by start date (every trading day), from the prefix-sum index.")
+
+st.subheader("Risk Decomposition")
+risk_cols = st.columns([2, 1, 3])
+cov_method = risk_cols[0].radio("Covariance", ["EWMA (λ=0.94)", f"Rolling ({roll_window}D)"], horizontal=True)
+cov_shrink = risk_cols[1].checkbox("Ledoit-Wolf shrinkage")
+risk_date = risk_cols[2].select_slider("As of", options=list(wide_ret.index.date), value=wide_ret.index[-1].date())
+with stage("covariance", tickers=wide_ret.shape[1]):
+    cov = cov_engine(engine_key, "ewma" if cov_method.startswith("EWMA") else "rolling", roll_window,
+                     cov_shrink, REBALANCES[rebalance], wide_ret)
+    panel = ReturnPanel.from_wide(wide_ret)
+    row = np.array([cov.position(risk_date) - 1])
+    targets = live_targets(panel, WEIGHTS[WEIGHTINGS[weighting]](), row)[0]
+    contrib = cov.contributions(risk_date, pd.Series(targets, index=panel.tickers), alpha)
+risk_kpi = st.columns(3)
+risk_kpi[0].metric("Ann. Vol (covariance)", f"{contrib.attrs['portfolio_vol']*100:,.2f}%")
+risk_kpi[1].metric(f"VaR (norm, {int(alpha*100)}%, daily)", f"{contrib.attrs['portfolio_var']*100:,.2f}%")
+if cov.last_shrinkage is not None and cov_shrink:
+    risk_kpi[2].metric("Shrinkage intensity", f"{cov.last_shrinkage:.2f}")
+contrib = contrib[contrib["Weight"] != 0].sort_values("Component vol", ascending=False)
+fig_rc = px.bar(contrib.reset_index().rename(columns={"index": "ticker"}).head(50), x="ticker", y="% of vol")
+fig_rc.update_yaxes(tickformat=".0%")
+st.plotly_chart(fig_rc, use_container_width=True, config={"displaylogo": False})
+st.dataframe(
+    contrib.style.format({c: "{:.2%}" for c in contrib.columns}),
+    use_container_width=True,
+)
+st.caption(f"{weighting} target weights as of the selected day; component vol / VaR sum to the portfolio figures.")
 
 # Optional GARCH
 if want_garch:
-    cond_vol, garch_msg = try_garch(daily["r_port"])
+    cond_vol, garch_msg = submit_job(
+        ("garch", run_key), "GARCH(1,1)", try_garch,
+        # Cache key leaves out the data version and end date, so a longer history warm-starts
+        lambda: (daily["r_port"], garch_cache(),
+                 "portfolio:" + cache_key((tuple(sel_tickers), start_date, BACKENDS[backend], tc_bps, weighting, rebalance, band))),
+    )
     if cond_vol is None:
         st.info(garch_msg)
     else:
         st.subheader("GARCH(1,1) Conditional Volatility (daily)")
-        fig_g = px.line(x=cond_vol.index, y=cond_vol.values, labels={"x":"dt","y":"cond_vol"})
+        fig_g = line_figure(cond_vol.rename("cond_vol"), chart_range)
         fig_g.update_yaxes(tickformat=".2%")
         st.plotly_chart(time_axis_with_rs(fig_g), use_container_width=True, config={"displaylogo": False})
 
+        st.subheader("GARCH(1,1) Conditional Volatility by ticker")
+        vol_panel = garch_panel_cached(engine_key, wide_ret, GARCH_MODES[garch_mode], int(garch_jobs))
+        fig_gp = line_figure(vol_panel, chart_range)
+        fig_gp.update_yaxes(tickformat=".2%")
+        st.plotly_chart(time_axis_with_rs(fig_gp), use_container_width=True, config={"displaylogo": False})
+
+# Optional multi-horizon tail risk
+if want_boot:
+    st.subheader(f"Bootstrap VaR / ES ({int(alpha*100)}%, stationary blocks, equal-weight basket)")
+    boot = run_bootstrap_cached(engine_key, wide_ret, alpha)
+    st.dataframe(
+        boot.style.format({c: "{:.2%}" for c in boot.columns if c != "n_paths"}),
+        use_container_width=True,
+    )
+    if "sample_start" in boot.attrs:
+        st.caption(
+            f"Resampled days: {boot.attrs['sample_start'][:10]} – {boot.attrs['sample_end'][:10]} "
+            f"({boot.attrs['sample_days']:,} days; equal weight over the tickers listed each day)."
+        )
+
 # Data preview
 with st.expander("Show sample data"):
-    st.dataframe(daily.reset_index().tail(10), use_container_width=True)
+    sample = daily.assign(r_excess=rf.excess(daily["r_port"])) if time_varying_rf else daily
+    st.dataframe(sample.reset_index().tail(10), use_container_width=True)
 
 st.caption(
-    "Equal-weight rebalanced monthly. Transaction cost applied on the first trading day of each month "
-    "based on turnover between drifted end-of-month weights and equal target. "
+    f"{weighting} weights, rebalanced {rebalance.lower()}; holdings drift with prices between rebalances. "
+    "Transaction cost is applied on each rebalance day based on turnover between drifted and target weights. "
     "VaR/ES are based on daily returns; Sharpe uses annualized mean/vol and the provided risk-free rate."
-)
\ No newline at end of file
+    + (f" Risk-free: {rf_source}, month by month (previous month's yield; average {rf_annual:.2%}); "
+       "the headline Sharpe is that of daily excess returns, rolling / sub-window Sharpe use the average."
+       if time_varying_rf else "")
+)
+if show_diag:
+    with st.sidebar.expander("Diagnostics", expanded=True):
+        diag = pd.DataFrame(diagnostics.summary())
+        if not diag.empty:
+            st.dataframe(diag.style.format({"ms": "{:,.1f}", "peak_mb": "{:,.1f}"}, na_rep=""),
+                         use_container_width=True, hide_index=True)
+
+active_jobs = job_queue().jobs()
+if active_jobs:
+    with st.sidebar.expander(f"Background jobs ({len(active_jobs)})"):
+        st.dataframe(pd.DataFrame(active_jobs).style.format({"progress": "{:.0%}", "seconds": "{:,.1f}"}),
+                     use_container_width=True, hide_index=True)
+
+cache_info = result_cache().info()
+st.sidebar.caption(
+    f"Result cache: {cache_info['memory_hits']} memory / {cache_info['disk_hits']} disk hits, "
+    f"{cache_info['misses']} misses, {cache_info['memory_bytes'] / 2**20:,.1f} MiB in memory"
+)
@@ -1,16 +1,130 @@
+import argparse
 import numpy as np
 import pandas as pd
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 # ---------- CONFIG ----------
 YEARS = 1
-FREQ = 'H'
+FREQ = 'h'
 MONTE_CARLO_RUNS = 5
 OUTPUT_DIR = "synthetic_timeseries"
 np.random.seed(42)  # For reproducibility
+CHUNK_RUNS = 64      # runs per (runs x n) batch / Parquet part file
+AR_BLOCK = 64        # block length of the AR(1) filter
+SEED = 42
 # ----------------------------
 
+PARAM_RANGES = {
+    "trend_slope": (0.0001, 0.001),
+    "cycle_amplitude": (5, 15),
+    "cycle_period_hours": (24*2000, 24*3000),  # long-term cycle
+    "hourly_amp": (1, 3),
+    "daily_amp": (2, 5),
+    "weekly_amp": (3, 6),
+    "monthly_amp": (4, 8),
+    "ar_coef": (0.3, 0.7),
+    "noise_std": (0.5, 2.0),
+    "spike_magnitude": (5, 15),
+}
+SPIKE_PROB = 0.002
+
+def ar1_filter(phi, eps, block=AR_BLOCK):
+    """y[:, t] = phi * y[:, t-1] + eps[:, t] (y[:, -1] = 0) for every row at once.
+
+    phi: (runs,), eps: (runs, n). Within a block of length L the response is one batched
+    matmul with the lower-triangular matrix of phi^(i-j); only the carry between blocks
+    (n / L steps, vectorized over runs) is a Python loop.
+    """
+    runs, n = eps.shape
+    L = min(block, n)
+    nb = -(-n // L)
+    E = np.zeros((runs, nb * L))
+    E[:, :n] = eps
+    E = E.reshape(runs, nb, L)
+    lag = np.arange(L)[:, None] - np.arange(L)[None, :]
+    P = np.where(lag >= 0, phi[:, None, None] ** np.maximum(lag, 0), 0.0)   # runs x L x L
+    local = np.matmul(E, P.transpose(0, 2, 1))                               # runs x nb x L
+    decay = phi[:, None] ** np.arange(1, L + 1)                              # phi^(i+1)
+    carry = np.zeros(runs)
+    for b in range(nb):
+        local[:, b] += carry[:, None] * decay
+        carry = local[:, b, -1]
+    return local.reshape(runs, nb * L)[:, :n]
+
+def draw_params(rng, runs):
+    """Per-run parameter vectors (same distributions as generate_single_series)."""
+    params = {k: rng.uniform(lo, hi, size=runs) for k, (lo, hi) in PARAM_RANGES.items()}
+    params["spike_prob"] = np.full(runs, SPIKE_PROB)
+    return params
+
+def generate_batch(rng, runs, n, params=None):
+    """(runs x n) array of series plus the parameter table, all runs in one pass."""
+    if params is None:
+        params = draw_params(rng, runs)
+    p = {k: np.asarray(v, dtype=float)[:, None] for k, v in params.items()}
+    t = np.arange(n)
+    two_pi = 2 * np.pi
+    y = p["trend_slope"] * t
+    y = y + p["cycle_amplitude"] * np.sin(two_pi * t / p["cycle_period_hours"])
+    y += p["hourly_amp"] * np.sin(two_pi * (t % 24) / 24)
+    y += p["daily_amp"] * np.sin(two_pi * (t % (24*7)) / (24*1))  # daily cycle pattern
+    y += p["weekly_amp"] * np.sin(two_pi * (t % (24*7)) / (24*7))
+    y += p["monthly_amp"] * np.sin(two_pi * (t % (24*30)) / (24*30))
+
+    eps = rng.standard_normal((runs, n)) * p["noise_std"]
+    eps[:, 0] = 0.0
+    y += ar1_filter(p["ar_coef"][:, 0], eps)
+
+    spike = rng.random((runs, n)) < p["spike_prob"]
+    sign = rng.choice([-1.0, 1.0], size=(runs, n))
+    y += spike * sign * p["spike_magnitude"]
+    return y, pd.DataFrame({k: v for k, v in params.items()})
+
+def _write_chunk(task):
+    """Worker: generate one chunk with its own seed stream, write it as a Parquet part."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    seed_seq, first_run, runs, years, freq, out_dir, float32 = task
+    date_rng = pd.date_range(start="2020-01-01", periods=int(years * 365.25 * 24), freq=freq)
+    n = len(date_rng)
+    y, params = generate_batch(np.random.default_rng(seed_seq), runs, n)
+    run_id = np.arange(first_run + 1, first_run + runs + 1, dtype=np.int32)
+    table = pa.table({
+        "run_id": np.repeat(run_id, n),
+        "timestamp": np.tile(date_rng.values.astype("datetime64[s]"), runs),
+        "value": y.ravel().astype(np.float32 if float32 else np.float64),
+    })
+    pq.write_table(table, os.path.join(out_dir, "values", f"part-{first_run // runs:05d}.parquet"),
+                   compression="zstd", row_group_size=n * min(runs, 16))
+    params.insert(0, "run_id", [f"run_{i}" for i in run_id])
+    return params
+
+def run_monte_carlo_batched(runs=MONTE_CARLO_RUNS, years=YEARS, freq=FREQ, out_dir=OUTPUT_DIR,
+                            chunk_runs=CHUNK_RUNS, workers=1, seed=SEED, float32=False):
+    """Many runs, chunked over a process pool; memory is bounded by workers x one chunk.
+
+    Output: <out_dir>/values/part-*.parquet (run_id, timestamp, value; zstd) and
+    <out_dir>/simulation_parameters.parquet/.csv. Chunk c uses SeedSequence(seed).spawn()[c],
+    so results do not depend on the number of workers.
+    """
+    os.makedirs(os.path.join(out_dir, "values"), exist_ok=True)
+    starts = list(range(0, runs, chunk_runs))
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    tasks = [(ss, a, min(chunk_runs, runs - a), years, freq, out_dir, float32) for ss, a in zip(seeds, starts)]
+    if workers == 1:
+        tables = [_write_chunk(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            tables = list(ex.map(_write_chunk, tasks))
+    params = pd.concat(tables, ignore_index=True)
+    params.to_parquet(os.path.join(out_dir, "simulation_parameters.parquet"), index=False)
+    params.to_csv(os.path.join(out_dir, "simulation_parameters.csv"), index=False)
+    print(f"Generated {runs} runs in '{out_dir}' ({len(tasks)} Parquet parts).")
+    return params
+
 def generate_single_series(years=YEARS, freq=FREQ, params=None):
     """Generate one synthetic time series with multiple seasonalities + AR noise."""
     # 1) Time index
@@ -42,10 +156,10 @@ def generate_single_series(years=YEARS, freq=FREQ, params=None):
     weekly = params["weekly_amp"] * np.sin(2 * np.pi * (t % (24*7)) / (24*7))
     monthly = params["monthly_amp"] * np.sin(2 * np.pi * (t % (24*30)) / (24*30))
 
-    # 4) AR(1) noise
-    noise = np.zeros(n)
-    for i in range(1, n):
-        noise[i] = params["ar_coef"] * noise[i-1] + np.random.normal(0, params["noise_std"])
+    # 4) AR(1) noise (same draws as one np.random.normal call per step)
+    eps = np.zeros(n)
+    eps[1:] = np.random.normal(0, params["noise_std"], size=n - 1)
+    noise = ar1_filter(np.array([params["ar_coef"]]), eps[None, :])[0]
 
     # 5) Event spikes
     spikes = (np.random.rand(n) < params["spike_prob"]) * (
@@ -64,24 +178,39 @@ def generate_single_series(years=YEARS, freq=FREQ, params=None):
     return df, params
 
 
-def run_monte_carlo(runs=MONTE_CARLO_RUNS):
+def run_monte_carlo(runs=MONTE_CARLO_RUNS, years=YEARS, out_dir=OUTPUT_DIR):
     """Run multiple simulations and save outputs + params."""
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(out_dir, exist_ok=True)
     all_params = []
 
     for run in range(runs):
-        df, params = generate_single_series()
+        df, params = generate_single_series(years=years)
         run_id = f"run_{run+1}"
-        df.to_csv(f"{OUTPUT_DIR}/{run_id}.csv", index=False)
+        df.to_csv(f"{out_dir}/{run_id}.csv", index=False)
 
         params_record = {"run_id": run_id}
         params_record.update(params)
         all_params.append(params_record)
 
     # Save parameters for all runs
-    pd.DataFrame(all_params).to_csv(f"{OUTPUT_DIR}/simulation_parameters.csv", index=False)
-    print(f"Generated {runs} runs in '{OUTPUT_DIR}' folder.")
+    pd.DataFrame(all_params).to_csv(f"{out_dir}/simulation_parameters.csv", index=False)
+    print(f"Generated {runs} runs in '{out_dir}' folder.")
 
 
 if __name__ == "__main__":
-    run_monte_carlo()
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="Synthetic hourly time series (trend, seasonalities, AR(1), spikes).")
+    ap.add_argument("--runs", type=int, default=MONTE_CARLO_RUNS)
+    ap.add_argument("--years", type=float, default=YEARS)
+    ap.add_argument("--out", default=OUTPUT_DIR)
+    ap.add_argument("--batched", action="store_true",
+                    help="vectorized chunks over a process pool, Parquet output (default: one CSV per run)")
+    ap.add_argument("--chunk-runs", type=int, default=CHUNK_RUNS)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seed", type=int, default=SEED)
+    ap.add_argument("--float32", action="store_true", help="store values as float32")
+    args = ap.parse_args()
+    if args.batched:
+        run_monte_carlo_batched(args.runs, args.years, FREQ, args.out, args.chunk_runs, args.workers,
+                                args.seed, args.float32)
+    else:
+        run_monte_carlo(args.runs, args.years, args.out)
\ No newline at end of file
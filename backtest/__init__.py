@@ -0,0 +1,37 @@
+# Headless backtest engine shared by the Streamlit app and batch jobs.
+# Submodules (and numpy/pandas) are imported on first attribute access, so
+# 'import backtest' and 'python -m backtest --help' stay cheap.
+
+from __future__ import annotations
+import importlib
+
+_EXPORTS = {
+    "load_prices": "backtest.data",
+    "compute_returns": "backtest.data",
+    "portfolio_engine_equal_monthly": "backtest.engine",
+    "portfolio_engine": "backtest.rebalance",
+    "portfolio_engine_duckdb": "backtest.duck",
+    "ReturnPanel": "backtest.panel",
+    "WindowIndex": "backtest.windows",
+    "Snapshot": "backtest.incremental",
+    "JobQueue": "backtest.jobs",
+    "CovarianceEngine": "backtest.covariance",
+    "RiskFreeIndex": "backtest.riskfree",
+    "norm_ppf": "backtest.engine",
+    "cagr": "backtest.engine",
+    "max_drawdown": "backtest.engine",
+    "try_garch": "backtest.garch",
+    "run_sweep": "backtest.sweep",
+    "rolling_risk": "backtest.rolling",
+    "bootstrap_var_es": "backtest.simulate",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'backtest' has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,175 @@
+# Result cache keyed by dataset version + parameters (no DataFrame hashing).
+#   - memory tier: LRU of decoded results, evicted by approximate size in bytes
+#   - disk tier: one directory of Parquet files per key under 'path', written via an atomic
+#     rename so several app/CLI processes can share it and it survives restarts
+# Keys are small tuples, e.g. ("engine", dataset_version(csv), tickers, tc_bps, ...); the
+# lookup cost is one blake2b over their repr, independent of the universe size.
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import pandas as pd
+
+from backtest.diagnostics import stage
+
+MAX_BYTES = 256 << 20
+MANIFEST = "manifest.json"
+
+def dataset_version(path: Path) -> str:
+    """Cheap version of a data file: (mtime_ns, size), same idea as the app's 'sig'."""
+    st = Path(path).stat()
+    return f"{Path(path).name}:{st.st_mtime_ns}:{st.st_size}"
+
+def cache_key(parts: tuple) -> str:
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True))
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return 256
+
+# ---------- Parquet encoding (DataFrame / Series / dict of scalars, or tuples of those) ----------
+def _encode(value: Any, folder: Path, name: str) -> Any:
+    if isinstance(value, tuple):
+        return {"kind": "tuple", "items": [_encode(v, folder, f"{name}_{i}") for i, v in enumerate(value)]}
+    if isinstance(value, pd.DataFrame):
+        value.to_parquet(folder / f"{name}.parquet")
+        return {"kind": "frame", "file": f"{name}.parquet"}
+    if isinstance(value, pd.Series):
+        value.to_frame("values").to_parquet(folder / f"{name}.parquet")
+        return {"kind": "series", "file": f"{name}.parquet", "name": value.name}
+    if isinstance(value, dict):
+        return {"kind": "dict", "value": {k: (None if pd.isna(v) else float(v)) for k, v in value.items()}}
+    raise TypeError(f"Cannot cache values of type {type(value).__name__}")
+
+def _decode(spec: dict, folder: Path) -> Any:
+    kind = spec["kind"]
+    if kind == "tuple":
+        return tuple(_decode(s, folder) for s in spec["items"])
+    if kind == "frame":
+        return pd.read_parquet(folder / spec["file"])
+    if kind == "series":
+        return pd.read_parquet(folder / spec["file"])["values"].rename(spec["name"])
+    return {k: (float("nan") if v is None else v) for k, v in spec["value"].items()}
+
+# ---------- Cache ----------
+class ResultCache:
+    """Two-tier (memory LRU + shared Parquet directory) cache with hit/miss counters."""
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: int = MAX_BYTES):
+        self.path = Path(path) if path else None
+        self.max_bytes = max_bytes
+        self._mem: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def get_or_compute(self, parts: tuple, fn: Callable[[], Any]) -> Any:
+        with stage(f"cache:{parts[0]}") as rec:
+            key = cache_key(parts)
+            with self._lock:
+                if key in self._mem:
+                    self._mem.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    rec["cache"] = "memory hit"
+                    return self._mem[key][0]
+            value = self._read(key)
+            if value is not None:
+                self.stats["disk_hits"] += 1
+                rec["cache"] = "disk hit"
+            else:
+                self.stats["misses"] += 1
+                rec["cache"] = "miss"
+                value = fn()
+                self._write(key, value)
+            self._remember(key, value)
+            return value
+
+    def get(self, parts: tuple) -> Any:
+        """Cached value or None (memory, then disk); counts hits but not misses."""
+        key = cache_key(parts)
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self._mem[key][0]
+        value = self._read(key)
+        if value is not None:
+            self.stats["disk_hits"] += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, parts: tuple, value: Any) -> None:
+        """Publish a value computed elsewhere (e.g. by a background job). Values the Parquet
+        tier cannot encode are kept in memory only."""
+        key = cache_key(parts)
+        try:
+            self._write(key, value)
+        except TypeError:
+            pass
+        self._remember(key, value)
+
+    def info(self) -> dict:
+        return {**self.stats, "memory_entries": len(self._mem), "memory_bytes": self._bytes}
+
+    def clear(self, disk: bool = False) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._bytes = 0
+        if disk and self.path and self.path.exists():
+            shutil.rmtree(self.path)
+
+    # -- memory tier --
+    def _remember(self, key: str, value: Any) -> None:
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._mem:
+                self._bytes -= self._mem.pop(key)[1]
+            self._mem[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, s) = self._mem.popitem(last=False)
+                self._bytes -= s
+                self.stats["evictions"] += 1
+
+    # -- disk tier --
+    def _read(self, key: str) -> Any:
+        if self.path is None:
+            return None
+        folder = self.path / key
+        try:
+            spec = json.loads((folder / MANIFEST).read_text())
+            return _decode(spec, folder)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write(self, key: str, value: Any) -> None:
+        if self.path is None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = self.path / f".{key}.{uuid.uuid4().hex}.tmp"
+        tmp.mkdir()
+        try:
+            spec = _encode(value, tmp, "part")
+            (tmp / MANIFEST).write_text(json.dumps(spec))
+            os.rename(tmp, self.path / key)
+        except OSError:
+            # Another process published the same key first (or the disk tier is unavailable)
+            shutil.rmtree(tmp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
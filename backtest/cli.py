@@ -0,0 +1,211 @@
+# Headless backtest runs from a JSON config (no Streamlit / Plotly).
+#
+#   python -m backtest run configs/backtest.json [--out-dir out] [--format csv|parquet] [--timings]
+#                                                [--diagnostics stages.jsonl] [--state-dir .cache/state]
+#                                                [--validate-state]
+#
+# Config: one run (dict) or {"runs": [...]}; keys per run:
+#   name, data, tickers, start_cash, tc_bps, rf_annual (%), alpha, start_date, end_date,
+#   engine (drift: rebalance.portfolio_engine, ragged listings, holdings drift between rebalances;
+#   equal_monthly: engine.portfolio_engine_equal_monthly, full-basket days, daily equal weights),
+#   weights (equal|inverse_vol|min_variance), rebalance (daily|weekly|monthly|threshold), band,
+#   backend (pandas|duckdb), database (DuckDB file with equities_daily; if it does not exist the
+#   duckdb backend reads 'data' directly), threads,
+#   rf_maturity (years; if set, the risk-free rate is that point of the Bundesbank curve, month by
+#   month, instead of rf_annual), curve (DuckDB file with cre_macro_yc_wide, or the directory of
+#   Zinsstrukturkurve_*.csv), rf_lag_months
+# The duckdb backend runs the drift engine with equal weights / monthly rebalance as SQL
+# (backtest.duck); equal_monthly is pandas-only.
+# Writes <out_dir>/<name>_{summary,daily,turnover}.<format>.
+# With --state-dir, pandas-backend drift runs without end_date keep an engine snapshot per run name
+# (backtest.incremental) and only step the days added since the last run; --validate-state also
+# checks the whole stored history (not just the snapshot's tail) before appending.
+
+from __future__ import annotations
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Optional
+
+_T0 = time.perf_counter()
+
+DEFAULTS = {
+    "name": "backtest",
+    "data": "data_raw/equities_de_daily.csv",
+    "tickers": ["SAP.DE", "SIE.DE", "ALV.DE", "BAS.DE", "BMW.DE"],
+    "start_cash": 100000.0,
+    "tc_bps": 10.0,
+    "rf_annual": 2.0,
+    "alpha": 0.95,
+    "start_date": None,
+    "end_date": None,
+    "engine": "drift",
+    "weights": "equal",
+    "rebalance": "monthly",
+    "band": 0.05,
+    "backend": "pandas",
+    "database": "data.duckdb",
+    "threads": None,
+    "rf_maturity": None,
+    "curve": "data_raw",
+    "rf_lag_months": 1,
+}
+
+ENGINES = ("drift", "equal_monthly")
+
+def load_config(path: Path) -> list[dict]:
+    cfg = json.loads(Path(path).read_text())
+    runs = cfg["runs"] if isinstance(cfg, dict) and "runs" in cfg else [cfg]
+    runs = [{**DEFAULTS, **run} for run in runs]
+    for run in runs:
+        if run["engine"] not in ENGINES:
+            raise ValueError(f"{run['name']}: engine must be one of {ENGINES}")
+        if run["engine"] == "equal_monthly" and (run["weights"], run["rebalance"], run["backend"]) != (
+                "equal", "monthly", "pandas"):
+            raise ValueError(f"{run['name']}: engine='equal_monthly' takes weights='equal', "
+                             "rebalance='monthly' and the pandas backend only")
+    return runs
+
+def _write(df, path: Path, fmt: str) -> None:
+    if fmt == "parquet":
+        df.to_parquet(path.with_suffix(".parquet"))
+    else:
+        df.to_csv(path.with_suffix(".csv"))
+
+def _risk_free(cfg: dict, base: Path, indexes: dict):
+    """Constant rf_annual (%) or the curve rate at rf_maturity; one as-of index per curve and lag."""
+    if cfg["rf_maturity"] is None:
+        return cfg["rf_annual"] / 100.0
+    from backtest import riskfree
+    src = Path(cfg["curve"])
+    if not src.is_absolute() and not src.exists():
+        src = base / src
+    key = (src.resolve(), cfg["rf_lag_months"])
+    if key not in indexes:
+        if src.is_dir():
+            curve = riskfree.csv_curve(src)
+        else:
+            from backtest import duck
+            con = duck.connect(src)
+            try:
+                curve = riskfree.load_curve(con)
+            finally:
+                con.close()
+        indexes[key] = riskfree.RiskFreeIndex(curve, lag_months=cfg["rf_lag_months"])
+    return indexes[key].rate(cfg["rf_maturity"])
+
+def _run_duckdb(cfg: dict, base: Path, data_path: Path, start, end, rf):
+    from backtest import duck
+    if (cfg["weights"], cfg["rebalance"]) != ("equal", "monthly"):
+        raise ValueError(f"{cfg['name']}: the duckdb backend supports weights='equal', rebalance='monthly' only")
+    db = Path(cfg["database"])
+    if not db.is_absolute() and not db.exists():
+        db = base / db
+    if db.exists():
+        con, prices = duck.connect(db, threads=cfg["threads"]), duck.PRICES
+    else:
+        con, prices = duck.connect(threads=cfg["threads"]), duck.csv_prices(data_path)
+    t1 = time.perf_counter()
+    try:
+        daily, summary, _, turnover = duck.portfolio_engine_duckdb(
+            con, cfg["tickers"], cfg["start_cash"], cfg["tc_bps"] / 10000.0,
+            rf, start, end, cfg["alpha"], prices=prices, return_wide=False,
+        )
+    finally:
+        con.close()
+    return daily, summary, turnover, t1
+
+def _run_incremental(cfg: dict, r_df, start, state_dir: Path, validate: bool = False):
+    from backtest.incremental import Snapshot
+    params = dict(tickers=cfg["tickers"], start_cash=cfg["start_cash"], tc_pct=cfg["tc_bps"] / 10000.0,
+                  rf_annual=cfg["rf_annual"] / 100.0, start_date=start, alpha=cfg["alpha"],
+                  weights=cfg["weights"], rebalance=cfg["rebalance"], band=cfg["band"])
+    path = state_dir / cfg["name"]
+    snap = None
+    if path.exists():
+        try:
+            snap = Snapshot.load(path)
+        except (OSError, ValueError, KeyError):
+            snap = None
+    if snap is not None and snap.matches(**params):
+        snap = snap.update(r_df, validate=validate)
+    else:
+        snap = Snapshot.build(r_df, **params)
+    if snap.mode != "current":
+        snap.save(path)
+    return snap.daily, snap.summary(), snap.turnover, snap.mode
+
+def run(config_path: Path, out_dir: Path, fmt: str, timings: bool, state_dir: Optional[Path] = None,
+        validate_state: bool = False) -> None:
+    t_start = time.perf_counter()
+    import pandas as pd
+    from backtest.data import compute_returns, load_prices
+    from backtest.engine import portfolio_engine_equal_monthly
+    from backtest.rebalance import portfolio_engine
+    t_import = time.perf_counter()
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    base = Path(config_path).resolve().parent
+    rf_indexes: dict = {}
+    for cfg in load_config(config_path):
+        t0 = time.perf_counter()
+        data_path = Path(cfg["data"])
+        if not data_path.is_absolute() and not data_path.exists():
+            data_path = base / data_path
+        start = pd.Timestamp(cfg["start_date"]) if cfg["start_date"] else None
+        end = pd.Timestamp(cfg["end_date"]) if cfg["end_date"] else None
+        rf = _risk_free(cfg, base, rf_indexes)
+        if cfg["backend"] == "duckdb":
+            daily, summary, turnover, t1 = _run_duckdb(cfg, base, data_path, start, end, rf)
+        else:
+            r_df = compute_returns(load_prices(data_path, cfg["tickers"], start, end))
+            t1 = time.perf_counter()
+            # Snapshots (drift engine) keep a constant rate in their running moments
+            if cfg["engine"] == "equal_monthly":
+                daily, summary, _, turnover = portfolio_engine_equal_monthly(
+                    r_df, cfg["tickers"], cfg["start_cash"], cfg["tc_bps"] / 10000.0,
+                    rf, start, end, cfg["alpha"],
+                )
+            elif state_dir is not None and end is None and not r_df.empty and cfg["rf_maturity"] is None:
+                daily, summary, turnover, mode = _run_incremental(cfg, r_df, start, state_dir, validate_state)
+                print(f"    snapshot: {mode}")
+            else:
+                daily, summary, _, turnover = portfolio_engine(
+                    r_df, cfg["tickers"], cfg["start_cash"], cfg["tc_bps"] / 10000.0,
+                    rf, start, end, cfg["alpha"],
+                    weights=cfg["weights"], rebalance=cfg["rebalance"], band=cfg["band"],
+                )
+        t2 = time.perf_counter()
+        if daily.empty:
+            print(f"  ! {cfg['name']}: no data for the selection")
+            continue
+        stem = out_dir / cfg["name"]
+        _write(pd.DataFrame([summary]), stem.with_name(f"{cfg['name']}_summary"), fmt)
+        _write(daily, stem.with_name(f"{cfg['name']}_daily"), fmt)
+        _write(turnover.rename("turnover").rename_axis("dt").to_frame(), stem.with_name(f"{cfg['name']}_turnover"), fmt)
+        t3 = time.perf_counter()
+        print(f"  ✓ {cfg['name']}: CAGR {summary['CAGR']*100:.2f}%, Sharpe {summary['Ann. Sharpe']:.2f} -> {out_dir}")
+        if timings:
+            print(f"    load {t1 - t0:.3f}s  engine {t2 - t1:.3f}s  write {t3 - t2:.3f}s")
+    if timings:
+        print(f"  startup {t_start - _T0:.3f}s  imports {t_import - t_start:.3f}s  total {time.perf_counter() - _T0:.3f}s")
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(prog="python -m backtest", description="Headless portfolio backtests from JSON configs.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_run = sub.add_parser("run", help="run backtests from a JSON config")
+    p_run.add_argument("config", type=Path)
+    p_run.add_argument("--out-dir", type=Path, default=Path("data_out"))
+    p_run.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    p_run.add_argument("--timings", action="store_true", help="print import/load/engine/write times")
+    p_run.add_argument("--diagnostics", type=Path, help="append per-stage JSON lines (time, memory) here")
+    p_run.add_argument("--state-dir", type=Path, help="keep engine snapshots here and append new days only")
+    p_run.add_argument("--validate-state", action="store_true",
+                       help="check the full stored history of each snapshot, not just its tail")
+    args = ap.parse_args(argv)
+    if args.cmd == "run":
+        if args.diagnostics:
+            from backtest import diagnostics
+            diagnostics.enable(args.diagnostics, memory=True)
+        run(args.config, args.out_dir, args.format, args.timings, args.state_dir, args.validate_state)
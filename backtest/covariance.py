@@ -0,0 +1,236 @@
+# Covariance of the basket's tickers (EWMA or rolling window) and per-ticker risk decomposition.
+#
+# The estimator is a set of running sums over days, updated by one outer product per day
+# (rank-one); consecutive days are folded into one rank-d GEMM, which is the same update:
+#   EWMA     A <- lam^d A + X_b' diag(lam^(d-1..0)) X_b          (zero mean, RiskMetrics)
+#   rolling  S <- S + X_in' X_in - X_out' X_out                  (rows entering / leaving)
+# Missing observations (late listings, gaps) are handled pairwise, as in DataFrame.cov: masks
+# get the same updates, so every (i, j) entry uses the days both tickers traded. Dense panels
+# skip the mask matrices.
+#
+# Checkpoints of the sums are kept only at rebalance rows (thinned to stay under max_bytes);
+# cov(date) starts from the last checkpoint before it and rolls the remaining days forward.
+# Optional shrinkage toward mu*I with the Ledoit-Wolf (2004) intensity, from running sums of
+# squared weights / fourth powers (uncentered, zero-filled; an approximation on ragged data).
+
+from __future__ import annotations
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from backtest.engine import TRADING_DAYS, month_starts, norm_ppf
+
+METHODS = ("ewma", "rolling")
+MAX_BYTES = 256 << 20   # checkpoint memory budget
+CONTRIBUTIONS = ["Weight", "Vol (ann.)", "Marginal vol", "Component vol", "% of vol",
+                 "Marginal VaR", "Component VaR"]
+
+class CovarianceEngine:
+    """EWMA (lam) or rolling-window covariance of wide returns, queryable at any date.
+
+    cov(date) uses returns up to and including 'date'. Entries with fewer than min_periods
+    joint observations (rolling) or tickers with fewer (EWMA) are NaN.
+    """
+
+    def __init__(
+        self,
+        wide: pd.DataFrame,
+        method: str = "ewma",
+        lam: float = 0.94,
+        window: int = TRADING_DAYS,
+        shrinkage: bool = False,
+        checkpoint_rows: Optional[np.ndarray] = None,
+        min_periods: int = 20,
+        max_bytes: int = MAX_BYTES,
+    ):
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {METHODS}")
+        self.method, self.lam, self.window = method, lam, window
+        self.shrinkage, self.min_periods = shrinkage, min_periods
+        self.last_shrinkage: Optional[float] = None
+        self.index, self.columns = pd.DatetimeIndex(wide.index), wide.columns
+        X = wide.to_numpy(dtype=float)
+        M = ~np.isnan(X)
+        self.ragged = not M.all()
+        # Rolling sums are centered on the full-sample means (numerical stability only)
+        self.shift = np.nan_to_num(np.nanmean(X, axis=0)) if method == "rolling" and len(X) else 0.0
+        self.X = np.where(M, X - self.shift, 0.0)
+        self.M = M.astype(float)
+        self.T, self.N = X.shape
+
+        rows = month_starts(self.index) if checkpoint_rows is None else np.asarray(checkpoint_rows)
+        rows = np.unique(np.clip(rows, 0, self.T))
+        per = self._state_bytes()
+        keep = max(1, max_bytes // max(per, 1))
+        if len(rows) > keep:
+            rows = rows[::-(-len(rows) // keep)]
+        self.checkpoint_rows = rows
+        self._checkpoints = []
+        state = self._empty()
+        pos = 0
+        for r in rows:
+            state = self._advance(state, pos, r)
+            pos = r
+            self._checkpoints.append(state)
+
+    # ---------- State ----------
+    def _state_bytes(self) -> int:
+        mats = 1 + (2 if self.ragged else 0) + (1 if self.shrinkage and self.method == "ewma" else 0)
+        return mats * self.N * self.N * 8
+
+    def _empty(self) -> dict:
+        N = self.N
+        st = {"pos": 0, "A": np.zeros((N, N)), "n": np.zeros(N), "w": 0.0, "w2": 0.0, "q4": 0.0}
+        if self.ragged:
+            st["P"] = np.zeros((N, N))      # rolling: Σ x_i m_j; EWMA: unused
+            st["W"] = np.zeros((N, N))      # Σ (weights) m_i m_j
+        else:
+            st["s"] = np.zeros(N)           # rolling: Σ x
+        if self.shrinkage and self.method == "ewma":
+            st["Q"] = np.zeros((N, N))      # Σ w² x x'
+        return st
+
+    def _add(self, st: dict, X: np.ndarray, M: np.ndarray, w: np.ndarray, sign: float = 1.0) -> None:
+        """st += sign * Σ_t w_t (x_t x_t', masks...) for the rows X, M."""
+        Xw = X * w[:, None]
+        st["A"] += sign * (Xw.T @ X)
+        st["n"] += sign * M.sum(axis=0)
+        st["w"] += sign * w.sum()
+        sq = (X * X).sum(axis=1)
+        st["q4"] += sign * (w * w * sq * sq).sum()
+        st["w2"] += sign * (w * w).sum()
+        if self.ragged:
+            Mw = M * w[:, None]
+            st["W"] += sign * (Mw.T @ M)
+            if self.method == "rolling":
+                st["P"] += sign * (Xw.T @ M)
+        elif self.method == "rolling":
+            st["s"] += sign * Xw.sum(axis=0)
+        if "Q" in st:
+            st["Q"] += sign * ((X * (w * w)[:, None]).T @ X)
+
+    def _advance(self, st: dict, lo: int, hi: int) -> dict:
+        """Copy of the state after rows lo..hi-1 (st is the state after rows < lo)."""
+        st = {k: (v.copy() if isinstance(v, np.ndarray) else v) for k, v in st.items()}
+        st["pos"] = hi
+        if hi <= lo:
+            return st
+        if self.method == "ewma":
+            d = hi - lo
+            decay = self.lam ** d
+            for k in ("A", "W", "w"):
+                if k in st:
+                    st[k] = st[k] * decay
+            for k in ("Q", "w2", "q4"):
+                if k in st:
+                    st[k] = st[k] * decay * decay
+            w = self.lam ** np.arange(d - 1, -1, -1)
+            self._add(st, self.X[lo:hi], self.M[lo:hi], w)
+        else:
+            self._add(st, self.X[lo:hi], self.M[lo:hi], np.ones(hi - lo))
+            out_lo, out_hi = max(0, lo - self.window), max(0, hi - self.window)
+            if out_hi > out_lo:
+                self._add(st, self.X[out_lo:out_hi], self.M[out_lo:out_hi], np.ones(out_hi - out_lo), -1.0)
+        return st
+
+    def state_at(self, pos: int) -> dict:
+        """State after rows < pos, from the last checkpoint at or before pos."""
+        k = np.searchsorted(self.checkpoint_rows, pos, side="right") - 1
+        base = self._checkpoints[k] if k >= 0 else self._empty()
+        return self._advance(base, base["pos"], pos)
+
+    # ---------- Estimates ----------
+    def _cov_from_state(self, st: dict) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if self.method == "ewma":
+                W = st["W"] if self.ragged else np.full((self.N, self.N), st["w"])
+                S = np.where(W > 0, st["A"] / W, np.nan)
+                have = st["n"] >= self.min_periods
+                # min_periods counts a ticker's observations since its first day
+                S[~(have[:, None] & have[None, :])] = np.nan
+            else:
+                if self.ragged:
+                    n, sx = st["W"], st["P"]
+                    sy = sx.T
+                else:
+                    cnt = min(st["pos"], self.window)
+                    n = np.full((self.N, self.N), float(cnt))
+                    sx = np.broadcast_to(st["s"][:, None], (self.N, self.N))
+                    sy = sx.T
+                S = (st["A"] - sx * sy / n) / (n - 1)
+                S[n < self.min_periods] = np.nan
+        if self.shrinkage:
+            S = self._shrink(S, st)
+        return S
+
+    def _shrink(self, S: np.ndarray, st: dict) -> np.ndarray:
+        """(1 - delta) S + delta mu I, delta = min(1, b² / d²) as in Ledoit-Wolf (2004)."""
+        ok = ~np.isnan(np.diag(S))
+        if ok.sum() < 2:
+            return S
+        Sk = S[np.ix_(ok, ok)]
+        Sk = np.nan_to_num(Sk)
+        mu = np.trace(Sk) / len(Sk)
+        d2 = ((Sk - mu * np.eye(len(Sk))) ** 2).sum()
+        a = st["w"]
+        if a <= 0 or d2 <= 0:
+            return S
+        Q = st["Q"][np.ix_(ok, ok)] if "Q" in st else st["A"][np.ix_(ok, ok)]
+        # Σ ŵ_t² ||x_t x_t' - S||² with ŵ = w / Σw (S held fixed at its current value)
+        b2 = (st["q4"] - 2.0 * (Sk * Q).sum() + st["w2"] * (Sk ** 2).sum()) / (a * a)
+        delta = float(np.clip(b2 / d2, 0.0, 1.0))
+        out = S.copy()
+        out[np.ix_(ok, ok)] = (1 - delta) * Sk + delta * mu * np.eye(len(Sk))
+        self.last_shrinkage = delta
+        return out
+
+    def position(self, date) -> int:
+        """Number of rows up to and including 'date'."""
+        return int(np.searchsorted(self.index.values, np.datetime64(pd.Timestamp(date)), side="right"))
+
+    def cov(self, date=None) -> pd.DataFrame:
+        """Daily covariance (tickers x tickers) using returns up to and including 'date'."""
+        pos = self.T if date is None else self.position(date)
+        S = self._cov_from_state(self.state_at(pos))
+        return pd.DataFrame(S, index=self.columns, columns=self.columns)
+
+    def contributions(self, date=None, weights: Optional[Union[pd.Series, np.ndarray]] = None,
+                      alpha: float = 0.95) -> pd.DataFrame:
+        """Per-ticker marginal / component contributions to portfolio vol (annualized) and to
+        normal VaR (daily, zero mean) at 'date'. Components sum to the portfolio figure.
+
+        weights: Series by ticker or array (default: equal over tickers with an estimate);
+        tickers without a variance estimate get weight 0 and are rescaled out.
+        """
+        S = self.cov(date).to_numpy()
+        ok = ~np.isnan(np.diag(S))
+        if weights is None:
+            w = ok / max(ok.sum(), 1)
+        elif isinstance(weights, pd.Series):
+            w = weights.reindex(self.columns).fillna(0.0).to_numpy(dtype=float)
+        else:
+            w = np.asarray(weights, dtype=float)
+        invested = w.sum()
+        w = np.where(ok, w, 0.0)
+        if w.sum() > 0:
+            w = w * invested / w.sum()
+        Sz = np.nan_to_num(S)
+        sw = Sz @ w
+        sigma = float(np.sqrt(max(w @ sw, 0.0)))
+        ann = np.sqrt(TRADING_DAYS)
+        z = norm_ppf(alpha)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mcr = sw / sigma if sigma > 0 else np.zeros_like(sw)
+        out = pd.DataFrame({
+            "Weight": w,
+            "Vol (ann.)": np.sqrt(np.diag(S)) * ann,
+            "Marginal vol": mcr * ann,
+            "Component vol": w * mcr * ann,
+            "% of vol": w * mcr / sigma if sigma > 0 else np.zeros_like(w),
+            "Marginal VaR": z * mcr,
+            "Component VaR": z * w * mcr,
+        }, index=self.columns)
+        out.attrs.update(portfolio_vol=sigma * ann, portfolio_var=z * sigma,
+                         date=self.index[max(0, (self.T if date is None else self.position(date)) - 1)])
+        return out
@@ -0,0 +1,45 @@
+# Price loading and return computation without Streamlit (used by app.py and the CLI).
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional, Sequence
+
+import pandas as pd
+
+from backtest.diagnostics import timed
+from backtest.store import PriceStore, normalize_prices, store_path_for
+
+@timed("load_prices")
+def load_prices(
+    path: Path,
+    tickers: Optional[Sequence[str]] = None,
+    start_date: Optional[pd.Timestamp] = None,
+    end_date: Optional[pd.Timestamp] = None,
+) -> pd.DataFrame:
+    """(dt, ticker, price) sorted by ticker, dt.
+
+    Uses the columnar store (path itself if .arrow, else the .arrow next to the CSV) when it is
+    at least as new as the CSV and pyarrow is available; otherwise parses the CSV.
+    """
+    path = Path(path)
+    store_path = path if path.suffix == ".arrow" else store_path_for(path)
+    fresh = store_path.exists() and (
+        store_path == path or not path.exists() or store_path.stat().st_mtime >= path.stat().st_mtime
+    )
+    if fresh:
+        try:
+            store = PriceStore(store_path)
+            return store.load(store.tickers if tickers is None else tickers, start_date, end_date)
+        except (ImportError, OSError, KeyError):
+            if store_path == path:
+                raise
+    df = normalize_prices(pd.read_csv(path))
+    if tickers is not None:
+        df = df[df["ticker"].isin([t.upper() for t in tickers])].reset_index(drop=True)
+    return df
+
+@timed("compute_returns")
+def compute_returns(df_prices: pd.DataFrame) -> pd.DataFrame:
+    df = df_prices.sort_values(["ticker", "dt"]).copy()
+    df["r"] = df.groupby("ticker")["price"].pct_change()
+    return df.dropna(subset=["r"])
@@ -0,0 +1,197 @@
+# Per-stage timing / memory instrumentation for the app, the CLI and batch jobs.
+#
+#   with stage("pivot", rows=len(df)) as rec:   # rec is a dict; extra fields go into the record
+#       ...
+#   @timed("load_prices")
+#   def load_prices(...): ...
+#
+# Disabled by default: stage() then returns a shared no-op context (one flag check).
+# Enable process-wide with enable(...) or the BACKTEST_DIAGNOSTICS env var ('1' -> stderr, else a
+# file path); use(...) switches the current thread only (one Streamlit session = one script
+# thread), and scope(...) runs a block (a background job) with given settings and fresh records.
+# Every finished stage becomes a record {ts, stage, parent, seconds, peak_mb?, ...}; records are
+# kept per thread and written as JSON lines to the 'backtest.diagnostics' logger.
+
+from __future__ import annotations
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger("backtest.diagnostics")
+
+_state = {"enabled": False, "memory": False}
+_local = threading.local()
+
+class _Null:
+    """No-op stage used while diagnostics are disabled."""
+    def __enter__(self):
+        return {}
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _Null()
+
+class _Stage:
+    __slots__ = ("rec", "t0", "mem0")
+
+    def __init__(self, name: str, fields: dict):
+        self.rec = {"stage": name, **fields}
+
+    def __enter__(self) -> dict:
+        stack = _stack()
+        self.rec["parent"] = stack[-1].rec["stage"] if stack else None
+        stack.append(self)
+        if _memory() and tracemalloc.is_tracing():
+            self.mem0 = tracemalloc.get_traced_memory()[0]
+            # child peaks are folded into the parent on exit, so resetting here is safe
+            self.rec["_peak"] = 0
+            tracemalloc.reset_peak()
+        else:
+            self.mem0 = None
+        self.t0 = time.perf_counter()
+        return self.rec
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.t0
+        stack = _stack()
+        stack.pop()
+        rec = self.rec
+        rec["seconds"] = seconds
+        if self.mem0 is not None:
+            peak = max(tracemalloc.get_traced_memory()[1], rec.pop("_peak"))
+            rec["peak_mb"] = max(0, peak - self.mem0) / 2**20
+            if stack and "_peak" in stack[-1].rec:
+                stack[-1].rec["_peak"] = max(stack[-1].rec["_peak"], peak)
+        if exc_type is not None:
+            rec["error"] = exc_type.__name__
+        rec["ts"] = time.time()
+        records().append(rec)
+        if logger.handlers or logging.getLogger().handlers:
+            logger.info(json.dumps(rec, default=str))
+        return False
+
+def _stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def records() -> list[dict]:
+    """Records of the current thread since the last reset()."""
+    if not hasattr(_local, "records"):
+        _local.records = []
+    return _local.records
+
+def reset() -> None:
+    _local.records = []
+
+def enabled() -> bool:
+    """Whether stages are recorded in the current thread (its own setting, else the process's)."""
+    on = getattr(_local, "enabled", None)
+    return _state["enabled"] if on is None else on
+
+def _memory() -> bool:
+    mem = getattr(_local, "memory", None)
+    return _state["memory"] if mem is None else mem
+
+def settings() -> tuple[bool, bool]:
+    """(enabled, memory) of the current thread, e.g. to run a background job with them."""
+    return enabled(), enabled() and _memory()
+
+def stage(name: str, **fields):
+    """Time (and optionally trace memory of) a block; yields the record dict."""
+    if not enabled():
+        return _NULL
+    return _Stage(name, fields)
+
+def timed(name: Optional[str] = None):
+    """Decorator form of stage(); the check for 'enabled' happens per call."""
+    def deco(fn):
+        label = name or fn.__name__
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return fn(*args, **kwargs)
+            with _Stage(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def enable(log_path: Optional[Path] = None, memory: bool = False, stream=None) -> None:
+    """Turn instrumentation on process-wide. log_path / stream add a JSON-lines handler (once
+    per target)."""
+    _state["enabled"] = True
+    _state["memory"] = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _add_handler(log_path, stream)
+
+def use(on: bool, memory: bool = False, log_path: Optional[Path] = None) -> None:
+    """Turn instrumentation on / off for the current thread only; other threads keep theirs.
+    tracemalloc is started when needed but never stopped here (another thread may rely on it)."""
+    _local.enabled, _local.memory = on, on and memory
+    if _local.memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if on:
+        _add_handler(log_path, None)
+
+@contextmanager
+def scope(on: bool, memory: bool = False):
+    """Run a block with the given settings and its own records (yielded list); the thread's
+    previous settings, records and stage stack are restored afterwards."""
+    saved = {k: getattr(_local, k) for k in ("enabled", "memory", "records", "stack") if hasattr(_local, k)}
+    use(on, memory)
+    _local.records, _local.stack = [], []
+    try:
+        yield _local.records
+    finally:
+        for k in ("enabled", "memory", "records", "stack"):
+            if k in saved:
+                setattr(_local, k, saved[k])
+            elif hasattr(_local, k):
+                delattr(_local, k)
+
+def _add_handler(log_path: Optional[Path], stream) -> None:
+    target = str(Path(log_path).resolve()) if log_path else None
+    for h in logger.handlers:
+        if getattr(h, "_diag_target", None) == (target or id(stream)):
+            break
+    else:
+        if log_path is not None:
+            Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+            handler = logging.FileHandler(log_path, encoding="utf-8")
+        elif stream is not None:
+            handler = logging.StreamHandler(stream)
+        else:
+            handler = None
+        if handler is not None:
+            handler._diag_target = target or id(stream)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+def disable() -> None:
+    _state["enabled"] = False
+    if _state["memory"] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _state["memory"] = False
+
+def summary(recs: Optional[list] = None) -> list[dict]:
+    """Top-level view for display: stage, ms, peak MB, cache, background job, in completion order."""
+    return [
+        {"stage": ("  " if r.get("parent") else "") + r["stage"], "ms": r["seconds"] * 1000,
+         "peak_mb": r.get("peak_mb"), "cache": r.get("cache", ""), "job": r.get("job", "")}
+        for r in (records() if recs is None else recs)
+    ]
+
+_env = os.environ.get("BACKTEST_DIAGNOSTICS")
+if _env:
+    enable(stream=sys.stderr) if _env == "1" else enable(log_path=Path(_env))
@@ -0,0 +1,87 @@
+# Chart-side downsampling: Largest-Triangle-Three-Buckets (LTTB) to a fixed point budget.
+# Keeps the visual shape (peaks, crashes) of long daily series while the number of points sent
+# to the browser stays ~constant. Works on (days x series) arrays: the bucket loop is sequential
+# by construction (each pick depends on the previous one), but every step is vectorized over
+# the bucket's points and all series at once.
+
+from __future__ import annotations
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+POINT_BUDGET = 1500   # points per trace (~1-2 per horizontal pixel of a wide chart)
+
+WINDOWS = {
+    "1M": pd.DateOffset(months=1),
+    "3M": pd.DateOffset(months=3),
+    "1Y": pd.DateOffset(years=1),
+    "5Y": pd.DateOffset(years=5),
+    "All": None,
+}
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Row positions selected by LTTB: x (T,), y (T,) or (T, k) -> (n_out,) or (n_out, k).
+
+    NaNs in y are never selected unless a whole bucket is NaN (gaps stay gaps).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    one = y.ndim == 1
+    Y = y[:, None] if one else y
+    T, k = Y.shape
+    if T <= n_out or n_out < 3:
+        idx = np.repeat(np.arange(T)[:, None], k, axis=1)
+        return idx[:, 0] if one else idx
+
+    nb = n_out - 2
+    edges = (np.arange(nb + 1) * (T - 2) / nb).astype(np.int64) + 1
+    edges[-1] = T - 1
+    # Bucket averages (NaN-aware) for the "next bucket" vertex C
+    valid = ~np.isnan(Y[:-1])
+    ysum = np.add.reduceat(np.where(valid, Y[:-1], 0.0), edges[:-1], axis=0)
+    ycnt = np.add.reduceat(valid, edges[:-1], axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        yavg = ysum / ycnt
+    xavg = np.add.reduceat(x[:-1], edges[:-1]) / np.diff(edges)
+    cx = np.append(xavg[1:], x[-1])
+    cy = np.vstack([yavg[1:], Y[-1:]])
+
+    out = np.empty((n_out, k), dtype=np.int64)
+    out[0], out[-1] = 0, T - 1
+    cols = np.arange(k)
+    a = np.zeros(k, dtype=np.int64)
+    for i in range(nb):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], Y[a, cols]
+        px, py = x[lo:hi, None], Y[lo:hi]
+        area = np.abs((ax - cx[i]) * (py - ay) - (ax - px) * (cy[i] - ay))
+        area = np.where(np.isnan(area), -1.0, area)
+        a = lo + np.argmax(area, axis=0)
+        out[i + 1] = a
+    return out[:, 0] if one else out
+
+def window(obj: Union[pd.Series, pd.DataFrame], label: str):
+    """Rows within the trailing window ('1M', '3M', '1Y', '5Y', 'All') of a date-indexed object."""
+    offset = WINDOWS[label]
+    if offset is None or obj.empty:
+        return obj
+    return obj.loc[obj.index[-1] - offset:]
+
+def downsample(
+    obj: Union[pd.Series, pd.DataFrame],
+    n_out: int = POINT_BUDGET,
+    label: Optional[str] = None,
+):
+    """Series -> downsampled Series; DataFrame -> dict column -> downsampled Series.
+
+    With 'label', the trailing window is sliced at full resolution first, so zooming in
+    gets more detail while the number of points per trace stays <= n_out.
+    """
+    if label is not None:
+        obj = window(obj, label)
+    x = obj.index.asi8.astype(float) if isinstance(obj.index, pd.DatetimeIndex) else np.arange(len(obj), dtype=float)
+    if isinstance(obj, pd.Series):
+        return obj.iloc[lttb_indices(x, obj.to_numpy(dtype=float), n_out)]
+    idx = lttb_indices(x, obj.to_numpy(dtype=float), n_out)
+    return {c: obj[c].iloc[idx[:, j]] for j, c in enumerate(obj.columns)}
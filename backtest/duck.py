@@ -0,0 +1,215 @@
+# DuckDB pushdown of the equal-weight monthly engine: returns, rebalance days, drifted holdings,
+# turnover and the daily portfolio series are computed as SQL inside the database (equities_daily in
+# data.duckdb, or any relation with dt, ticker, price). DuckDB runs it multi-threaded and spills
+# to disk past its memory limit, so the price history never has to fit in pandas; only the final
+# daily series (and, on request, the returns behind wide_ret) comes back, via Arrow.
+#
+#   con = connect("data.duckdb", threads=8, memory_limit="4GB")
+#   daily, summary, wide_ret, turnover = portfolio_engine_duckdb(con, tickers, ...)
+#
+# Same outputs and conventions as the pandas backend, rebalance.portfolio_engine with equal
+# weights and a monthly calendar (ragged listings, drift-aware); parity_check() compares the
+# two on identical prices.
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backtest.diagnostics import stage
+from backtest.engine import pivot_wide, summarize
+
+PRICES = "SELECT dt, ticker, CAST(price_close_eur AS DOUBLE) AS price FROM equities_daily"
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError(f"duckdb not installed. Run: pip install duckdb  (error: {e})") from e
+    return duckdb
+
+def connect(
+    path: Optional[Path] = None,
+    threads: Optional[int] = None,
+    memory_limit: Optional[str] = None,
+    temp_directory: Optional[Path] = None,
+):
+    """Read-only connection to a DuckDB file (in-memory if path is None).
+    memory_limit / temp_directory bound RAM use; larger intermediates spill to temp_directory."""
+    duckdb = _duckdb()
+    con = duckdb.connect(str(path), read_only=True) if path else duckdb.connect()
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    if memory_limit:
+        con.execute(f"SET memory_limit = '{memory_limit}'")
+    if temp_directory:
+        con.execute(f"SET temp_directory = '{Path(temp_directory).as_posix()}'")
+    return con
+
+def csv_prices(path: Path) -> str:
+    """Price relation over the raw CSV (Date, Ticker, Close_EUR), unrounded, for DBs without equities_daily."""
+    return (f"SELECT CAST(\"Date\" AS DATE) AS dt, UPPER(\"Ticker\") AS ticker, CAST(\"Close_EUR\" AS DOUBLE) AS price "
+            f"FROM read_csv_auto('{Path(path).as_posix()}') WHERE \"Close_EUR\" IS NOT NULL")
+
+# Selected prices up to end -> returns (LAG per ticker) -> days from start on; the start filter
+# comes after the LAG so the first day keeps its return (load_prices keeps a lookback row too).
+# Same conventions as rebalance.portfolio_engine(weights="equal", rebalance="monthly"): the
+# rebalance day is the first trading day of each month, targets are 1/n over the tickers listed
+# that day (first <= day <= last observation), holdings drift with each ticker's growth since
+# the rebalance, and a day's return is Σ h·r / Σ h over the tickers that traded. Turnover at a
+# rebalance compares the previous period's drifted weights with the new targets; it is charged
+# on the rebalance day.
+_BASKET = """
+WITH px AS (
+    SELECT dt, ticker, price FROM ({prices})
+    WHERE list_contains($tickers, ticker) AND price IS NOT NULL AND ($end IS NULL OR dt <= $end)
+),
+ret AS (
+    SELECT dt, ticker, price / LAG(price) OVER (PARTITION BY ticker ORDER BY dt) - 1 AS r FROM px
+),
+obs AS (
+    SELECT dt, ticker, r, date_trunc('month', dt) AS m FROM ret
+    WHERE r IS NOT NULL AND ($start IS NULL OR dt >= $start)
+)
+"""
+
+_DAILY = _BASKET + """,
+listing AS (SELECT ticker, min(dt) AS first_dt, max(dt) AS last_dt FROM obs GROUP BY ticker),
+events AS (SELECT m, min(dt) AS b, lag(m) OVER (ORDER BY m) AS prev_m FROM obs GROUP BY m),
+targets AS (
+    SELECT e.m, l.ticker, 1.0 / count(*) OVER (PARTITION BY e.m) AS w
+    FROM events e JOIN listing l ON l.first_dt <= e.b AND e.b <= l.last_dt
+),
+held AS (
+    SELECT o.dt, o.m, o.r, coalesce(t.w, 0.0) * exp(coalesce(sum(ln(1 + o.r)) OVER (
+               PARTITION BY o.m, o.ticker ORDER BY o.dt ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+           ), 0.0)) AS h
+    FROM obs o LEFT JOIN targets t USING (m, ticker)
+),
+grown AS (
+    SELECT t.m, t.ticker, t.w * exp(coalesce(sum(ln(1 + o.r)), 0.0)) AS g
+    FROM targets t LEFT JOIN obs o USING (m, ticker) GROUP BY t.m, t.ticker, t.w
+),
+moves AS (
+    SELECT m, ticker, w AS dw FROM targets
+    UNION ALL
+    SELECT e.m, g.ticker, -g.g / sum(g.g) OVER (PARTITION BY g.m) AS dw
+    FROM grown g JOIN events e ON e.prev_m = g.m
+),
+turnover AS (
+    SELECT e.m, e.b, CASE WHEN e.prev_m IS NULL THEN 0.0 ELSE sum(abs(d.dw)) END AS turnover
+    FROM events e JOIN (SELECT m, ticker, sum(dw) AS dw FROM moves GROUP BY m, ticker) d USING (m)
+    GROUP BY e.m, e.b, e.prev_m
+),
+days AS (
+    SELECT dt, m, CASE WHEN sum(h) > 0 THEN sum(h * r) / sum(h) ELSE 0.0 END AS r_gross
+    FROM held GROUP BY dt, m
+)
+SELECT d.dt, t.b AS m, t.turnover,
+       CASE WHEN d.dt = t.b THEN $tc * t.turnover ELSE 0.0 END AS cost_applied,
+       d.r_gross - CASE WHEN d.dt = t.b THEN $tc * t.turnover ELSE 0.0 END AS r_port
+FROM days d JOIN turnover t USING (m)
+ORDER BY d.dt
+"""
+
+_WIDE = _BASKET + """
+SELECT dt, ticker, r FROM obs
+"""
+
+def _params(tickers: Sequence[str], start_date, end_date, **extra) -> dict:
+    return {
+        "tickers": [t.upper() for t in tickers],
+        "start": None if start_date is None else pd.Timestamp(start_date).date(),
+        "end": None if end_date is None else pd.Timestamp(end_date).date(),
+        **extra,
+    }
+
+def _arrow_frame(con, sql: str, params: dict) -> pd.DataFrame:
+    table = con.execute(sql, params).arrow()
+    if hasattr(table, "read_all"):   # duckdb >= 1.4 returns a RecordBatchReader
+        table = table.read_all()
+    return table.to_pandas()
+
+def portfolio_engine_duckdb(
+    con,
+    tickers: list[str],
+    start_cash: float,
+    tc_pct: float,
+    rf_annual: float,
+    start_date: Optional[pd.Timestamp],
+    end_date: Optional[pd.Timestamp],
+    alpha: float = 0.95,
+    prices: str = PRICES,
+    return_wide: bool = True,
+):
+    """rebalance.portfolio_engine (equal weights, monthly) with the heavy steps run in DuckDB.
+
+    con: DuckDB connection (see connect()); prices: SQL relation with columns dt, ticker, price
+    (default: equities_daily). end_date filters prices, start_date filters returns (the first
+    day keeps its return from the previous close, as with load_prices' lookback row).
+    wide_ret (long rows of every observation, pivoted here) is fetched only when return_wide.
+    """
+    params = _params(tickers, start_date, end_date)
+    with stage("engine", tickers=len(tickers), backend="duckdb"):
+        with stage("duckdb_daily") as rec:
+            out = _arrow_frame(con, _DAILY.format(prices=prices), {**params, "tc": float(tc_pct)})
+            rec["rows"] = len(out)
+        if out.empty:
+            return pd.DataFrame(), {}, pd.DataFrame(), pd.Series(dtype=float)
+
+        idx = pd.DatetimeIndex(pd.to_datetime(out["dt"]), name="dt")
+        m_day = pd.DatetimeIndex(pd.to_datetime(out["m"]))
+        r_port = pd.Series(out["r_port"].to_numpy(dtype=float), index=idx)
+        first = np.flatnonzero(np.diff(m_day.asi8, prepend=m_day.asi8[:1] - 1))
+        turnover = pd.Series(out["turnover"].to_numpy(dtype=float)[first], index=m_day[first].rename(None))
+
+        equity, summary = summarize(r_port, turnover, start_cash, rf_annual, alpha)
+        daily = pd.DataFrame({
+            "dt": idx,
+            "r_port": r_port.values,
+            "equity": equity.values,
+            "m": m_day,
+            "cost_applied": out["cost_applied"].to_numpy(dtype=float)
+        }).set_index("dt")
+
+        wide = pd.DataFrame()
+        if return_wide:
+            with stage("duckdb_wide"):
+                w = _arrow_frame(con, _WIDE.format(prices=prices), params)
+            w["dt"] = pd.to_datetime(w["dt"])
+            wide = pivot_wide(w)
+        return daily, summary, wide, turnover
+
+def parity_check(
+    con,
+    tickers: list[str],
+    tc_pct: float = 0.001,
+    start_date: Optional[pd.Timestamp] = None,
+    end_date: Optional[pd.Timestamp] = None,
+    prices: str = PRICES,
+) -> dict:
+    """Max absolute differences between the DuckDB engine and the pandas backend's engine
+    (rebalance.portfolio_engine, equal weights, monthly) on the same prices."""
+    from backtest.data import compute_returns
+    from backtest.rebalance import portfolio_engine
+
+    df = _arrow_frame(
+        con, f"SELECT dt, ticker, price FROM ({prices}) WHERE list_contains($tickers, ticker) "
+             "AND price IS NOT NULL AND ($end IS NULL OR dt <= $end)",
+        {k: v for k, v in _params(tickers, start_date, end_date).items() if k != "start"},
+    )
+    df["dt"] = pd.to_datetime(df["dt"])
+    ref = portfolio_engine(compute_returns(df), tickers, 1.0, tc_pct, 0.0, start_date, end_date,
+                           weights="equal", rebalance="monthly")
+    got = portfolio_engine_duckdb(con, tickers, 1.0, tc_pct, 0.0, start_date, end_date, prices=prices)
+    if ref[0].empty or got[0].empty:
+        return {"days": (len(ref[0]), len(got[0]))}
+    return {
+        "days": (len(ref[0]), len(got[0])),
+        "r_port": float(np.abs(ref[0]["r_port"].to_numpy() - got[0]["r_port"].to_numpy()).max()),
+        "turnover": float(np.abs(ref[3].to_numpy() - got[3].to_numpy()).max()),
+        "wide": float(np.nanmax(np.abs(ref[2].to_numpy() - got[2][ref[2].columns].to_numpy()))),
+        "summary": max(abs(ref[1][k] - got[1][k]) for k in ref[1]),
+    }
@@ -0,0 +1,199 @@
+# Backtest engine (equal-weight, monthly rebalance) — no Streamlit/Plotly imports
+# Used by app.py and by batch jobs (sweeps, process-pool workers).
+
+from __future__ import annotations
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backtest.diagnostics import stage
+
+TRADING_DAYS = 252
+
+# ---------- Utils ----------
+def norm_ppf(p: float) -> float:
+    """Inverse CDF of standard normal (Acklam's rational approximation).
+       No SciPy dependency; good to ~1e-6 on (0,1).
+    """
+    if not (0.0 < p < 1.0):
+        raise ValueError("p must be in (0,1)")
+    a = [-3.969683028665376e+01,  2.209460984245205e+02,
+         -2.759285104469687e+02,  1.383577518672690e+02,
+         -3.066479806614716e+01,  2.506628277459239e+00]
+    b = [-5.447609879822406e+01,  1.615858368580409e+02,
+         -1.556989798598866e+02,  6.680131188771972e+01,
+         -1.328068155288572e+01]
+    c = [-7.784894002430293e-03, -3.223964580411365e-01,
+         -2.400758277161838e+00, -2.549732539343734e+00,
+          4.374664141464968e+00,  2.938163982698783e+00]
+    d = [ 7.784695709041462e-03,  3.224671290700398e-01,
+          2.445134137142996e+00,  3.754408661907416e+00]
+    plow = 0.02425
+    phigh = 1 - plow
+    if p < plow:
+        q = math.sqrt(-2 * math.log(p))
+        return (((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / \
+               ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
+    if phigh < p:
+        q = math.sqrt(-2 * math.log(1 - p))
+        return -(((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / \
+                 ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
+    q = p - 0.5
+    r = q*q
+    return (((((a[0]*r + a[1])*r + a[2])*r + a[3])*r + a[4])*r + a[5]) * q / \
+           (((((b[0]*r + b[1])*r + b[2])*r + b[3])*r + b[4])*r + 1)
+
+def month_key(d: pd.Series) -> pd.Series:
+    return d.dt.to_period("M").dt.to_timestamp()
+
+def max_drawdown(equity: pd.Series) -> float:
+    roll_max = equity.cummax()
+    return (equity / roll_max - 1.0).min()
+
+def cagr(equity: pd.Series, trading_days=TRADING_DAYS) -> float:
+    if equity.empty:
+        return np.nan
+    total_return = equity.iloc[-1] / equity.iloc[0] - 1.0
+    years = len(equity) / trading_days
+    return (1.0 + total_return) ** (1.0 / years) - 1.0 if years > 0 else np.nan
+# ---------- Engine ----------
+def pivot_wide(df: pd.DataFrame) -> pd.DataFrame:
+    """Long (dt, ticker, r) -> wide (dt x ticker) via factorize + scatter.
+       Same shape/labels as df.pivot(...).sort_index(), without the MultiIndex unstack.
+    """
+    dt_codes, dts = pd.factorize(df["dt"], sort=True)
+    tk_codes, tks = pd.factorize(df["ticker"], sort=True)
+    values = np.full((len(dts), len(tks)), np.nan)
+    values[dt_codes, tk_codes] = df["r"].to_numpy(dtype=float)
+    return pd.DataFrame(
+        values,
+        index=pd.DatetimeIndex(dts, name="dt"),
+        columns=pd.Index(tks, name="ticker"),
+    )
+
+def month_starts(index: pd.DatetimeIndex) -> np.ndarray:
+    """Positions of the first trading day of each month in a sorted DatetimeIndex."""
+    ym = index.year.to_numpy() * 12 + index.month.to_numpy()
+    return np.flatnonzero(np.diff(ym, prepend=ym[:1] - 1))
+
+def equal_monthly_arrays(R: np.ndarray, starts: np.ndarray, tc_pct: float):
+    """Array core of the equal-weight monthly engine.
+
+    R: (days x tickers) simple returns, starts: month-start row positions.
+    Returns (r_port, cost_applied, turnover), turnover[0] = 0 by convention.
+    """
+    n = R.shape[1]
+    w = np.full(n, 1.0 / n)
+
+    # Monthly gross return per ticker via log-sum: exp(Σ log(1+r)) - 1
+    g_month = np.expm1(np.add.reduceat(np.log1p(R), starts, axis=0))
+
+    # Turnover between drifted end-of-month weights and next month's equal target
+    grow = w * (1.0 + g_month[:-1])
+    w_end = grow / grow.sum(axis=1, keepdims=True)
+    turnover = np.zeros(len(starts))
+    turnover[1:] = np.abs(w_end - w).sum(axis=1)
+
+    # Daily portfolio return (weights = equal within month), cost on first day of each month
+    cost_applied = np.zeros(R.shape[0])
+    cost_applied[starts[1:]] = tc_pct * turnover[1:]
+    r_port = R @ w - cost_applied
+    return r_port, cost_applied, turnover
+
+def summarize(r_port: pd.Series, turnover: pd.Series, start_cash: float, rf_annual: float, alpha: float,
+              turnover_key: str = "Turnover (avg/rebalance)"):
+    """Equity curve and the KPI dict shared by the engines (VaR/ES as positive loss fractions).
+
+    rf_annual: constant annual rate, or a time-varying one (riskfree.RiskFreeRate) for which the
+    Sharpe ratio is that of the daily excess returns.
+    turnover_key: the legacy equal-monthly engine keeps its 'Turnover (avg/month)' key.
+    """
+    r = r_port.to_numpy()
+    equity = start_cash * (1.0 + r_port).cumprod()
+
+    # Risk / summary
+    ann_mu = r_port.mean() * TRADING_DAYS
+    ann_sigma = r_port.std(ddof=1) * np.sqrt(TRADING_DAYS)
+    if hasattr(rf_annual, "annual"):
+        excess = r - rf_annual.annual(r_port.index) / TRADING_DAYS
+        ex_sigma = excess.std(ddof=1) * np.sqrt(TRADING_DAYS) if len(excess) > 1 else np.nan
+        sharpe = excess.mean() * TRADING_DAYS / ex_sigma if ex_sigma > 0 else np.nan
+    else:
+        sharpe = (ann_mu - rf_annual) / ann_sigma if ann_sigma > 0 else np.nan
+    mdd = max_drawdown(equity)
+    total_return = equity.iloc[-1] / equity.iloc[0] - 1.0
+    cagr_val = cagr(equity, TRADING_DAYS)
+
+    # VaR/ES (daily) at chosen alpha
+    z = norm_ppf(alpha)
+    mu_d, sd_d = r_port.mean(), r_port.std(ddof=1)
+    var_norm = -(mu_d - z * sd_d)  # VaR reported as positive loss fraction
+    losses = -r
+    var_hist = np.quantile(losses, alpha)
+    es_hist = losses[losses >= var_hist].mean()
+
+    summary = {
+        "Final Equity": float(equity.iloc[-1]),
+        "Total Return": float(total_return),
+        "CAGR": float(cagr_val),
+        "Ann. Vol": float(ann_sigma),
+        "Ann. Sharpe": float(sharpe),
+        "Max Drawdown": float(mdd),
+        "VaR (norm, daily)": float(var_norm),
+        "VaR (hist, daily)": float(var_hist),
+        "ES (hist, daily)": float(es_hist),
+        turnover_key: float(turnover.iloc[1:].mean()) if len(turnover) > 1 else 0.0
+    }
+    return equity, summary
+
+def portfolio_engine_equal_monthly(
+    r_df: pd.DataFrame,
+    tickers: list[str],
+    start_cash: float,
+    tc_pct: float,
+    rf_annual: float,
+    start_date: Optional[pd.Timestamp],
+    end_date: Optional[pd.Timestamp],
+    alpha: float = 0.95,
+):
+    """Return: daily (DataFrame), summary (dict), wide_ret (DataFrame), turnover (Series by month)."""
+    with stage("engine", tickers=len(tickers)):
+        return _engine_equal_monthly(r_df, tickers, start_cash, tc_pct, rf_annual, start_date, end_date, alpha)
+
+def _engine_equal_monthly(r_df, tickers, start_cash, tc_pct, rf_annual, start_date, end_date, alpha):
+    df = r_df[r_df["ticker"].isin([t.upper() for t in tickers])]
+    if start_date is not None:
+        df = df[df["dt"] >= start_date]
+    if end_date is not None:
+        df = df[df["dt"] <= end_date]
+    if df.empty:
+        return pd.DataFrame(), {}, pd.DataFrame(), pd.Series(dtype=float)
+
+    # Pivot to wide; require full basket each day to keep it simple
+    with stage("pivot", rows=len(df)):
+        wide = pivot_wide(df).dropna(how="any")
+    if wide.empty:
+        return pd.DataFrame(), {}, pd.DataFrame(), pd.Series(dtype=float)
+
+    starts = month_starts(wide.index)
+    months = wide.index[starts].to_period("M").to_timestamp().rename(None)
+    m_day = months[np.searchsorted(starts, np.arange(len(wide)), side="right") - 1]
+
+    with stage("monthly_rebalance", days=len(wide)):
+        r, cost, turn = equal_monthly_arrays(wide.to_numpy(), starts, tc_pct)
+    r_port = pd.Series(r, index=wide.index)
+    turnover = pd.Series(turn, index=months)
+
+    equity, summary = summarize(r_port, turnover, start_cash, rf_annual, alpha, "Turnover (avg/month)")
+
+    daily = pd.DataFrame({
+        "dt": r_port.index,
+        "r_port": r,
+        "equity": equity.values,
+        "m": m_day,
+        "cost_applied": cost
+    }).set_index("dt")
+
+    return daily, summary, wide, turnover
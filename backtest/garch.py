@@ -0,0 +1,305 @@
+# GARCH(1,1) with a NumPy-only variance filter and Gaussian likelihood ('arch' not required).
+#   sigma2_t = omega + alpha * eps2_{t-1} + beta * sigma2_{t-1},  eps = 100 * r - mu
+# The recursion is evaluated in blocks: within a block it is one matrix product with powers
+# of beta, only the block-to-block carry is a (short) Python loop.
+# Fits are cached by series fingerprint; a series that extends a cached one warm-starts.
+
+from __future__ import annotations
+import hashlib
+import json
+import math
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backtest.diagnostics import timed
+from backtest.jobs import progress
+
+SCALE = 100.0      # fit on percent returns, as arch does
+MIN_OBS = 300
+BLOCK = 64
+BACKCAST_OBS = 75
+
+# ---------- Filter / likelihood ----------
+def backcast(eps: np.ndarray) -> float:
+    """Initial variance: exponentially weighted mean of the first eps² (arch's default)."""
+    n = min(BACKCAST_OBS, len(eps))
+    w = 0.94 ** np.arange(n)
+    return float(np.sum(w / w.sum() * eps[:n] ** 2))
+
+def garch_variance(eps: np.ndarray, omega: float, alpha: float, beta: float, s0: float) -> np.ndarray:
+    """Conditional variance path; eps2 and sigma2 before t=0 are set to s0."""
+    T = len(eps)
+    u = np.empty(T)
+    u[0] = omega + alpha * s0
+    u[1:] = omega + alpha * eps[:-1] ** 2
+    nb = -(-T // BLOCK)
+    U = np.zeros(nb * BLOCK)
+    U[:T] = u
+    U = U.reshape(nb, BLOCK)
+
+    # Zero-state response per block: Z[b, j] = Σ_{i<=j} beta^(j-i) u[b, i]
+    lag = np.arange(BLOCK)[:, None] - np.arange(BLOCK)[None, :]
+    M = np.where(lag >= 0, beta ** np.maximum(lag, 0), 0.0)
+    Z = U @ M.T
+    pw = beta ** np.arange(1, BLOCK + 1)
+
+    # Carry the state into each block: S[b] = sigma2 just before block b
+    S = np.empty(nb)
+    s = s0
+    for b in range(nb):
+        S[b] = s
+        s = pw[-1] * s + Z[b, -1]
+    return (S[:, None] * pw[None, :] + Z).ravel()[:T]
+
+def garch_loglik(eps: np.ndarray, params, s0: float) -> float:
+    omega, alpha, beta = params
+    sigma2 = garch_variance(eps, omega, alpha, beta, s0)
+    if np.any(sigma2 <= 0):
+        return -np.inf
+    return float(-0.5 * np.sum(np.log(2 * np.pi) + np.log(sigma2) + eps ** 2 / sigma2))
+
+# Unconstrained <-> constrained: omega = exp(x0), persistence = sigmoid(x1), alpha share = sigmoid(x2)
+def _to_params(x: np.ndarray) -> tuple[float, float, float]:
+    p = 1.0 / (1.0 + math.exp(-x[1]))
+    a = 1.0 / (1.0 + math.exp(-x[2]))
+    return math.exp(x[0]), p * a, p * (1.0 - a)
+
+def _to_x(params) -> np.ndarray:
+    omega, alpha, beta = params
+    p = min(max(alpha + beta, 1e-6), 1 - 1e-6)
+    a = min(max(alpha / p, 1e-6), 1 - 1e-6)
+    return np.array([math.log(omega), math.log(p / (1 - p)), math.log(a / (1 - a))])
+
+def nelder_mead(f, x0: np.ndarray, step: float = 0.5, tol: float = 1e-7, max_iter: int = 600) -> np.ndarray:
+    """Minimize f from x0 (small, dependency-free Nelder-Mead)."""
+    n = len(x0)
+    simplex = np.vstack([x0] + [x0 + step * np.eye(n)[i] for i in range(n)])
+    fvals = np.array([f(x) for x in simplex])
+    for _ in range(max_iter):
+        order = np.argsort(fvals)
+        simplex, fvals = simplex[order], fvals[order]
+        if abs(fvals[-1] - fvals[0]) <= tol * (abs(fvals[0]) + tol):
+            break
+        centroid = simplex[:-1].mean(axis=0)
+        xr = centroid + (centroid - simplex[-1])
+        fr = f(xr)
+        if fr < fvals[0]:
+            xe = centroid + 2.0 * (centroid - simplex[-1])
+            fe = f(xe)
+            simplex[-1], fvals[-1] = (xe, fe) if fe < fr else (xr, fr)
+        elif fr < fvals[-2]:
+            simplex[-1], fvals[-1] = xr, fr
+        else:
+            xc = centroid + 0.5 * (simplex[-1] - centroid)
+            fc = f(xc)
+            if fc < fvals[-1]:
+                simplex[-1], fvals[-1] = xc, fc
+            else:
+                simplex[1:] = simplex[0] + 0.5 * (simplex[1:] - simplex[0])
+                fvals[1:] = [f(x) for x in simplex[1:]]
+    return simplex[np.argmin(fvals)]
+
+# ---------- Fit ----------
+def fit_garch(r: np.ndarray, start: Optional[dict] = None) -> dict:
+    """Fit GARCH(1,1) with constant mean to simple returns r (Gaussian MLE).
+
+    start: previous fit (dict with mu/omega/alpha/beta) to warm-start from.
+    Returns dict(mu, omega, alpha, beta, loglik, n), parameters on the percent scale.
+    """
+    y = np.asarray(r, dtype=float) * SCALE
+    if start is not None:
+        x0, step = np.append(_to_x((start["omega"], start["alpha"], start["beta"])), start["mu"]), 0.1
+    else:
+        x0, step = np.append(_to_x((0.05 * y.var(), 0.05, 0.90)), y.mean()), 0.5
+
+    def nll(x):
+        eps = y - x[3]
+        val = garch_loglik(eps, _to_params(x), backcast(eps))
+        return -val if np.isfinite(val) else 1e300
+
+    x = nelder_mead(nll, x0, step=step)
+    omega, alpha, beta = _to_params(x)
+    return {"mu": float(x[3]), "omega": omega, "alpha": alpha, "beta": beta, "loglik": -nll(x), "n": len(y)}
+
+def conditional_vol(r: np.ndarray, fit: dict) -> np.ndarray:
+    """Daily conditional volatility (fraction, not percent) of r under fitted parameters."""
+    eps = np.asarray(r, dtype=float) * SCALE - fit["mu"]
+    sigma2 = garch_variance(eps, fit["omega"], fit["alpha"], fit["beta"], backcast(eps))
+    return np.sqrt(sigma2) / SCALE
+
+# ---------- Cache ----------
+def fingerprint(r: np.ndarray) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(r, dtype=float).tobytes(), digest_size=16).hexdigest()
+
+class GarchCache:
+    """Fits keyed by series name; optional JSON file persists them across restarts.
+    Safe for concurrent jobs: fits run unlocked, updates and saves are serialized, and each save
+    merges the file's current entries (other processes) before an atomic replace."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._fits: dict = self._read()
+
+    def _read(self) -> dict:
+        if self.path and self.path.exists():
+            try:
+                return json.loads(self.path.read_text())
+            except (OSError, ValueError):
+                return {}
+        return {}
+
+    def __getstate__(self) -> dict:
+        # Picklable for process-backend jobs; each copy saves through the merge in _save
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def lookup(self, key: str, r: np.ndarray) -> tuple[Optional[dict], Optional[dict]]:
+        """(cached fit if r is the stored series, warm-start fit if r extends it); None otherwise."""
+        r = np.asarray(r, dtype=float)
+        with self._lock:
+            prev = self._fits.get(key)
+        if not prev:
+            return None, None
+        if prev["fingerprint"] == fingerprint(r):
+            return prev, None
+        # New data appended to the cached series -> warm start from its parameters
+        extends = prev["n"] < len(r) and fingerprint(r[:prev["n"]]) == prev["fingerprint"]
+        return None, prev if extends else None
+
+    def store(self, key: str, r: np.ndarray, result: dict) -> dict:
+        """Record the fit of r under key (and persist it); returns the stored entry."""
+        result = {**result, "fingerprint": fingerprint(np.asarray(r, dtype=float))}
+        with self._lock:
+            self._fits[key] = result
+            self._save(key)
+        return result
+
+    def fit(self, key: str, r: np.ndarray) -> tuple[dict, str]:
+        """Cached fit for r; returns (fit, how) with how in {'cached', 'warm', 'cold'}."""
+        r = np.asarray(r, dtype=float)
+        cached, warm = self.lookup(key, r)
+        if cached is not None:
+            return cached, "cached"
+        return self.store(key, r, fit_garch(r, start=warm)), "warm" if warm else "cold"
+
+    def _save(self, key: str) -> None:
+        """Write the file with 'key' updated (caller holds the lock)."""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Entries saved meanwhile by other processes win, except the one just fitted here
+        self._fits = {**self._fits, **self._read(), key: self._fits[key]}
+        tmp = self.path.parent / f".{self.path.name}.{uuid.uuid4().hex}.tmp"
+        try:
+            tmp.write_text(json.dumps(self._fits))
+            tmp.replace(self.path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+# ---------- Rolling / expanding refits ----------
+def refit_path(
+    r: np.ndarray,
+    mode: str = "expanding",
+    window: int = 1000,
+    refit_every: int = 21,
+    min_obs: int = MIN_OBS,
+) -> np.ndarray:
+    """Out-of-sample conditional vol: refit every 'refit_every' days on the expanding sample
+    (or the last 'window' days), warm-started from the previous refit, and filter forward."""
+    r = np.asarray(r, dtype=float)
+    T = len(r)
+    out = np.full(T, np.nan)
+    fit = None
+    for t in range(min_obs, T, refit_every):
+        lo = 0 if mode == "expanding" else max(0, t - window)
+        fit = fit_garch(r[lo:t], start=fit)
+        hi = min(T, t + refit_every)
+        out[t:hi] = conditional_vol(r[lo:hi], fit)[t - lo:]
+    return out
+
+def _refit_column(args):
+    return refit_path(*args)
+
+def _fit_column(args):
+    r, warm = args
+    return fit_garch(r, start=warm)
+
+def garch_panel(
+    wide_ret: pd.DataFrame,
+    mode: str = "full",
+    window: int = 1000,
+    refit_every: int = 21,
+    n_jobs: int = 1,
+    cache: Optional[GarchCache] = None,
+    key_prefix: str = "ticker:",
+) -> pd.DataFrame:
+    """Conditional vol for every ticker (dt x ticker).
+
+    mode='full': one in-sample fit per ticker; 'expanding' / 'rolling': periodic out-of-sample
+    refits. Fits are spread over a process pool when n_jobs > 1.
+    cache: in 'full' mode, each ticker's fit is looked up under key_prefix + ticker: reused when
+    its series is unchanged, warm-started when the series extends the cached one. Refit paths
+    warm-start from their own previous refit and are not cached.
+    """
+    if mode not in ("full", "expanding", "rolling"):
+        raise ValueError("mode must be 'full', 'expanding' or 'rolling'")
+    cols = [wide_ret[c].dropna() for c in wide_ret.columns]
+    fits: list = [None] * len(cols)
+    todo = []
+    if mode == "full":
+        tasks, fn = [], _fit_column
+        for i, c in enumerate(cols):
+            if len(c) < MIN_OBS:
+                continue
+            cached, warm = cache.lookup(key_prefix + str(c.name), c.to_numpy()) if cache is not None else (None, None)
+            if cached is not None:
+                fits[i] = cached
+            else:
+                todo.append(i)
+                tasks.append((c.to_numpy(), warm))
+    else:
+        tasks, fn = [(c.to_numpy(), mode, window, refit_every) for c in cols], _refit_column
+    out = []
+    if n_jobs == 1 or len(tasks) <= 1:
+        for t in tasks:
+            out.append(fn(t))
+            progress(len(out) / len(tasks), f"GARCH {len(out)}/{len(tasks)} fits")
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+            for v in ex.map(fn, tasks):
+                out.append(v)
+                progress(len(out) / len(tasks), f"GARCH {len(out)}/{len(tasks)} fits")
+
+    if mode == "full":
+        for i, fit in zip(todo, out):
+            r = cols[i].to_numpy()
+            fits[i] = cache.store(key_prefix + str(cols[i].name), r, fit) if cache is not None else fit
+        vols = [np.full(len(c), np.nan) if f is None else conditional_vol(c.to_numpy(), f)
+                for c, f in zip(cols, fits)]
+    else:
+        vols = out
+    return pd.DataFrame(
+        {c.name: pd.Series(v, index=c.index) for c, v in zip(cols, vols)}
+    ).reindex(wide_ret.index)
+
+@timed("try_garch")
+def try_garch(portfolio_returns: pd.Series, cache: Optional[GarchCache] = None, key: str = "portfolio"):
+    """(cond_vol Series, None) or (None, message) if the series is too short."""
+    r = portfolio_returns.dropna()
+    if len(r) < MIN_OBS:
+        return None, "Not enough data for GARCH (need ~300+ observations)."
+    x = r.to_numpy()
+    fit = cache.fit(key, x)[0] if cache is not None else fit_garch(x)
+    return pd.Series(conditional_vol(x, fit), index=r.index), None
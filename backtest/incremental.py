@@ -0,0 +1,330 @@
+# Incremental append mode for the drift-aware engine (backtest.rebalance).
+#
+# A Snapshot is the engine's state after its last day: holdings (segment-relative, as in
+# drift_arrays), cash share, current targets and calendar period, the running moments /
+# extremes / sorted losses behind the summary, a short tail of wide returns for the weight
+# functions' lookbacks, and the daily / turnover outputs so far. New trading days are then
+# stepped forward one by one in O(tickers) each, instead of recomputing the whole history.
+#
+#   snap = Snapshot.build(r_df, tickers, start_cash, tc_pct, rf_annual, start_date, alpha, ...)
+#   snap.save(state_dir)
+#   snap = Snapshot.load(state_dir).update(r_df)     # appends, or rebuilds on a backfill
+#   snap.daily, snap.summary(), snap.turnover
+#
+# update() reads only the tail window and the new days: it falls back to a full rebuild when
+# the rows inside the tail changed (checksum vs. the stored tail), when new tickers appear, or when a
+# ticker's listing status at a rebalance could differ from a full run (it had not traded since
+# before the current segment, or it is outside its listing range on a new rebalance day but
+# trades later). Exact parity also needs each weight function's lookback to fit in the tail
+# (TAIL_DAYS rows). Changes before the tail (old backfills) are only caught by
+# update(validate=True), which checks the whole history against the stored checksum.
+
+from __future__ import annotations
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backtest.diagnostics import stage
+from backtest.engine import TRADING_DAYS, norm_ppf
+from backtest.panel import ReturnPanel
+from backtest.rebalance import CALENDARS, WEIGHTS, live_targets, run_panel
+
+TAIL_DAYS = 252   # >= the lookbacks of inverse_vol (63 obs) and min_variance (126 days)
+STATE = "state.json"
+
+def _period(dates: pd.DatetimeIndex, calendar: str) -> np.ndarray:
+    """Calendar period key per day; a rebalance happens when it changes (daily: every day)."""
+    if calendar == "monthly":
+        return dates.year.to_numpy() * 12 + dates.month.to_numpy()
+    if calendar == "weekly":
+        return (dates.normalize() - pd.to_timedelta(dates.dayofweek, unit="D")).asi8
+    return dates.asi8
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer (uint64 arithmetic wraps)."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _checksum(df: pd.DataFrame, tickers: list[str]) -> list:
+    """[rows, Σ hash(day, ticker, r) mod 2^64]: one O(rows) pass, no sort. Order-sensitive along
+    the history: each row's hash includes its day and ticker, so values moved or swapped between
+    days / tickers change it. The frame's row order is irrelevant (the sum commutes), which lets
+    a longer history's checksum extend the old one by the new rows' (see _extend)."""
+    day = df["dt"].to_numpy(dtype="datetime64[ns]").view(np.uint64)
+    tk = pd.Index(tickers).get_indexer(df["ticker"]).astype(np.uint64)
+    bits = np.ascontiguousarray(df["r"].to_numpy(dtype=float)).view(np.uint64)
+    h = _mix(_mix(_mix(day) ^ tk) ^ bits)
+    return [int(len(h)), int(h.sum(dtype=np.uint64))]
+
+def _extend(a: list, b: list) -> list:
+    return [a[0] + b[0], (a[1] + b[1]) % (1 << 64)]
+
+def _long(wide: pd.DataFrame) -> pd.DataFrame:
+    """Observed cells of a (dt x ticker) frame as long (dt, ticker, r) rows."""
+    X = wide.to_numpy(dtype=float)
+    i, j = np.nonzero(~np.isnan(X))
+    return pd.DataFrame({"dt": wide.index[i], "ticker": wide.columns[j], "r": X[i, j]})
+
+class Snapshot:
+    """Engine state after the last processed day plus the outputs so far."""
+
+    def __init__(self, params: dict, state: dict, arrays: dict, daily: pd.DataFrame,
+                 turnover: pd.Series, tail: pd.DataFrame):
+        self.params, self.state, self.arrays = params, state, arrays
+        self.daily, self.turnover, self.tail = daily, turnover, tail
+        self.mode = "loaded"
+
+    # ---------- Full build ----------
+    @classmethod
+    def build(
+        cls,
+        r_df: pd.DataFrame,
+        tickers: list[str],
+        start_cash: float,
+        tc_pct: float,
+        rf_annual: float,
+        start_date: Optional[pd.Timestamp] = None,
+        alpha: float = 0.95,
+        weights: str = "equal",
+        rebalance: str = "monthly",
+        band: float = 0.05,
+    ) -> "Snapshot":
+        """Full run of rebalance.portfolio_engine's core, keeping the end state."""
+        if rebalance not in CALENDARS or weights not in WEIGHTS:
+            raise ValueError(f"weights must be one of {list(WEIGHTS)}, rebalance one of {CALENDARS}")
+        params = {"tickers": [t.upper() for t in tickers], "start_cash": start_cash, "tc_pct": tc_pct,
+                  "rf_annual": rf_annual, "start_date": None if start_date is None else str(start_date),
+                  "alpha": alpha, "weights": weights, "rebalance": rebalance, "band": band}
+        with stage("snapshot_build"):
+            df = cls._select(r_df, params)
+            if df.empty:
+                raise ValueError("No data for the selection.")
+            panel = ReturnPanel.from_long(df)
+            rows, W, r, cost, turn = run_panel(panel, WEIGHTS[weights](), rebalance, band, tc_pct)
+
+            # Holdings at the close of the last day, relative to the last segment's start value
+            G, k = panel.cum_log, len(rows) - 1
+            B = panel.pos_before(np.array([rows[k], panel.T]))
+            h = W[k] * np.exp(G[B[1]] - G[B[0]])
+
+            equity = start_cash * np.cumprod(1.0 + r)
+            n = len(r)
+            mean = r.mean()
+            state = {
+                "last_date": str(panel.dates[-1]), "period": int(_period(panel.dates[-1:], rebalance)[0]),
+                "segment": str(panel.dates[rows[k]]), "cash": float(1.0 - W[k].sum()),
+                "n": n, "mean": float(mean), "m2": float(((r - mean) ** 2).sum()),
+                "equity_first": float(equity[0]), "equity_last": float(equity[-1]),
+                "peak": float(equity.max()), "mdd": float((equity / np.maximum.accumulate(equity) - 1.0).min()),
+                "turnover_sum": float(turn[1:].sum()), "turnover_n": len(turn) - 1,
+                "history": _checksum(df, params["tickers"]),
+            }
+            arrays = {"tickers": np.asarray(panel.tickers, dtype=str), "h": h, "targets": W[k],
+                      "losses": np.sort(-r)}
+            daily = pd.DataFrame({
+                "dt": panel.dates, "r_port": r, "equity": equity,
+                "m": panel.dates[rows][np.searchsorted(rows, np.arange(panel.T), side="right") - 1],
+                "cost_applied": cost,
+            }).set_index("dt")
+            turnover = pd.Series(turn, index=panel.dates[rows].rename(None))
+            tail = pd.DataFrame(panel.dense(max(0, panel.T - TAIL_DAYS)), index=panel.dates[-TAIL_DAYS:],
+                                columns=panel.tickers)
+        snap = cls(params, state, arrays, daily, turnover, tail)
+        snap.mode = "full"
+        return snap
+
+    @staticmethod
+    def _select(r_df: pd.DataFrame, params: dict) -> pd.DataFrame:
+        df = r_df[r_df["ticker"].isin(params["tickers"]) & r_df["r"].notna()]
+        if params["start_date"] is not None:
+            df = df[df["dt"] >= pd.Timestamp(params["start_date"])]
+        return df
+
+    # ---------- Incremental update ----------
+    def update(self, r_df: pd.DataFrame, validate: bool = False) -> "Snapshot":
+        """Bring the snapshot up to the last date in r_df (same selection as build).
+
+        Only rows from the tail's first day on are selected and checked (against the stored
+        tail); validate=True also checks the whole history up to the snapshot (O(rows)).
+        """
+        p, s = self.params, self.state
+        last = pd.Timestamp(s["last_date"])
+        if validate:
+            df = self._select(r_df, p)
+            if _checksum(df[df["dt"] <= last], p["tickers"]) != s["history"]:
+                return self.rebuild(r_df)
+        recent = self._select(r_df[r_df["dt"] >= self.tail.index[0]], p)
+        old, new = recent[recent["dt"] <= last], recent[recent["dt"] > last]
+        known = set(self.arrays["tickers"])
+        tail_ok = _checksum(old, p["tickers"]) == _checksum(_long(self.tail), p["tickers"])
+        if not tail_ok or not set(new["ticker"]) <= known:
+            return self.rebuild(r_df)
+        # Tickers silent since before the current segment were treated as delisted
+        seen = ~np.isnan(self.tail.to_numpy(dtype=float))
+        last_obs = pd.Series(self.tail.index[len(seen) - 1 - seen[::-1].argmax(axis=0)], index=self.tail.columns)
+        last_obs = last_obs.where(seen.any(axis=0)).reindex(new["ticker"].unique())
+        if (last_obs.isna() | (last_obs < pd.Timestamp(s["segment"]))).any():
+            return self.rebuild(r_df)
+        if new.empty:
+            self.mode = "current"
+            return self
+        with stage("snapshot_append", days=new["dt"].nunique()):
+            if not self._append(new):
+                return self.rebuild(r_df)
+        s["history"] = _extend(s["history"], _checksum(new, p["tickers"]))
+        self.mode = "append"
+        return self
+
+    def rebuild(self, r_df: pd.DataFrame) -> "Snapshot":
+        p = self.params
+        start = None if p["start_date"] is None else pd.Timestamp(p["start_date"])
+        return Snapshot.build(r_df, p["tickers"], p["start_cash"], p["tc_pct"], p["rf_annual"], start,
+                              p["alpha"], p["weights"], p["rebalance"], p["band"])
+
+    def _append(self, new: pd.DataFrame) -> bool:
+        """Step the new days forward; False if the result could differ from a full run."""
+        p, s, a = self.params, self.state, self.arrays
+        cols = pd.Index(a["tickers"], name="ticker")
+        new_wide = new.pivot(index="dt", columns="ticker", values="r").reindex(columns=cols).sort_index()
+        wide = pd.concat([self.tail, new_wide])
+        panel = ReturnPanel.from_wide(wide)
+        fn = WEIGHTS[p["weights"]]()
+        X = new_wide.to_numpy(dtype=float)
+        dates = pd.DatetimeIndex(new_wide.index)
+        periods = _period(dates, p["rebalance"])
+        row0 = len(self.tail)
+
+        h, targets = a["h"].copy(), a["targets"].copy()
+        cash, period, segment = s["cash"], s["period"], pd.Timestamp(s["segment"])
+        r = np.empty(len(dates))
+        cost = np.zeros(len(dates))
+        m = []
+        events, turns = [], []
+        for i, x in enumerate(X):
+            if p["rebalance"] == "threshold":
+                w = h / (h.sum() + cash)
+                due = np.abs(w - targets).max() > p["band"]
+            else:
+                due = periods[i] != period
+            if due:
+                row = np.array([row0 + i])
+                W = live_targets(panel, fn, row)[0]
+                # Not listed as seen from the tail, but trading later: its listing may predate the tail
+                if (~panel.alive(row)[0] & (panel.last_day >= row[0])).any():
+                    return False
+                w_end = h / (h.sum() + cash)
+                turn = np.abs(W - w_end).sum()
+                cost[i] = p["tc_pct"] * turn
+                h, targets, cash = W.copy(), W, 1.0 - W.sum()
+                period, segment = periods[i], dates[i]
+                events.append(dates[i])
+                turns.append(turn)
+            traded = ~np.isnan(x)
+            den = h[traded].sum() + cash
+            r[i] = (h[traded] * x[traded]).sum() / den if den > 0 else 0.0
+            r[i] -= cost[i]
+            h[traded] *= 1.0 + x[traded]
+            m.append(segment)
+
+        equity = s["equity_last"] * np.cumprod(1.0 + r)
+        self._update_summary(r, equity, turns)
+        a.update(h=h, targets=targets)
+        s.update(cash=float(cash), period=int(period), segment=str(segment), last_date=str(dates[-1]))
+        add = pd.DataFrame({"dt": dates, "r_port": r, "equity": equity, "m": pd.DatetimeIndex(m),
+                            "cost_applied": cost}).set_index("dt")
+        self.daily = pd.concat([self.daily, add])
+        if events:
+            self.turnover = pd.concat([self.turnover, pd.Series(turns, index=pd.DatetimeIndex(events))])
+        self.tail = wide.iloc[-TAIL_DAYS:]
+        return True
+
+    def _update_summary(self, r: np.ndarray, equity: np.ndarray, turns: list) -> None:
+        """Chan/Welford merge of the moments, equity peak / drawdown, sorted losses, turnover totals."""
+        s = self.state
+        n_b, mean_b = len(r), r.mean()
+        m2_b = ((r - mean_b) ** 2).sum()
+        n = s["n"] + n_b
+        delta = mean_b - s["mean"]
+        s["mean"] += delta * n_b / n
+        s["m2"] += m2_b + delta * delta * s["n"] * n_b / n
+        s["n"] = n
+        s["mean"], s["m2"] = float(s["mean"]), float(s["m2"])
+        peaks = np.maximum(np.maximum.accumulate(equity), s["peak"])
+        s["mdd"] = float(min(s["mdd"], (equity / peaks - 1.0).min()))
+        s["peak"], s["equity_last"] = float(peaks[-1]), float(equity[-1])
+        losses = self.arrays["losses"]
+        self.arrays["losses"] = np.insert(losses, np.searchsorted(losses, np.sort(-r)), np.sort(-r))
+        s["turnover_sum"] += float(sum(turns))
+        s["turnover_n"] += len(turns)
+
+    # ---------- Summary (same keys / conventions as engine.summarize) ----------
+    def summary(self) -> dict:
+        p, s = self.params, self.state
+        n = s["n"]
+        sd = np.sqrt(s["m2"] / (n - 1)) if n > 1 else np.nan
+        ann_sigma = sd * np.sqrt(TRADING_DAYS)
+        total_return = s["equity_last"] / s["equity_first"] - 1.0
+        years = n / TRADING_DAYS
+        losses = self.arrays["losses"]
+        pos = p["alpha"] * (n - 1)
+        lo = int(np.floor(pos))
+        var_hist = losses[lo] + (pos - lo) * (losses[min(lo + 1, n - 1)] - losses[lo])
+        es_hist = losses[np.searchsorted(losses, var_hist, side="left"):].mean()
+        return {
+            "Final Equity": float(s["equity_last"]),
+            "Total Return": float(total_return),
+            "CAGR": float((1.0 + total_return) ** (1.0 / years) - 1.0) if years > 0 else np.nan,
+            "Ann. Vol": float(ann_sigma),
+            "Ann. Sharpe": float((s["mean"] * TRADING_DAYS - p["rf_annual"]) / ann_sigma) if ann_sigma > 0 else np.nan,
+            "Max Drawdown": float(s["mdd"]),
+            "VaR (norm, daily)": float(-(s["mean"] - norm_ppf(p["alpha"]) * sd)),
+            "VaR (hist, daily)": float(var_hist),
+            "ES (hist, daily)": float(es_hist),
+            "Turnover (avg/rebalance)": s["turnover_sum"] / s["turnover_n"] if s["turnover_n"] else 0.0,
+        }
+
+    # ---------- Persistence ----------
+    def save(self, path: Path) -> None:
+        """Directory with state.json, arrays.npz and Parquet outputs, replaced atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.parent / f".{path.name}.{uuid.uuid4().hex}.tmp"
+        tmp.mkdir()
+        try:
+            (tmp / STATE).write_text(json.dumps({"params": self.params, "state": self.state}))
+            np.savez(tmp / "arrays.npz", **self.arrays)
+            self.daily.to_parquet(tmp / "daily.parquet")
+            self.turnover.rename("turnover").to_frame().to_parquet(tmp / "turnover.parquet")
+            self.tail.to_parquet(tmp / "tail.parquet")
+            old = path.parent / f".{path.name}.{uuid.uuid4().hex}.old"
+            if path.exists():
+                os.rename(path, old)
+            os.rename(tmp, path)
+            shutil.rmtree(old, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, path: Path) -> "Snapshot":
+        path = Path(path)
+        meta = json.loads((path / STATE).read_text())
+        with np.load(path / "arrays.npz") as z:
+            arrays = {k: z[k] for k in z.files}
+        tail = pd.read_parquet(path / "tail.parquet")
+        tail.columns = pd.Index(tail.columns, name="ticker")
+        return cls(meta["params"], meta["state"], arrays, pd.read_parquet(path / "daily.parquet"),
+                   pd.read_parquet(path / "turnover.parquet")["turnover"].rename(None), tail)
+
+    def matches(self, **params) -> bool:
+        """Whether this snapshot was built with the given engine parameters."""
+        want = {**params, "tickers": [t.upper() for t in params["tickers"]],
+                "start_date": None if params.get("start_date") is None else str(params["start_date"])}
+        return all(self.params.get(k) == v for k, v in want.items())
@@ -0,0 +1,211 @@
+# Background jobs for heavy runs (engine, GARCH, bootstrap, sweeps), shared by all sessions.
+#
+#   queue = JobQueue(backend="thread", max_workers=2, max_queue=32, store=ResultCache(...))
+#   job = queue.submit(("engine", version, ...), portfolio_engine, r_df, tickers, ...)
+#   job = queue.find(parts) or queue.submit(parts, fn, build_args())   # args only on a miss
+#   job.status, job.progress, job.message     # poll from the UI
+#   job.result()                              # blocks; re-raises the job's exception
+#
+# - De-duplication: jobs are keyed by the same parameter tuples as the ResultCache. A submit
+#   whose key is already queued or running returns that job; one already in the store returns
+#   a finished job without running anything.
+# - Progress: library loops call progress(fraction, message); it is a no-op outside a job.
+#   Thread workers update their Job directly, process workers send through a queue drained by
+#   a listener thread.
+# - Finished results are published to the store (memory + Parquet tier), so other sessions
+#   and processes sharing the cache directory pick them up.
+# - Diagnostics: a job runs with the submitting thread's diagnostics settings and its own
+#   records (diagnostics.scope), returned with the result as job.records (not stored).
+# Backends: 'thread' (in-process, default; fine for NumPy-heavy work that releases the GIL) or
+# 'process' (functions and arguments must be picklable).
+
+from __future__ import annotations
+import multiprocessing
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from backtest import diagnostics
+from backtest.cache import ResultCache, cache_key
+
+BACKENDS = ("thread", "process")
+FAILED_TTL = 30.0   # seconds a failed job is returned to identical submits before a retry
+
+class QueueFull(RuntimeError):
+    """Raised by submit() when max_queue jobs are already queued or running."""
+
+class Job:
+    """Handle of one submitted computation (shared by every identical submit)."""
+
+    def __init__(self, parts: tuple, future: Future):
+        self.parts, self.key, self.kind = parts, cache_key(parts), str(parts[0])
+        self.future = future
+        self.status = "queued"          # queued | running | done | failed
+        self.progress, self.message = 0.0, ""
+        self.submitted, self.started, self.finished = time.time(), None, None
+        self.subscribers = 1
+        self.records: list[dict] = []   # diagnostics stages recorded while the job ran
+
+    def _report(self, fraction: Optional[float], message: str) -> None:
+        if self.status == "queued":
+            self.status, self.started = "running", time.time()
+        if fraction is not None:
+            self.progress = min(1.0, max(self.progress, float(fraction)))
+        if message:
+            self.message = message
+
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        return self.future.result(timeout)
+
+    def info(self) -> dict:
+        end = self.finished or time.time()
+        return {"kind": self.kind, "status": self.status, "progress": self.progress,
+                "message": self.message, "subscribers": self.subscribers,
+                "seconds": end - (self.started or self.submitted)}
+
+# ---------- Progress reporting (called from inside job functions) ----------
+_local = threading.local()
+_worker: dict = {"queue": None, "key": None}
+
+def progress(fraction: Optional[float] = None, message: str = "") -> None:
+    """Report progress of the current job (0..1 and/or a message); no-op outside a job."""
+    job = getattr(_local, "job", None)
+    if job is not None:
+        job._report(fraction, message)
+    elif _worker["key"] is not None:
+        _worker["queue"].put((_worker["key"], fraction, message))
+
+def _run_in_thread(job: Job, diag: tuple, fn: Callable, args: tuple, kwargs: dict) -> tuple[Any, list]:
+    _local.job = job
+    try:
+        job._report(0.0, "")
+        with diagnostics.scope(*diag) as recs:
+            value = fn(*args, **kwargs)
+        return value, recs
+    finally:
+        _local.job = None
+
+def _init_worker(q) -> None:
+    _worker["queue"] = q
+
+def _run_in_worker(key: str, diag: tuple, fn: Callable, args: tuple, kwargs: dict) -> tuple[Any, list]:
+    _worker["key"] = key
+    try:
+        progress(0.0)
+        with diagnostics.scope(*diag) as recs:
+            value = fn(*args, **kwargs)
+        return value, recs
+    finally:
+        _worker["key"] = None
+
+# ---------- Queue ----------
+class JobQueue:
+    """Bounded worker pool with in-flight de-duplication and result publishing."""
+
+    def __init__(self, backend: str = "thread", max_workers: int = 2, max_queue: int = 32,
+                 store: Optional[ResultCache] = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}")
+        self.backend, self.max_workers, self.max_queue, self.store = backend, max_workers, max_queue, store
+        self._lock = threading.Lock()
+        self._inflight: dict[str, Job] = {}
+        self._failed: dict[str, Job] = {}
+        if backend == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="backtest-job")
+        else:
+            self._progress = multiprocessing.get_context().Queue()
+            self._pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                             initargs=(self._progress,))
+            threading.Thread(target=self._drain, daemon=True, name="backtest-job-progress").start()
+
+    def find(self, parts: tuple) -> Optional[Job]:
+        """The queued / running / recently failed job for 'parts', a finished one if the store
+        has its result, else None (lets callers build expensive arguments only when needed)."""
+        key = cache_key(parts)
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None:
+                job.subscribers += 1
+                return job
+            failed = self._failed.get(key)
+            if failed is not None and time.time() - failed.finished < FAILED_TTL:
+                return failed
+        if self.store is not None:
+            value = self.store.get(parts)
+            if value is not None:
+                return self._finished(parts, value)
+        return None
+
+    def submit(self, parts: tuple, fn: Callable, *args, **kwargs) -> Job:
+        """Job for 'parts' (a ResultCache key tuple) computing fn(*args, **kwargs)."""
+        job = self.find(parts)
+        if job is not None:
+            return job
+        key = cache_key(parts)
+        with self._lock:
+            job = self._inflight.get(key)       # submitted meanwhile by another session
+            if job is not None:
+                job.subscribers += 1
+                return job
+            if len(self._inflight) >= self.max_queue:
+                raise QueueFull(f"{len(self._inflight)} jobs queued or running (max_queue={self.max_queue})")
+            self._failed.pop(key, None)
+            future: Future = Future()
+            job = Job(parts, future)
+            self._inflight[key] = job
+        diag = diagnostics.settings()
+        if self.backend == "thread":
+            inner = self._pool.submit(_run_in_thread, job, diag, fn, args, kwargs)
+        else:
+            inner = self._pool.submit(_run_in_worker, key, diag, fn, args, kwargs)
+        inner.add_done_callback(lambda f: self._complete(job, f))
+        return job
+
+    def _finished(self, parts: tuple, value: Any) -> Job:
+        future: Future = Future()
+        future.set_result(value)
+        job = Job(parts, future)
+        job.status, job.progress, job.message = "done", 1.0, "cached"
+        job.started = job.finished = job.submitted
+        return job
+
+    def _complete(self, job: Job, inner: Future) -> None:
+        exc = CancelledError() if inner.cancelled() else inner.exception()
+        if exc is None:
+            value, job.records = inner.result()
+            if self.store is not None:
+                self.store.put(job.parts, value)
+            job.status, job.progress = "done", 1.0
+        else:
+            job.status, job.message = "failed", f"{type(exc).__name__}: {exc}"
+        job.finished = time.time()
+        with self._lock:
+            self._inflight.pop(job.key, None)
+            if exc is not None:
+                self._failed[job.key] = job
+        if exc is None:
+            job.future.set_result(value)
+        else:
+            job.future.set_exception(exc)
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                key, fraction, message = self._progress.get()
+            except (EOFError, OSError):
+                return
+            job = self._inflight.get(key)
+            if job is not None:
+                job._report(fraction, message)
+
+    def jobs(self) -> list[dict]:
+        """Queued / running jobs and recent failures, for display."""
+        with self._lock:
+            return [j.info() for j in list(self._inflight.values()) + list(self._failed.values())]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
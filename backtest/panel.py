@@ -0,0 +1,99 @@
+# Ragged returns panel: observations only, no (days x tickers) NaN matrix.
+#   values / day  : one entry per (ticker, day) observation, sorted by ticker then day
+#   offsets       : ticker i owns observations offsets[i]:offsets[i+1] (its listing range)
+# Lookups "as of day t" for many (t, ticker) pairs are one searchsorted over the sorted
+# observation keys (ticker * T + day), so per-ticker cumulative sums answer window and
+# growth queries without materializing the dense matrix.
+
+from __future__ import annotations
+from functools import cached_property
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+class ReturnPanel:
+    def __init__(self, dates: pd.DatetimeIndex, tickers: pd.Index, day: np.ndarray,
+                 values: np.ndarray, offsets: np.ndarray):
+        self.dates, self.tickers = dates, tickers
+        self.day, self.values, self.offsets = day, values, offsets
+        self.T, self.N = len(dates), len(tickers)
+
+    # ---------- Construction ----------
+    @classmethod
+    def from_long(cls, df: pd.DataFrame, value: str = "r") -> "ReturnPanel":
+        """Long (dt, ticker, value) frame -> panel; rows with NaN values are dropped."""
+        df = df[df[value].notna()]
+        tk_codes, tickers = pd.factorize(df["ticker"], sort=True)
+        dt_codes, dates = pd.factorize(df["dt"], sort=True)
+        order = np.lexsort((dt_codes, tk_codes))
+        offsets = np.searchsorted(tk_codes[order], np.arange(len(tickers) + 1))
+        return cls(pd.DatetimeIndex(dates, name="dt"), pd.Index(tickers, name="ticker"),
+                   dt_codes[order].astype(np.int64), df[value].to_numpy(dtype=float)[order], offsets)
+
+    @classmethod
+    def from_wide(cls, wide: pd.DataFrame) -> "ReturnPanel":
+        X = wide.to_numpy(dtype=float).T                       # tickers x days
+        tk, day = np.nonzero(~np.isnan(X))
+        offsets = np.searchsorted(tk, np.arange(X.shape[0] + 1))
+        return cls(pd.DatetimeIndex(wide.index), wide.columns, day.astype(np.int64), X[tk, day], offsets)
+
+    # ---------- Per-observation helpers ----------
+    @property
+    def nobs(self) -> int:
+        return len(self.values)
+
+    @cached_property
+    def ticker_of(self) -> np.ndarray:
+        return np.repeat(np.arange(self.N), np.diff(self.offsets))
+
+    @cached_property
+    def key(self) -> np.ndarray:
+        return self.ticker_of * self.T + self.day
+
+    @cached_property
+    def first_day(self) -> np.ndarray:
+        """Listing range per ticker (first / last observed day position; -1 if none)."""
+        has = np.diff(self.offsets) > 0
+        return np.where(has, self.day[np.minimum(self.offsets[:-1], self.nobs - 1)], -1)
+
+    @cached_property
+    def last_day(self) -> np.ndarray:
+        has = np.diff(self.offsets) > 0
+        return np.where(has, self.day[np.maximum(self.offsets[1:] - 1, 0)], -1)
+
+    @cached_property
+    def cum_log(self) -> np.ndarray:
+        """(nobs+1) global exclusive cumsum of log1p(r); per ticker, growth between two
+        observation positions p <= q is exp(cum_log[q] - cum_log[p])."""
+        return np.concatenate([[0.0], np.cumsum(np.log1p(self.values))])
+
+    @cached_property
+    def cum_sums(self) -> tuple[np.ndarray, np.ndarray]:
+        v = self.values
+        return np.concatenate([[0.0], np.cumsum(v)]), np.concatenate([[0.0], np.cumsum(v * v)])
+
+    def alive(self, rows: np.ndarray) -> np.ndarray:
+        """(rows x tickers): day inside the ticker's listing range."""
+        r = np.asarray(rows)[:, None]
+        return (self.first_day <= r) & (r <= self.last_day)
+
+    def pos_before(self, rows: np.ndarray) -> np.ndarray:
+        """(rows x tickers) global position of each ticker's first observation on/after day
+        'row', i.e. the number of its observations strictly before it, offset by offsets[i]."""
+        keys = np.arange(self.N)[None, :] * self.T + np.asarray(rows)[:, None]
+        return np.searchsorted(self.key, keys)
+
+    # ---------- Dense views (small windows / outputs only) ----------
+    def dense(self, lo: int = 0, hi: Optional[int] = None) -> np.ndarray:
+        """(days x tickers) float array with NaN where there is no observation."""
+        hi = self.T if hi is None else hi
+        out = np.full((hi - lo, self.N), np.nan)
+        a, b = self.pos_before(np.array([lo, hi]))
+        cnt = b - a
+        idx = np.repeat(a - np.cumsum(cnt) + cnt, cnt) + np.arange(cnt.sum())
+        out[self.day[idx] - lo, self.ticker_of[idx]] = self.values[idx]
+        return out
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.dense(), index=self.dates, columns=self.tickers)
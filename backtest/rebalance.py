@@ -0,0 +1,231 @@
+# General rebalancing engine: pluggable target weights x rebalance calendar, drift-aware.
+#
+# Between rebalances every holding compounds on its own, so with per-ticker cumulative log
+# growth G the value of a holding set to weight W_k,i at the open of day b_k is, on day t,
+#   h_t,i = W_k,i · exp(G_i(t) - G_i(b_k))
+# and the day's return is Σ h·r / (Σ h + cash) over the tickers that traded that day (weights
+# renormalize over the live universe). Everything is evaluated per observation on the ragged
+# ReturnPanel (no days x tickers NaN matrix), via one searchsorted + bincount; turnover uses
+# the same growth factors. Only threshold calendars (rebalance when drift leaves a band) scan
+# forward per event, in geometrically growing chunks.
+#
+# Weight functions: fn(panel, rows) -> (len(rows) x tickers) target weights set at the open
+# of each row, using observations strictly before it. Tickers outside their listing range
+# on a rebalance day get 0 and the rest are rescaled (the cash share is kept).
+
+from __future__ import annotations
+from typing import Callable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from backtest.diagnostics import stage
+from backtest.engine import month_starts, summarize
+from backtest.panel import ReturnPanel
+
+CALENDARS = ("daily", "weekly", "monthly", "threshold")
+MAX_CELLS = 1 << 24  # (rows x window x tickers) elements per min-variance batch
+
+WeightFn = Callable[[ReturnPanel, np.ndarray], np.ndarray]
+
+# ---------- Weight functions ----------
+def equal() -> WeightFn:
+    def fn(panel: ReturnPanel, rows: np.ndarray) -> np.ndarray:
+        return np.full((len(rows), panel.N), 1.0 / panel.N)
+    return fn
+
+def inverse_vol(lookback: int = 63) -> WeightFn:
+    """w ∝ 1/σ over each ticker's last 'lookback' observations; tickers with fewer than
+    min(lookback, 20) get 0 (equal weight while no ticker has enough history)."""
+    def fn(panel: ReturnPanel, rows: np.ndarray) -> np.ndarray:
+        s1, s2 = panel.cum_sums
+        hi = panel.pos_before(rows)
+        lo = np.maximum(hi - lookback, panel.offsets[:-1])
+        cnt = (hi - lo).astype(float)
+        m1 = s1[hi] - s1[lo]
+        var = (s2[hi] - s2[lo] - m1 * m1 / np.maximum(cnt, 1)) / np.maximum(cnt - 1, 1)
+        with np.errstate(divide="ignore"):
+            inv = np.where((var > 0) & (cnt >= min(lookback, 20)), 1.0 / np.sqrt(np.maximum(var, 0)), 0.0)
+        inv[inv.sum(axis=1) == 0] = 1.0
+        return inv / inv.sum(axis=1, keepdims=True)
+    return fn
+
+def min_variance(lookback: int = 126, shrinkage: float = 0.1, long_only: bool = True) -> WeightFn:
+    """Global minimum variance from the trailing sample covariance, shrunk toward its diagonal.
+    Tickers with fewer than lookback/2 observations in the window get 0.
+    long_only clips negative weights and renormalizes (heuristic, no QP)."""
+    def fn(panel: ReturnPanel, rows: np.ndarray) -> np.ndarray:
+        n = panel.N
+        out = np.full((len(rows), n), 1.0 / n)
+        ok = np.flatnonzero(rows >= lookback)
+        step = max(1, MAX_CELLS // (lookback * n))
+        for a in range(0, len(ok), step):
+            sel = ok[a:a + step]
+            X = np.stack([panel.dense(row - lookback, row) for row in rows[sel]])   # rows x lookback x n
+            have = ~np.isnan(X)
+            use = have.sum(axis=1) >= lookback // 2                                 # rows x n
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.nansum(X, axis=1, keepdims=True) / have.sum(axis=1, keepdims=True)
+            X = np.where(have & use[:, None, :], X - mean, 0.0)
+            S = np.matmul(X.transpose(0, 2, 1), X) / (lookback - 1)
+            d = np.einsum("kii->ki", S)
+            S = (1 - shrinkage) * S
+            S[:, np.arange(n), np.arange(n)] += shrinkage * d + ~use                # unused: identity row
+            w = np.linalg.solve(S, np.ones((len(sel), n, 1)))[..., 0] * use
+            if long_only:
+                w = np.maximum(w, 0.0)
+            tot = w.sum(axis=1, keepdims=True)
+            out[sel] = np.where(tot > 0, w / np.where(tot > 0, tot, 1.0), 1.0 / n)
+        return out
+    return fn
+
+def schedule(weights: pd.DataFrame) -> WeightFn:
+    """User-supplied targets (date x ticker); the latest row on or before each rebalance day
+    applies, tickers missing from it get 0 (before the first row: equal weight)."""
+    weights = weights.sort_index()
+    def fn(panel: ReturnPanel, rows: np.ndarray) -> np.ndarray:
+        W = weights.reindex(columns=panel.tickers).fillna(0.0).to_numpy(dtype=float)
+        pos = np.searchsorted(weights.index.values, panel.dates.values[rows], side="right") - 1
+        out = np.full((len(rows), panel.N), 1.0 / panel.N)
+        out[pos >= 0] = W[pos[pos >= 0]]
+        return out
+    return fn
+
+WEIGHTS = {"equal": equal, "inverse_vol": inverse_vol, "min_variance": min_variance}
+
+# ---------- Calendars ----------
+def calendar_rows(index: pd.DatetimeIndex, calendar: str) -> np.ndarray:
+    """Row positions of rebalance days (first trading day of each period; row 0 always)."""
+    if calendar == "daily":
+        return np.arange(len(index))
+    if calendar == "monthly":
+        return month_starts(index)
+    if calendar == "weekly":
+        week = (index.normalize() - pd.to_timedelta(index.dayofweek, unit="D")).asi8
+        return np.flatnonzero(np.diff(week, prepend=week[:1] - 1))
+    raise ValueError(f"calendar must be one of {CALENDARS}")
+
+def live_targets(panel: ReturnPanel, fn: WeightFn, rows: np.ndarray) -> np.ndarray:
+    """fn's targets with tickers outside their listing range zeroed; invested share kept."""
+    W = fn(panel, rows)
+    live = np.where(panel.alive(rows), W, 0.0)
+    tot, live_tot = W.sum(axis=1, keepdims=True), live.sum(axis=1, keepdims=True)
+    return np.where(live_tot > 0, live * tot / np.where(live_tot > 0, live_tot, 1.0), 0.0)
+
+def threshold_rows(panel: ReturnPanel, fn: WeightFn, band: float, chunk: int = 64) -> tuple[np.ndarray, np.ndarray]:
+    """Rebalance when any drifted weight deviates from its target by more than 'band'.
+    Returns (rows, targets)."""
+    G = panel.cum_log
+    T = panel.T
+    rows, targets = [0], [live_targets(panel, fn, np.array([0]))[0]]
+    s = 0
+    while True:
+        w0 = targets[-1]
+        cash = 1.0 - w0.sum()
+        base = G[panel.pos_before(np.array([s]))[0]]
+        t, size, hit = s + 1, chunk, None
+        while t < T and hit is None:
+            hi = min(T, t + size)
+            grow = w0 * np.exp(G[panel.pos_before(np.arange(t, hi))] - base)   # holdings at the open of t..hi-1
+            w = grow / (grow.sum(axis=1, keepdims=True) + cash)
+            breach = np.flatnonzero(np.abs(w - w0).max(axis=1) > band)
+            if len(breach):
+                hit = t + breach[0]
+            t, size = hi, size * 2
+        if hit is None:
+            return np.array(rows), np.vstack(targets)
+        rows.append(hit)
+        targets.append(live_targets(panel, fn, np.array([hit]))[0])
+        s = hit
+
+# ---------- Core ----------
+def drift_arrays(panel: ReturnPanel, rows: np.ndarray, W: np.ndarray, tc_pct: float):
+    """r_port (days,), cost_applied (days,), turnover (events,) for targets W set at 'rows'."""
+    G = panel.cum_log
+    B = panel.pos_before(rows)                                  # events x tickers
+    seg_day = np.searchsorted(rows, np.arange(panel.T), side="right") - 1
+    cell = seg_day[panel.day] * panel.N + panel.ticker_of      # (event, ticker) of each observation
+    cash = 1.0 - W.sum(axis=1)
+
+    # Holding value at the open of each observation (segment starts at value 1)
+    h = W.ravel()[cell] * np.exp(G[:-1] - G[B.ravel()[cell]])
+    num = np.bincount(panel.day, weights=h * panel.values, minlength=panel.T)
+    den = np.bincount(panel.day, weights=h, minlength=panel.T) + cash[seg_day]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = np.where(den > 0, num / den, 0.0)
+
+    # Turnover at event k: drifted weights at the open of rows[k] vs new targets W[k]
+    turnover = np.zeros(len(rows))
+    if len(rows) > 1:
+        grow = W[:-1] * np.exp(G[B[1:]] - G[B[:-1]])
+        w_end = grow / (grow.sum(axis=1, keepdims=True) + cash[:-1, None])
+        turnover[1:] = np.abs(W[1:] - w_end).sum(axis=1)
+
+    cost_applied = np.zeros(panel.T)
+    cost_applied[rows[1:]] = tc_pct * turnover[1:]
+    return r - cost_applied, cost_applied, turnover
+
+def run_panel(panel: ReturnPanel, fn: WeightFn, rebalance: str, band: float, tc_pct: float):
+    """Rebalance rows, their targets and drift_arrays' outputs: (rows, W, r, cost, turnover)."""
+    if rebalance == "threshold":
+        rows, W = threshold_rows(panel, fn, band)
+    else:
+        rows = calendar_rows(panel.dates, rebalance)
+        W = live_targets(panel, fn, rows)
+    return (rows, W) + drift_arrays(panel, rows, W, tc_pct)
+
+def portfolio_engine(
+    r_df: pd.DataFrame,
+    tickers: list[str],
+    start_cash: float,
+    tc_pct: float,
+    rf_annual: float,
+    start_date: Optional[pd.Timestamp],
+    end_date: Optional[pd.Timestamp],
+    alpha: float = 0.95,
+    weights: Union[str, WeightFn] = "equal",
+    rebalance: str = "monthly",
+    band: float = 0.05,
+    return_wide: bool = True,
+):
+    """Drift-aware counterpart of portfolio_engine_equal_monthly (same outputs).
+
+    Tickers may list late, delist or have gaps: each day's return uses only the tickers
+    that traded (no common-history truncation). wide_ret (dense, NaN where missing) is
+    only materialized for the caller when return_wide.
+
+    weights: 'equal' | 'inverse_vol' | 'min_variance' or a weight function (e.g. schedule(df)).
+    rebalance: 'daily' | 'weekly' | 'monthly' | 'threshold' (drift band 'band').
+    Turnover is indexed by rebalance date; the summary's turnover is the average per event
+    ('Turnover (avg/rebalance)'; the legacy engine keeps 'Turnover (avg/month)').
+    """
+    if rebalance not in CALENDARS:
+        raise ValueError(f"rebalance must be one of {CALENDARS}")
+    fn = WEIGHTS[weights]() if isinstance(weights, str) else weights
+    with stage("engine", tickers=len(tickers), rebalance=rebalance):
+        df = r_df[r_df["ticker"].isin([t.upper() for t in tickers])]
+        if start_date is not None:
+            df = df[df["dt"] >= start_date]
+        if end_date is not None:
+            df = df[df["dt"] <= end_date]
+        if df.empty:
+            return pd.DataFrame(), {}, pd.DataFrame(), pd.Series(dtype=float)
+        with stage("panel", rows=len(df)):
+            panel = ReturnPanel.from_long(df)
+        if panel.nobs == 0:
+            return pd.DataFrame(), {}, pd.DataFrame(), pd.Series(dtype=float)
+
+        with stage("rebalance", days=panel.T, observations=panel.nobs):
+            rows, W, r, cost, turn = run_panel(panel, fn, rebalance, band, tc_pct)
+        r_port = pd.Series(r, index=panel.dates)
+        turnover = pd.Series(turn, index=panel.dates[rows].rename(None))
+        equity, summary = summarize(r_port, turnover, start_cash, rf_annual, alpha)
+
+        daily = pd.DataFrame({
+            "dt": r_port.index,
+            "r_port": r,
+            "equity": equity.values,
+            "m": panel.dates[rows][np.searchsorted(rows, np.arange(panel.T), side="right") - 1],
+            "cost_applied": cost
+        }).set_index("dt")
+        return daily, summary, panel.to_frame() if return_wide else pd.DataFrame(), turnover
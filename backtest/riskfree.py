@@ -0,0 +1,162 @@
+# Time-varying risk-free rate from the monthly Bundesbank yield curve (dbt model cre_macro_yc_wide:
+# month, yield_<maturity>_pct columns; or the raw Zinsstrukturkurve_*.csv files it is built from).
+#
+#   curve = load_curve(con)                              # or csv_curve("data_raw")
+#   rf_index = RiskFreeIndex(curve)                      # once per curve version (business days)
+#   rf = rf_index.rate(1.0)                              # 1Y yield; 2.5 interpolates 1Y / 5Y
+#   portfolio_engine(..., rf_annual=rf, ...)             # excess-return Sharpe
+#   rf.excess(daily["r_port"])                           # daily excess returns
+#
+# The as-of index maps every calendar day to the curve month in force (searchsorted once); rates for
+# a maturity are interpolated across the curve for all months at once and gathered through it, so a
+# run's rates are one index lookup instead of a per-day merge. Month m's value (a month-end yield)
+# applies from the first day of month m + lag_months (default 1: no look-ahead).
+
+from __future__ import annotations
+import re
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from backtest.engine import TRADING_DAYS
+
+CURVE = "SELECT * FROM cre_macro_yc_wide"
+_COLUMN = re.compile(r"yield_(\d+)y_pct")
+_CSV = re.compile(r"Zinsstrukturkurve_(\d+)_Y\.csv$")
+
+def maturity_years(code: str) -> float:
+    """Maturity code of the staging model ('05' = 0.5 years, '1', '10') in years."""
+    return float(code) / 10 if code.startswith("0") else float(code)
+
+def _sorted_curve(frame: pd.DataFrame) -> pd.DataFrame:
+    frame.index = pd.DatetimeIndex(frame.index).to_period("M").to_timestamp().rename("month")
+    frame = frame[sorted(frame.columns)].sort_index()
+    return frame.astype(float) / 100.0
+
+def load_curve(con, relation: str = CURVE) -> pd.DataFrame:
+    """Months x maturity (years) of annual yields as decimals, from cre_macro_yc_wide (DuckDB)."""
+    from backtest.duck import _arrow_frame
+    wide = _arrow_frame(con, relation, {}).set_index("month")
+    cols = {c: maturity_years(m.group(1)) for c in wide.columns if (m := _COLUMN.fullmatch(c))}
+    return _sorted_curve(wide[list(cols)].rename(columns=cols))
+
+def csv_curve(data_dir: Path) -> pd.DataFrame:
+    """Same as load_curve, read straight from the Bundesbank CSVs (for trees without the dbt build)."""
+    series = {}
+    for path in sorted(Path(data_dir).glob("Zinsstrukturkurve_*_Y.csv")):
+        raw = pd.read_csv(path, sep=";", header=None, usecols=[0, 1], dtype=str, encoding="utf-8-sig")
+        raw = raw[raw[0].str.fullmatch(r"\d{4}-\d{2}") & raw[1].str.fullmatch(r"-?\d+([.,]\d+)?")]
+        values = raw[1].str.replace(",", ".").astype(float).to_numpy()
+        series[maturity_years(_CSV.search(path.name).group(1))] = pd.Series(values, index=pd.to_datetime(raw[0]))
+    if not series:
+        raise FileNotFoundError(f"no Zinsstrukturkurve_*_Y.csv in {data_dir}")
+    return _sorted_curve(pd.DataFrame(series))
+
+def interpolate(curve: pd.DataFrame, maturity: float) -> np.ndarray:
+    """Yield at 'maturity' (years) for every month: linear between the nearest available maturities
+    on each side, flat beyond the ends; NaN only where a month has no yields at all."""
+    x = curve.columns.to_numpy(dtype=float)
+    V = curve.to_numpy()
+    ok = ~np.isnan(V)
+    k = np.arange(len(x))
+    lo = np.where(ok & (x <= maturity), k, -1).max(axis=1)
+    hi = np.where(ok & (x >= maturity), k, len(x)).min(axis=1)
+    lo_ok, hi_ok = lo >= 0, hi < len(x)
+    lo = np.where(lo_ok, lo, hi)
+    hi = np.where(hi_ok, hi, lo)
+    none = ~(lo_ok | hi_ok)
+    lo, hi = np.where(none, 0, lo), np.where(none, 0, hi)
+    rows = np.arange(len(V))
+    x0, x1 = x[lo], x[hi]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.where(x1 > x0, (maturity - x0) / (x1 - x0), 0.0)
+    out = V[rows, lo] + t * (V[rows, hi] - V[rows, lo])
+    return np.where(none, np.nan, out)
+
+class RiskFreeIndex:
+    """As-of alignment of a monthly curve to a trading calendar, shared by runs and sweeps."""
+
+    def __init__(self, curve: pd.DataFrame, calendar: Optional[pd.DatetimeIndex] = None,
+                 lag_months: int = 1, version: str = ""):
+        """calendar: trading days to index (default: business days from the first month in force
+        to a year past the last); other dates still resolve, by a direct month lookup.
+        version: dataset version of the curve (cache.dataset_version), part of rate keys."""
+        self.curve, self.lag_months, self.version = curve, lag_months, version
+        effective = curve.index + pd.DateOffset(months=lag_months)
+        if calendar is None and len(curve):
+            days = np.arange(effective[0].to_datetime64().astype("datetime64[D]"),
+                             (effective[-1] + pd.DateOffset(years=1)).to_datetime64().astype("datetime64[D]"))
+            calendar = days[np.is_busday(days)]
+        self.calendar = pd.DatetimeIndex([] if calendar is None else calendar).unique().sort_values()
+        self.effective = effective.values
+        # Calendar day -> curve row in force (days before the first one use the first row)
+        self.month_pos = np.maximum(self._month_rows(self.calendar.values), 0)
+        self._monthly: dict[float, np.ndarray] = {}
+        self._daily: dict[float, np.ndarray] = {}
+
+    def _month_rows(self, days: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.effective, days, side="right") - 1
+
+    def monthly(self, maturity: float) -> np.ndarray:
+        """Rate per curve month (gaps carried forward, leading gaps back-filled), cached."""
+        maturity = float(maturity)
+        if maturity not in self._monthly:
+            self._monthly[maturity] = pd.Series(interpolate(self.curve, maturity)).ffill().bfill().to_numpy()
+        return self._monthly[maturity]
+
+    def daily(self, maturity: float) -> np.ndarray:
+        """Annual rate in force on each calendar day (cached per maturity)."""
+        maturity = float(maturity)
+        if maturity not in self._daily:
+            self._daily[maturity] = self.monthly(maturity)[self.month_pos]
+        return self._daily[maturity]
+
+    def annual(self, dates, maturity: float) -> np.ndarray:
+        """Annual rate for arbitrary dates: calendar days via the index, others by direct lookup."""
+        days = pd.DatetimeIndex(dates).values
+        cal = self.calendar.values
+        pos = np.minimum(np.searchsorted(cal, days), max(len(cal) - 1, 0))
+        out = self.daily(maturity)[pos] if len(cal) else np.full(len(days), np.nan)
+        miss = cal[pos] != days if len(cal) else np.ones(len(days), dtype=bool)
+        if miss.any():
+            out = out.copy()
+            out[miss] = self.monthly(maturity)[np.maximum(self._month_rows(days[miss]), 0)]
+        return out
+
+    def rate(self, maturity: float) -> "RiskFreeRate":
+        return RiskFreeRate(self, float(maturity))
+
+class RiskFreeRate:
+    """Time-varying rate of one maturity; accepted wherever engines take rf_annual."""
+
+    def __init__(self, index: RiskFreeIndex, maturity: float):
+        self.index, self.maturity = index, maturity
+
+    @property
+    def key(self) -> tuple:
+        return ("rf_curve", self.index.version, self.maturity, self.index.lag_months)
+
+    def __repr__(self) -> str:   # stable, so rates can sit in ResultCache key tuples
+        return f"RiskFreeRate{self.key!r}"
+
+    def annual(self, dates) -> np.ndarray:
+        return self.index.annual(dates, self.maturity)
+
+    def mean(self, dates) -> float:
+        """Average annual rate over 'dates' (for KPIs that take a constant rate)."""
+        return float(np.mean(self.annual(dates))) if len(dates) else np.nan
+
+    def excess(self, returns: Union[pd.Series, pd.DataFrame]) -> Union[pd.Series, pd.DataFrame]:
+        """Daily returns minus the daily rate (annual / TRADING_DAYS, as in the Sharpe ratio)."""
+        rf = self.annual(returns.index) / TRADING_DAYS
+        if isinstance(returns, pd.DataFrame):
+            return returns.sub(rf, axis=0)
+        return returns - rf
+
+def daily_rf(rf_annual, dates) -> Optional[np.ndarray]:
+    """Daily rate per date for a time-varying rf_annual, None for a constant."""
+    if hasattr(rf_annual, "annual"):
+        return rf_annual.annual(dates) / TRADING_DAYS
+    return None
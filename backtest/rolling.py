@@ -0,0 +1,167 @@
+# Rolling risk analytics over daily return series (portfolio r_port or columns of wide_ret).
+# All metrics are computed column-wise on (days x series) arrays in O(n) or O(n·w) C loops:
+#   - vol / Sharpe from cumulative sums of r, r² and valid-day counts (window moments by differencing)
+#   - drawdown from a rolling peak via van Herk/Gil-Werman block max (O(n), deque-equivalent)
+#   - historical VaR/ES from the rolling upper-tail order statistics (block top-m merge)
+# NaN days (before a listing, gaps in the ragged wide_ret) are skipped: equity stays flat, moments
+# use the valid days of each window (min_periods), VaR/ES need a fully observed window.
+
+from __future__ import annotations
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from backtest.engine import TRADING_DAYS
+
+METRICS = ["vol", "sharpe", "drawdown", "max_drawdown", "var_hist", "es_hist"]
+QUANTILE_CELLS = 1 << 22  # max (days x series x tail) order statistics held per VaR/ES chunk
+
+# ---------- Kernels (2D: days x series) ----------
+def rolling_moments(x: np.ndarray, window: int, min_periods: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+    """Rolling mean and sample std (ddof=1) over the valid days of each trailing window, from
+    cumulative sums; NaN for the first window-1 rows and for windows with fewer than
+    min_periods valid days (default: window // 2, at least 2)."""
+    T = x.shape[0]
+    mean = np.full(x.shape, np.nan)
+    std = np.full(x.shape, np.nan)
+    if T < window:
+        return mean, std
+    min_periods = max(2, window // 2) if min_periods is None else max(2, min_periods)
+    valid = ~np.isnan(x)
+    zero = np.zeros((1,) + x.shape[1:])
+    with np.errstate(invalid="ignore"):
+        c = np.nan_to_num(np.nanmean(x, axis=0)) if valid.any() else np.zeros(x.shape[1:])  # shift for Σx²
+    d = np.where(valid, x - c, 0.0)
+    s0 = np.concatenate([zero, np.cumsum(valid, axis=0)])
+    s1 = np.concatenate([zero, np.cumsum(d, axis=0)])
+    s2 = np.concatenate([zero, np.cumsum(d * d, axis=0)])
+    n = s0[window:] - s0[:-window]
+    w1 = s1[window:] - s1[:-window]
+    w2 = s2[window:] - s2[:-window]
+    ok = n >= min_periods
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean[window - 1:] = np.where(ok, c + w1 / n, np.nan)
+        var = (w2 - w1 * w1 / n) / (n - 1)
+        std[window - 1:] = np.where(ok, np.sqrt(np.maximum(var, 0.0)), np.nan)
+    return mean, std
+
+def rolling_extreme(a: np.ndarray, window: int, op=np.maximum) -> np.ndarray:
+    """Rolling max (op=np.maximum) or min (op=np.minimum) over the trailing window, O(n).
+
+    van Herk/Gil-Werman: per-block prefix and suffix extremes; each window spans at most two
+    blocks, so its extreme is op(suffix[start], prefix[end]).
+    """
+    T = a.shape[0]
+    out = np.full(a.shape, np.nan)
+    if T < window:
+        return out
+    fill = -np.inf if op is np.maximum else np.inf
+    pad = (-T) % window
+    ap = np.concatenate([a, np.full((pad,) + a.shape[1:], fill)])
+    blocks = ap.reshape((-1, window) + a.shape[1:])
+    prefix = op.accumulate(blocks, axis=1).reshape(ap.shape)
+    suffix = op.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(ap.shape)
+    out[window - 1:] = op(suffix[:T - window + 1], prefix[window - 1:T])
+    return out
+
+def _block_top(blocks: np.ndarray, m: int) -> np.ndarray:
+    """Running top-m (ascending) within each block: (blocks, w, N) -> (blocks, w, N, m)."""
+    nb, w, n = blocks.shape
+    out = np.empty((nb, w, n, m))
+    cur = np.full((nb, n, m), -np.inf)
+    for i in range(w):
+        # insert x into the sorted top-m and drop the smallest: new_j = sorted(cur ∪ x)[j + 1]
+        x = blocks[:, i, :, None]
+        out[:, i, :, :-1] = np.minimum(np.maximum(cur[..., :-1], x), cur[..., 1:])
+        out[:, i, :, -1:] = np.maximum(cur[..., -1:], x)
+        cur = out[:, i]
+    return out
+
+def rolling_top(a: np.ndarray, window: int, m: int) -> np.ndarray:
+    """Largest m values (ascending) of every trailing window: (T, N) -> (T-window+1, N, m).
+
+    Same block decomposition as rolling_extreme, carrying the top-m order statistics
+    instead of a single max: window = suffix of one block + prefix of the next, so
+    each window merges 2m candidates instead of selecting among 'window' values.
+    """
+    T, n = a.shape
+    pad = (-T) % window
+    ap = np.concatenate([a, np.full((pad, n), -np.inf)])
+    blocks = ap.reshape(-1, window, n)
+    prefix = _block_top(blocks, m).reshape(-1, n, m)
+    suffix = _block_top(blocks[:, ::-1], m)[:, ::-1].reshape(-1, n, m)
+    head = suffix[:T - window + 1].copy()
+    head[::window] = -np.inf  # block-aligned window: prefix already covers the whole block
+    cand = np.concatenate([head, prefix[window - 1:T]], axis=-1)
+    return np.sort(cand, axis=-1)[..., -m:]
+
+def rolling_var_es(x: np.ndarray, window: int, alpha: float) -> tuple[np.ndarray, np.ndarray]:
+    """Rolling historical VaR/ES of losses (-x) at alpha, as positive loss fractions.
+
+    VaR uses linear interpolation between order statistics (same as Series.quantile);
+    ES is the mean of losses at or beyond VaR. Only the upper tail (window - k values)
+    is tracked; columns are processed in chunks to bound memory. Windows with a NaN day
+    are NaN (the order statistics assume 'window' observations).
+    """
+    T, n = x.shape
+    var = np.full(x.shape, np.nan)
+    es = np.full(x.shape, np.nan)
+    if T < window:
+        return var, es
+    missing = np.isnan(x)
+    x = np.where(missing, -np.inf, x)   # placeholder (NaN breaks the top-m merge); masked below
+    pos = alpha * (window - 1)
+    k = int(np.floor(pos))
+    frac = pos - k
+    m = window - k  # order statistics k..window-1 (ascending)
+    step = max(1, QUANTILE_CELLS // (T * m))
+    for c in range(0, n, step):
+        top = rolling_top(-x[:, c:c + step], window, m)
+        lo = top[..., 0]
+        hi = top[..., min(1, m - 1)]
+        with np.errstate(invalid="ignore"):
+            var[window - 1:, c:c + step] = lo + frac * (hi - lo)
+            es[window - 1:, c:c + step] = (top[..., 1:] if frac > 0 else top).mean(axis=-1)
+    if missing.any():
+        cm = np.concatenate([np.zeros((1, n)), np.cumsum(missing, axis=0)])
+        gap = np.zeros(x.shape, dtype=bool)
+        gap[window - 1:] = cm[window:] - cm[:-window] > 0
+        var[gap] = np.nan
+        es[gap] = np.nan
+    return var, es
+
+# ---------- Public API ----------
+def rolling_risk(
+    returns: Union[pd.Series, pd.DataFrame],
+    window: int = TRADING_DAYS,
+    alpha: float = 0.95,
+    rf_annual: float = 0.0,
+):
+    """Rolling vol, Sharpe, drawdown, max drawdown, VaR/ES (hist, daily).
+
+    Series in  -> DataFrame (dt x METRICS).
+    DataFrame in -> dict metric -> DataFrame (dt x columns), e.g. for every ticker in wide_ret.
+    vol/Sharpe are annualized; drawdown is vs. the peak of the trailing window; max_drawdown
+    is the worst such drawdown within the trailing window.
+    """
+    is_series = isinstance(returns, pd.Series)
+    frame = returns.to_frame() if is_series else returns
+    x = frame.to_numpy(dtype=float)
+
+    mean, std = rolling_moments(x, window)
+    ann_vol = std * np.sqrt(TRADING_DAYS)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(ann_vol > 0, (mean * TRADING_DAYS - rf_annual) / ann_vol, np.nan)
+
+    log_eq = np.cumsum(np.nan_to_num(np.log1p(x)), axis=0)
+    drawdown = np.expm1(log_eq - rolling_extreme(log_eq, window, np.maximum))
+    drawdown[np.cumsum(~np.isnan(x), axis=0) == 0] = np.nan   # not listed yet
+    mdd = np.full(x.shape, np.nan)
+    mdd[window - 1:] = rolling_extreme(drawdown[window - 1:], window, np.minimum)
+    var_h, es_h = rolling_var_es(x, window, alpha)
+
+    out = dict(zip(METRICS, [ann_vol, sharpe, drawdown, mdd, var_h, es_h]))
+    if is_series:
+        return pd.DataFrame({m: v[:, 0] for m, v in out.items()}, index=frame.index)
+    return {m: pd.DataFrame(v, index=frame.index, columns=frame.columns) for m, v in out.items()}
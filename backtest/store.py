@@ -0,0 +1,162 @@
+# Columnar price store: Arrow IPC file, one record batch per ticker (sorted by ticker, dt).
+# The per-ticker row-range index lives in the schema metadata, so listing tickers/dates
+# needs no data read, and loads memory-map only the selected batches (zero-copy slices).
+#
+# Build from the CSV:  python -m backtest.store data_raw/equities_de_daily.csv
+
+from __future__ import annotations
+import json
+import sys
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+INDEX_KEY = b"price_index"
+PRICE_COLUMNS = ["Close_EUR", "close_eur", "close", "adj_close", "Adj Close"]
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+    except ImportError as e:
+        raise ImportError(f"pyarrow not installed. Run: pip install pyarrow  (error: {e})") from e
+    return pa
+
+def store_path_for(csv_path: Path) -> Path:
+    """data_raw/equities_de_daily.csv -> data_raw/equities_de_daily.arrow"""
+    return Path(csv_path).with_suffix(".arrow")
+
+# ---------- Normalize ----------
+def normalize_prices(df: pd.DataFrame) -> pd.DataFrame:
+    """Raw (Date, Ticker, Close_EUR)-style frame -> (dt, ticker, price), sorted by ticker, dt.
+       Raises ValueError if a required column cannot be found.
+    """
+    cols = {c.lower().strip(): c for c in df.columns}
+    date_col = cols.get("date") or cols.get("dt")
+    if not date_col:
+        raise ValueError("CSV must contain a 'date' or 'dt' column.")
+    ticker_col = cols.get("ticker")
+    if not ticker_col:
+        raise ValueError("CSV must contain a 'Ticker' column.")
+    price_col = next((g for g in PRICE_COLUMNS if g in df.columns), None)
+    if price_col is None:
+        raise ValueError("Could not find a price column (e.g., Close_EUR).")
+
+    df = df.rename(columns={date_col: "dt", ticker_col: "ticker", price_col: "price"})
+    df["dt"] = pd.to_datetime(df["dt"])
+    df["ticker"] = df["ticker"].str.upper()
+    df = df.sort_values(["ticker", "dt"]).dropna(subset=["price"]).reset_index(drop=True)
+    return df[["dt", "ticker", "price"]]
+
+# ---------- Write ----------
+def write_price_store(df_prices: pd.DataFrame, path: Path) -> Path:
+    """Write normalized prices (dt, ticker, price) as an Arrow IPC file, one batch per ticker."""
+    pa = _pyarrow()
+    df = df_prices.sort_values(["ticker", "dt"]).reset_index(drop=True)
+    dt = df["dt"].to_numpy(dtype="datetime64[ns]")
+    price = df["price"].to_numpy(dtype=float)
+    tickers, starts = np.unique(df["ticker"].to_numpy(dtype=object), return_index=True)
+    ends = np.append(starts[1:], len(df))
+
+    index = {
+        "tickers": [str(t) for t in tickers],
+        "rows": [int(e - s) for s, e in zip(starts, ends)],
+        "first": [str(dt[s].astype("datetime64[D]")) for s in starts],
+        "last": [str(dt[e - 1].astype("datetime64[D]")) for e in ends],
+    }
+    schema = pa.schema(
+        [("dt", pa.timestamp("ns")), ("price", pa.float64())],
+        metadata={INDEX_KEY: json.dumps(index).encode()},
+    )
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for s, e in zip(starts, ends):
+            writer.write_batch(pa.record_batch([pa.array(dt[s:e]), pa.array(price[s:e])], schema=schema))
+    tmp.replace(path)
+    return path
+
+# ---------- Read ----------
+class PriceStore:
+    """Memory-mapped reader. Only the schema/index is parsed on open."""
+
+    def __init__(self, path: Path):
+        pa = _pyarrow()
+        self.path = Path(path)
+        self._reader = pa.ipc.open_file(pa.memory_map(str(self.path), "r"))
+        index = json.loads(self._reader.schema.metadata[INDEX_KEY])
+        self.tickers: list[str] = index["tickers"]
+        self._batch = {t: i for i, t in enumerate(self.tickers)}
+        self.rows = dict(zip(self.tickers, index["rows"]))
+        self.first = dict(zip(self.tickers, pd.to_datetime(index["first"])))
+        self.last = dict(zip(self.tickers, pd.to_datetime(index["last"])))
+
+    def date_bounds(self) -> tuple[pd.Timestamp, pd.Timestamp]:
+        return min(self.first.values()), max(self.last.values())
+
+    def last_prices(self) -> dict[str, float]:
+        """Last stored price per ticker (one value from each mapped batch)."""
+        return {t: self._reader.get_batch(i).column(1)[-1].as_py()
+                for t, i in self._batch.items() if self.rows[t]}
+
+    def load(
+        self,
+        tickers: Sequence[str],
+        start_date: Optional[pd.Timestamp] = None,
+        end_date: Optional[pd.Timestamp] = None,
+        lookback: int = 1,
+    ) -> pd.DataFrame:
+        """(dt, ticker, price) for the selection, sorted by ticker, dt.
+
+        'lookback' extra rows before start_date are kept per ticker so that the first
+        in-range day still gets a return from compute_returns.
+        """
+        parts_dt, parts_px, parts_tk = [], [], []
+        for t in sorted({t.upper() for t in tickers}):
+            if t not in self._batch:
+                continue
+            batch = self._reader.get_batch(self._batch[t])
+            dt = batch.column(0).to_numpy()  # zero-copy view into the mapped file
+            lo = 0 if start_date is None else max(0, int(np.searchsorted(dt, np.datetime64(start_date, "ns"))) - lookback)
+            hi = len(dt) if end_date is None else int(np.searchsorted(dt, np.datetime64(end_date, "ns"), side="right"))
+            if hi <= lo:
+                continue
+            parts_dt.append(dt[lo:hi])
+            parts_px.append(batch.column(1).to_numpy()[lo:hi])
+            parts_tk.append(np.full(hi - lo, t, dtype=object))
+        if not parts_dt:
+            return pd.DataFrame({"dt": pd.Series(dtype="datetime64[ns]"), "ticker": pd.Series(dtype=object),
+                                 "price": pd.Series(dtype=float)})
+        return pd.DataFrame({
+            "dt": np.concatenate(parts_dt),
+            "ticker": np.concatenate(parts_tk),
+            "price": np.concatenate(parts_px),
+        })
+
+def append_price_store(path: Path, new_prices: pd.DataFrame) -> Path:
+    """Merge normalized new rows into an existing store.
+
+    Rows at or before a ticker's last stored date are dropped (de-dup). IPC files carry a
+    footer, so the file is re-assembled from the mapped batches plus the new rows; no
+    CSV parsing or type conversion of the existing history is involved.
+    """
+    store = PriceStore(path)
+    hw = new_prices["ticker"].map(store.last)
+    new = new_prices[hw.isna() | (new_prices["dt"] > hw)]
+    if new.empty:
+        return Path(path)
+    old = store.load(store.tickers)
+    store = None  # release the memory map before replacing the file
+    merged = pd.concat([old, new], ignore_index=True).drop_duplicates(subset=["ticker", "dt"], keep="first")
+    return write_price_store(merged, path)
+
+def csv_to_store(csv_path: Path, store_path: Optional[Path] = None) -> Path:
+    df = normalize_prices(pd.read_csv(csv_path))
+    return write_price_store(df, store_path or store_path_for(csv_path))
+
+if __name__ == "__main__":
+    src = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("data_raw") / "equities_de_daily.csv"
+    out = csv_to_store(src)
+    print(f"  ✓ {out}  ({len(PriceStore(out).tickers)} tickers)")
@@ -0,0 +1,223 @@
+# Batched parameter sweeps over the legacy equal-weight monthly engine
+# (engine.portfolio_engine_equal_monthly: full-basket days, no drift between month starts),
+# not the drift engine the app and CLI use by default.
+# r_df is pivoted to the wide matrix once; every config (basket, tc_bps, date range)
+# is then evaluated together as a (configs x days) array, chunk by chunk.
+
+from __future__ import annotations
+import itertools
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backtest.engine import TRADING_DAYS, month_starts, norm_ppf, pivot_wide
+from backtest.jobs import progress
+from backtest.riskfree import daily_rf
+
+SUMMARY_KEYS = [
+    "Final Equity", "Total Return", "CAGR", "Ann. Vol", "Ann. Sharpe", "Max Drawdown",
+    "VaR (norm, daily)", "VaR (hist, daily)", "ES (hist, daily)", "Turnover (avg/month)",
+]
+MAX_CELLS = 1 << 25  # ~256 MB of float64 per (configs x days x tickers) temporary
+
+# Panel of a process-pool worker, set once by _init_panel (the serial / thread path passes the
+# panel to _sweep_chunk directly, so concurrent sweeps in one process never share it).
+_PANEL: dict = {}
+
+# ---------- Config grid ----------
+def sweep_grid(
+    baskets: Iterable[Sequence[str]],
+    tc_bps: Iterable[float],
+    date_ranges: Iterable[tuple] = ((None, None),),
+) -> pd.DataFrame:
+    """Cartesian product of baskets x tc levels x (start_date, end_date) windows."""
+    rows = [
+        {"tickers": tuple(b), "tc_bps": float(tc), "start_date": s, "end_date": e}
+        for b, tc, (s, e) in itertools.product(baskets, tc_bps, date_ranges)
+    ]
+    return pd.DataFrame(rows, columns=["tickers", "tc_bps", "start_date", "end_date"])
+
+# ---------- Chunk kernel ----------
+def _panel_arrays(R: np.ndarray, index: np.ndarray, rf_d: Optional[np.ndarray] = None) -> dict:
+    starts = month_starts(pd.DatetimeIndex(index))
+    return dict(
+        rf_d=rf_d,
+        R0=np.nan_to_num(R),
+        L=np.log1p(np.nan_to_num(R)),
+        missing=np.isnan(R).astype(np.float32),
+        index=index,
+        starts=starts,
+        month_of_day=np.searchsorted(starts, np.arange(len(index)), side="right") - 1,
+    )
+
+def _init_panel(R: np.ndarray, index: np.ndarray, rf_d: Optional[np.ndarray] = None) -> None:
+    _PANEL.update(_panel_arrays(R, index, rf_d))
+
+def _sweep_chunk(
+    panel: dict,
+    B: np.ndarray,
+    lo: np.ndarray,
+    hi: np.ndarray,
+    tc_pct: np.ndarray,
+    start_cash: float,
+    rf_annual: float,
+    alpha: float,
+    want_equity: bool,
+):
+    """Evaluate a chunk of configs. B: (c x tickers) basket mask, lo/hi: window bounds (datetime64)."""
+    R0, L, idx = panel["R0"], panel["L"], panel["index"]
+    starts, mday = panel["starts"], panel["month_of_day"]
+    c, n_months = B.shape[0], len(starts)
+
+    # Days used per config: inside the window and full basket present (engine's dropna(how="any"))
+    nb = B.sum(axis=1)
+    miss = (panel["missing"] @ B.T.astype(np.float32)).T > 0
+    ok = (idx >= lo[:, None]) & (idx <= hi[:, None]) & ~miss & (nb[:, None] > 0)
+    W = B / np.maximum(nb, 1)[:, None]
+
+    # Monthly log growth per ticker over each config's own days; restrict to tickers used in the chunk
+    cols = B.any(axis=0)
+    Wc = W[:, cols]
+    G = np.add.reduceat(ok[:, :, None] * L[None, :, cols], starts, axis=1)  # c x months x tickers
+    present = np.add.reduceat(ok, starts, axis=1) > 0
+
+    # Turnover vs. drifted weights of the previous month that had data
+    mi = np.where(present, np.arange(n_months), -1)
+    prev = np.full_like(mi, -1)
+    prev[:, 1:] = np.maximum.accumulate(mi, axis=1)[:, :-1]
+    g_prev = np.take_along_axis(G, np.maximum(prev, 0)[:, :, None], axis=1)
+    w_end = Wc[:, None, :] * np.exp(g_prev)
+    with np.errstate(invalid="ignore"):
+        w_end /= w_end.sum(axis=2, keepdims=True)
+    turnover = np.abs(w_end - Wc[:, None, :]).sum(axis=2)
+    turnover[(prev < 0) | ~present] = 0.0
+
+    # Daily returns, cost on the first used day of each month
+    cs = np.cumsum(ok, axis=1)
+    base = np.zeros((c, n_months), dtype=cs.dtype)
+    base[:, 1:] = cs[:, starts[1:] - 1]
+    first = ok & (cs - base[:, mday] == 1)
+    cost = np.where(first, tc_pct[:, None] * turnover[:, mday], 0.0)
+    r = np.where(ok, (R0 @ W.T).T - cost, 0.0)
+
+    # Empty configs (no usable days) produce NaN rows; silence their warnings
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        n = ok.sum(axis=1)
+        equity = start_cash * np.cumprod(1.0 + r, axis=1)
+        eq0 = equity[np.arange(c), ok.argmax(axis=1)]
+        final = equity[:, -1]
+        total_return = final / eq0 - 1.0
+        cagr_val = np.where(n > 0, (1.0 + total_return) ** (TRADING_DAYS / n) - 1.0, np.nan)
+
+        mu_d = r.sum(axis=1) / n
+        sd_d = np.sqrt((((r - mu_d[:, None]) ** 2) * ok).sum(axis=1) / (n - 1))
+        ann_sigma = sd_d * np.sqrt(TRADING_DAYS)
+        rf_d = panel["rf_d"]
+        if rf_d is None:
+            sharpe = np.where(ann_sigma > 0, (mu_d * TRADING_DAYS - rf_annual) / ann_sigma, np.nan)
+        else:
+            # Time-varying rate: Sharpe of daily excess returns over each config's days
+            ex = np.where(ok, r - rf_d, 0.0)
+            mu_x = ex.sum(axis=1) / n
+            sd_x = np.sqrt((((ex - mu_x[:, None]) ** 2) * ok).sum(axis=1) / (n - 1))
+            sharpe = np.where(sd_x > 0, mu_x / sd_x * np.sqrt(TRADING_DAYS), np.nan)
+
+        roll_max = np.maximum.accumulate(np.where(ok, equity, -np.inf), axis=1)
+        mdd = np.where(ok, equity / roll_max - 1.0, np.inf).min(axis=1)
+
+        var_norm = -(mu_d - norm_ppf(alpha) * sd_d)
+        losses = np.where(ok, -r, np.nan)
+        var_hist = np.nanquantile(losses, alpha, axis=1)
+        es_hist = np.nanmean(np.where(losses >= var_hist[:, None], losses, np.nan), axis=1)
+
+        counted = present & (prev >= 0)
+        k = counted.sum(axis=1)
+        turn_avg = np.where(k > 0, (turnover * counted).sum(axis=1) / np.maximum(k, 1), 0.0)
+
+    stats = np.column_stack([
+        final, total_return, cagr_val, ann_sigma, sharpe, mdd,
+        var_norm, var_hist, es_hist, turn_avg,
+    ])
+    stats[n == 0] = np.nan
+    curves = np.where(ok, equity, np.nan) if want_equity else None
+    return stats, curves
+
+def _run_chunk_in_worker(args):
+    return _sweep_chunk(_PANEL, *args)
+
+# ---------- Public API ----------
+def run_sweep(
+    r_df: pd.DataFrame,
+    configs,
+    start_cash: float = 100000.0,
+    rf_annual=0.0,
+    alpha: float = 0.95,
+    chunk_size: Optional[int] = None,
+    n_jobs: int = 1,
+    return_equity: bool = False,
+):
+    """Evaluate many (tickers, tc_bps, start_date, end_date) configs in one pass.
+
+    configs: DataFrame or list of dicts (see sweep_grid); missing dates mean the full range.
+    rf_annual: constant, or a riskfree.RiskFreeRate (aligned to the panel's days once, shared by
+    every chunk).
+    Returns: summary DataFrame (config columns + SUMMARY_KEYS), plus equity DataFrame
+    (dt x config row) if return_equity. Matches portfolio_engine_equal_monthly per config.
+    """
+    cfg = pd.DataFrame(configs).reset_index(drop=True)
+    for col in ("start_date", "end_date"):
+        if col not in cfg:
+            cfg[col] = None
+    baskets = [sorted({t.upper() for t in b}) for b in cfg["tickers"]]
+    universe = sorted(set().union(*baskets)) if baskets else []
+
+    wide = pivot_wide(r_df[r_df["ticker"].isin(universe)])
+    index = wide.index.to_numpy()
+    col_pos = {t: i for i, t in enumerate(wide.columns)}
+
+    B = np.zeros((len(cfg), wide.shape[1]), dtype=bool)
+    for i, basket in enumerate(baskets):
+        B[i, [col_pos[t] for t in basket if t in col_pos]] = True
+    # Open ends -> the panel's first / last day (Timestamp.min/max do not survive unit casts)
+    lo = pd.to_datetime(cfg["start_date"]).to_numpy(dtype=index.dtype)
+    hi = pd.to_datetime(cfg["end_date"]).to_numpy(dtype=index.dtype)
+    if len(index):
+        lo, hi = np.where(np.isnat(lo), index[0], lo), np.where(np.isnat(hi), index[-1], hi)
+    tc_pct = cfg["tc_bps"].to_numpy(dtype=float) / 10000.0
+
+    rf_d = daily_rf(rf_annual, wide.index)
+    if rf_d is not None:
+        rf_annual = 0.0
+
+    if chunk_size is None:
+        chunk_size = max(1, MAX_CELLS // max(1, wide.shape[0] * wide.shape[1]))
+    tasks = [
+        (B[a:a + chunk_size], lo[a:a + chunk_size], hi[a:a + chunk_size], tc_pct[a:a + chunk_size],
+         start_cash, rf_annual, alpha, return_equity)
+        for a in range(0, len(cfg), chunk_size)
+    ]
+
+    R = wide.to_numpy()
+    results = []
+    if n_jobs == 1 or len(tasks) <= 1:
+        panel = _panel_arrays(R, index, rf_d)
+        for t in tasks:
+            results.append(_sweep_chunk(panel, *t))
+            progress(len(results) / len(tasks), f"sweep chunk {len(results)}/{len(tasks)}")
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_panel, initargs=(R, index, rf_d)) as ex:
+            for res in ex.map(_run_chunk_in_worker, tasks):
+                results.append(res)
+                progress(len(results) / len(tasks), f"sweep chunk {len(results)}/{len(tasks)}")
+
+    stats = np.vstack([s for s, _ in results]) if results else np.empty((0, len(SUMMARY_KEYS)))
+    summary = pd.concat([cfg, pd.DataFrame(stats, columns=SUMMARY_KEYS)], axis=1)
+    if not return_equity:
+        return summary
+    curves = np.vstack([e for _, e in results]) if results else np.empty((0, len(index)))
+    equity = pd.DataFrame(curves.T, index=wide.index, columns=cfg.index)
+    return summary, equity
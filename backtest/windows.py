@@ -0,0 +1,160 @@
+# Prefix-sum index over daily return series: KPIs for any [start, end] window without
+# re-running the engine or touching the days inside the window.
+#   - cumulative log growth G, cumulative sums of r and r² (shifted by the column mean, as in
+#     rolling.rolling_moments) and valid-day counts: total return, CAGR, vol, Sharpe in O(1)
+#   - power-of-two block table of (max, min, max drawdown) of log equity: a window is split
+#     into <= log2(T) disjoint blocks merged left to right, so max drawdown is O(log T)
+# Queries are vectorized over windows and series, so sweeping thousands of sub-windows
+# (calendar years, rolling start dates) is a handful of array ops.
+#
+#   idx = WindowIndex(wide_ret.assign(Portfolio=daily["r_port"]))
+#   idx.stats("2020-01-01", "2020-12-31")        # series x metrics
+#   idx.sweep(calendar_windows(idx.index, "Y"))   # (start, end, series) x metrics
+
+from __future__ import annotations
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from backtest.engine import TRADING_DAYS
+
+METRICS = ["Total Return", "CAGR", "Ann. Vol", "Ann. Sharpe", "Max Drawdown", "Days"]
+
+class WindowIndex:
+    """Index over (days x series) simple returns; NaN days are skipped (equity stays flat).
+
+    Conventions follow engine.summarize on the window's returns: total return and max drawdown
+    are measured from the first day's close, CAGR annualizes by the number of return days.
+    """
+
+    def __init__(self, returns: Union[pd.Series, pd.DataFrame]):
+        frame = returns.to_frame() if isinstance(returns, pd.Series) else returns
+        self.index = pd.DatetimeIndex(frame.index)
+        self.columns = frame.columns
+        x = frame.to_numpy(dtype=float)
+        T, k = x.shape
+        self.T = T
+        valid = ~np.isnan(x)
+        x0 = np.where(valid, x, 0.0)
+        zero = np.zeros((1, k))
+
+        self.count = np.concatenate([zero, np.cumsum(valid, axis=0)])
+        self.G = np.concatenate([zero, np.cumsum(np.log1p(x0), axis=0)])
+        with np.errstate(invalid="ignore"):
+            self.shift = np.nan_to_num(np.nanmean(x, axis=0)) if T else np.zeros(k)
+        d = np.where(valid, x - self.shift, 0.0)
+        self.S1 = np.concatenate([zero, np.cumsum(d, axis=0)])
+        self.S2 = np.concatenate([zero, np.cumsum(d * d, axis=0)])
+        # First valid day at or after each position (T if none)
+        nxt = np.where(valid, np.arange(T)[:, None], T)
+        self.next_valid = np.concatenate([np.minimum.accumulate(nxt[::-1], axis=0)[::-1], np.full((1, k), T)])
+        self._build_blocks()
+
+    def _build_blocks(self) -> None:
+        """Level j holds (max, min, max drawdown) of log equity y[t] = G[t+1] over t..t+2^j-1."""
+        y = self.G[1:]
+        mx, mn, dd = [y], [y], [np.zeros_like(y)]
+        h = 1
+        while 2 * h <= self.T:
+            m = self.T - 2 * h + 1      # blocks of size 2h that fit
+            lmx, lmn, ldd = mx[-1][:m], mn[-1][:m], dd[-1][:m]
+            rmx, rmn, rdd = mx[-1][h:h + m], mn[-1][h:h + m], dd[-1][h:h + m]
+            mx.append(np.maximum(lmx, rmx))
+            mn.append(np.minimum(lmn, rmn))
+            dd.append(np.minimum(np.minimum(ldd, rdd), rmn - lmx))
+            h *= 2
+        self._mx, self._mn, self._dd = mx, mn, dd
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for lv in (self._mx, self._mn, self._dd) for a in lv) + 5 * self.G.nbytes
+
+    # ---------- Queries ----------
+    def positions(self, starts, ends) -> tuple[np.ndarray, np.ndarray]:
+        """Inclusive row range [a, b] of each (start, end) date window (b < a if empty)."""
+        v = self.index.values
+        a = np.searchsorted(v, pd.DatetimeIndex(np.atleast_1d(starts)).values, side="left")
+        b = np.searchsorted(v, pd.DatetimeIndex(np.atleast_1d(ends)).values, side="right") - 1
+        return a, b
+
+    def _max_drawdown(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """(windows x series) max drawdown (log) of y over rows lo..hi inclusive (per series)."""
+        acc_mx = np.full(lo.shape, -np.inf)
+        acc_dd = np.zeros(lo.shape)
+        length = np.maximum(hi - lo + 1, 0)
+        p = lo.copy()
+        cols = np.broadcast_to(np.arange(lo.shape[1]), lo.shape)
+        for j in range(len(self._dd) - 1, -1, -1):
+            take = (length >> j) & 1 == 1
+            if not take.any():
+                continue
+            pj, cj = p[take], cols[take]
+            bmx, bmn, bdd = self._mx[j][pj, cj], self._mn[j][pj, cj], self._dd[j][pj, cj]
+            acc_dd[take] = np.minimum(np.minimum(acc_dd[take], bdd), bmn - acc_mx[take])
+            acc_mx[take] = np.maximum(acc_mx[take], bmx)
+            p[take] += 1 << j
+        return acc_dd
+
+    def query(self, a: np.ndarray, b: np.ndarray, rf_annual: float = 0.0) -> dict[str, np.ndarray]:
+        """Metric -> (windows x series) arrays for inclusive row ranges [a, b]."""
+        a = np.clip(np.asarray(a), 0, self.T)
+        b1 = np.clip(np.asarray(b) + 1, a, self.T)          # exclusive end, empty if b < a
+        A, B = a[:, None], b1[:, None]
+        cols = np.arange(len(self.columns))
+        n = self.count[B, cols] - self.count[A, cols]
+        first = self.next_valid[A, cols]                     # first return day in the window
+        has = n > 0
+        f1 = np.where(has, first + 1, B)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            s1 = self.S1[B, cols] - self.S1[A, cols]
+            s2 = self.S2[B, cols] - self.S2[A, cols]
+            mean = self.shift + s1 / n
+            var = (s2 - s1 * s1 / n) / (n - 1)
+            vol = np.sqrt(np.maximum(var, 0.0)) * np.sqrt(TRADING_DAYS)
+            vol = np.where(n > 1, vol, np.nan)
+            total = np.expm1(self.G[B, cols] - self.G[f1, cols])
+            cagr = np.where(has, (1.0 + total) ** (TRADING_DAYS / n) - 1.0, np.nan)
+            sharpe = np.where(vol > 0, (mean * TRADING_DAYS - rf_annual) / vol, np.nan)
+        mdd = np.expm1(self._max_drawdown(np.where(has, first, 0), np.where(has, B - 1, -1)))
+        nan = lambda v: np.where(has, v, np.nan)
+        return {
+            "Total Return": nan(total), "CAGR": cagr, "Ann. Vol": vol, "Ann. Sharpe": sharpe,
+            "Max Drawdown": nan(mdd), "Days": n.astype(float),
+        }
+
+    def stats(self, start=None, end=None, rf_annual: float = 0.0) -> pd.DataFrame:
+        """Series x METRICS for one window (None = open end)."""
+        start = self.index[0] if start is None else start
+        end = self.index[-1] if end is None else end
+        out = self.query(*self.positions(start, end), rf_annual)
+        return pd.DataFrame({m: out[m][0] for m in METRICS}, index=self.columns)
+
+    def sweep(self, windows: pd.DataFrame, rf_annual: float = 0.0) -> pd.DataFrame:
+        """windows: DataFrame with start / end columns -> (start, end, series) x METRICS."""
+        a, b = self.positions(windows["start"], windows["end"])
+        out = self.query(a, b, rf_annual)
+        k = len(self.columns)
+        idx = pd.MultiIndex.from_arrays([
+            np.repeat(pd.DatetimeIndex(windows["start"]), k),
+            np.repeat(pd.DatetimeIndex(windows["end"]), k),
+            np.tile(self.columns, len(windows)),
+        ], names=["start", "end", "series"])
+        return pd.DataFrame({m: out[m].ravel() for m in METRICS}, index=idx)
+
+# ---------- Window generators ----------
+def calendar_windows(index: pd.DatetimeIndex, freq: str = "Y") -> pd.DataFrame:
+    """Calendar periods ('Y', 'Q', 'M') covered by the index, clipped to its first/last day."""
+    periods = pd.DatetimeIndex(index).to_period(freq).unique()
+    start = np.maximum(periods.start_time, index[0])
+    end = np.minimum(periods.end_time.normalize(), index[-1])
+    return pd.DataFrame({"start": start, "end": end}, index=periods.astype(str))
+
+def rolling_windows(index: pd.DatetimeIndex, length: pd.DateOffset = pd.DateOffset(years=1),
+                    step: int = 1) -> pd.DataFrame:
+    """Windows of fixed calendar length starting at every 'step'-th day (ending inside the index)."""
+    start = pd.DatetimeIndex(index[::step])
+    end = start + length - pd.Timedelta(days=1)
+    keep = end <= index[-1]
+    return pd.DataFrame({"start": start[keep], "end": end[keep]})
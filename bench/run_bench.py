@@ -0,0 +1,169 @@
+# Benchmark suite: times each pipeline stage on synthetic universes and tracks peak memory.
+#
+#   python bench/run_bench.py                       # default sizes, compare to bench/baseline.json
+#   python bench/run_bench.py --sizes 5x1 500x20 5000x50 --save-baseline
+#   python bench/run_bench.py --tolerance 0.3       # fail if a stage is >30% slower / larger
+#
+# Sizes are TICKERSxYEARS. Each stage is timed as the best of --repeat runs, then run once
+# more under tracemalloc for its peak Python/NumPy allocation (DuckDB's native memory is not
+# traced, so the dbt stages report time only). Exit code 1 if any stage regresses.
+
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backtest.data import compute_returns, load_prices
+from backtest.engine import equal_monthly_arrays, month_starts, pivot_wide, portfolio_engine_equal_monthly
+from backtest.garch import try_garch
+from backtest.store import normalize_prices, store_path_for, write_price_store
+from bench.synthetic import ensure_universe, ticker_names
+
+DEFAULT_SIZES = ["5x1", "50x10", "500x20"]
+BASELINE = os.path.join(ROOT, "bench", "baseline.json")
+WORKDIR = os.path.join(ROOT, ".cache", "bench")
+TOLERANCE = 0.25
+MIN_SECONDS = 0.01    # ignore slowdowns below this (timer noise)
+MIN_MB = 1.0
+MODELS = os.path.join(ROOT, "portfolio", "models")
+
+# ---------- Measurement ----------
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak / 2**20}
+
+# ---------- dbt models (rendered for plain DuckDB, no dbt needed) ----------
+def render_model(name: str, data_dir: str, incremental: bool = False) -> str:
+    sub = "stg" if name.startswith("stg_") else "cre"
+    with open(os.path.join(MODELS, sub, name + ".sql"), encoding="utf-8") as f:
+        sql = f.read()
+    sql = re.sub(r"\{\{\s*config\(.*?\)\s*\}\}", "", sql, flags=re.S)
+    if incremental:
+        sql = re.sub(r"\{%\s*if is_incremental\(\)\s*%\}(.*?)\{%\s*endif\s*%\}", r"\1", sql, flags=re.S)
+        sql = sql.replace("{{ this }}", name)
+    else:
+        sql = re.sub(r"\{%\s*if is_incremental\(\)\s*%\}.*?\{%\s*endif\s*%\}", "", sql, flags=re.S)
+    sql = re.sub(r"\{\{\s*ref\('(\w+)'\)\s*\}\}", r"\1", sql)
+    return sql.replace("'data_raw/", "'" + data_dir.replace("\\", "/") + "/")
+
+def dbt_stages(yc_dir: str) -> Dict[str, Callable[[], object]]:
+    try:
+        import duckdb
+    except ImportError:
+        return {}
+    con = duckdb.connect()
+    stg, cre = render_model("stg_macro_yc_long", yc_dir), render_model("cre_macro_yc_wide", yc_dir)
+    stg_inc = render_model("stg_macro_yc_long", yc_dir, incremental=True)
+    con.execute(f"CREATE TABLE stg_macro_yc_long AS {stg}")
+
+    def full():
+        con.execute(f"CREATE OR REPLACE TABLE stg_macro_yc_long AS {stg}")
+        con.execute(f"CREATE OR REPLACE TABLE cre_macro_yc_wide AS {cre}")
+    return {
+        "dbt_yield_full": full,
+        "dbt_yield_incremental": lambda: con.execute(f"SELECT count(*) FROM ({stg_inc})").fetchall(),
+    }
+
+# ---------- Suite ----------
+def csv_only(csv: str):
+    """CSV parse path of load_prices (ignores the .arrow store built next to it)."""
+    return normalize_prices(pd.read_csv(csv))
+
+def bench_size(n_tickers: int, years: int, repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    csv, yc_dir = ensure_universe(WORKDIR, n_tickers, years, seed)
+    tickers = ticker_names(n_tickers)
+    out: Dict[str, Dict[str, float]] = {}
+
+    out["load_prices_csv"] = measure(lambda: csv_only(csv), repeat)
+    prices = csv_only(csv)
+    store = store_path_for(csv)
+    if not os.path.exists(store):
+        write_price_store(prices, store)
+    out["load_prices_store"] = measure(lambda: load_prices(store), repeat)
+    out["compute_returns"] = measure(lambda: compute_returns(prices), repeat)
+    r_df = compute_returns(prices)
+    out["pivot"] = measure(lambda: pivot_wide(r_df).dropna(how="any"), repeat)
+    wide = pivot_wide(r_df).dropna(how="any")
+    R, starts = wide.to_numpy(), month_starts(wide.index)
+    out["turnover_cost"] = measure(lambda: equal_monthly_arrays(R, starts, 0.001), repeat)
+    out["engine"] = measure(
+        lambda: portfolio_engine_equal_monthly(r_df, tickers, 1e5, 0.001, 0.02, None, None, 0.95), repeat)
+    daily = portfolio_engine_equal_monthly(r_df, tickers, 1e5, 0.001, 0.02, None, None, 0.95)[0]
+    out["try_garch"] = measure(lambda: try_garch(daily["r_port"]), repeat)
+    for name, fn in dbt_stages(yc_dir).items():
+        out[name] = measure(fn, repeat)
+    return out
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    failures = []
+    for size, stages in results.items():
+        for stage, cur in stages.items():
+            ref = baseline.get(size, {}).get(stage)
+            if ref is None:
+                continue
+            if cur["seconds"] > ref["seconds"] * (1 + tolerance) and cur["seconds"] - ref["seconds"] > MIN_SECONDS:
+                failures.append(f"{size} {stage}: {ref['seconds']:.3f}s -> {cur['seconds']:.3f}s")
+            if cur["peak_mb"] > ref["peak_mb"] * (1 + tolerance) and cur["peak_mb"] - ref["peak_mb"] > MIN_MB:
+                failures.append(f"{size} {stage}: {ref['peak_mb']:.1f} MB -> {cur['peak_mb']:.1f} MB")
+    return failures
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Stage timings / peak memory on synthetic universes.")
+    ap.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="TICKERSxYEARS, e.g. 5000x50")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--tolerance", type=float, default=TOLERANCE)
+    ap.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    args = ap.parse_args(argv)
+
+    results = {}
+    for size in args.sizes:
+        n, y = (int(v) for v in size.lower().split("x"))
+        print(f"== {size} ({n} tickers, {y} years)")
+        results[size] = bench_size(n, y, args.repeat, args.seed)
+        for stage, m in results[size].items():
+            print(f"   {stage:<22} {m['seconds'] * 1000:10.1f} ms {m['peak_mb']:10.1f} MB")
+
+    if args.save_baseline:
+        payload = {"machine": platform.platform(), "python": platform.python_version(),
+                   "numpy": np.__version__, "results": results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        print(f"  ✓ baseline written: {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print("  (no baseline yet; run with --save-baseline)")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    failures = compare(results, baseline, args.tolerance)
+    for line in failures:
+        print(f"❌ regression {line}")
+    if failures:
+        sys.exit(1)
+    print(f"  ✓ no stage regressed beyond {args.tolerance:.0%}")
+
+if __name__ == "__main__":
+    main()
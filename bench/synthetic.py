@@ -0,0 +1,81 @@
+# Seeded synthetic inputs for the benchmark suite (no network):
+#   - long-format prices in the equities_de_daily.csv schema: Date,Ticker,Close_EUR
+#   - Bundesbank-style monthly yield files Zinsstrukturkurve_<m>_Y.csv for the dbt models
+# Same (n_tickers, years, seed) -> byte-identical files.
+
+import os
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+END_DATE = "2024-12-31"
+LATE_SHARE = 0.1       # share of tickers listed after the first day (ragged universe)
+WRITE_TICKERS = 100    # tickers per CSV write, bounds memory for 5,000 x 50y
+MATURITIES = ["05", "1", "2", "3", "5", "7", "10", "15", "20", "30"]
+
+def ticker_names(n: int) -> List[str]:
+    return [f"T{i:04d}.DE" for i in range(n)]
+
+def price_paths(rng: np.random.Generator, n_days: int, n: int) -> np.ndarray:
+    """(days x tickers) GBM-like paths with a common market factor and fat-ish tails."""
+    market = rng.standard_t(5, size=(n_days, 1)) * 0.008
+    beta = rng.uniform(0.6, 1.4, size=n)
+    idio = rng.standard_t(5, size=(n_days, n)) * rng.uniform(0.008, 0.02, size=n)
+    r = 0.0003 + market * beta + idio
+    return rng.uniform(10, 200, size=n) * np.exp(np.cumsum(np.log1p(np.clip(r, -0.5, 0.5)), axis=0))
+
+def write_prices(path: str, n_tickers: int, years: int, seed: int = 0) -> str:
+    """Write a synthetic price CSV sorted by ticker, date; returns the path."""
+    dates = pd.bdate_range(end=END_DATE, periods=int(years * 252))
+    date_str = dates.strftime("%Y-%m-%d").to_numpy()
+    rng = np.random.default_rng(seed)
+    names = ticker_names(n_tickers)
+    # Late listings start somewhere in the first tenth of the sample
+    first = np.where(rng.random(n_tickers) < LATE_SHARE, rng.integers(0, max(1, len(dates) // 10), n_tickers), 0)
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        f.write("Date,Ticker,Close_EUR\n")
+        for a in range(0, n_tickers, WRITE_TICKERS):
+            b = min(n_tickers, a + WRITE_TICKERS)
+            px = price_paths(rng, len(dates), b - a)
+            parts = []
+            for j in range(b - a):
+                lo = first[a + j]
+                parts.append(pd.DataFrame({"Date": date_str[lo:], "Ticker": names[a + j], "Close_EUR": px[lo:, j]}))
+            pd.concat(parts, ignore_index=True).to_csv(f, header=False, index=False)
+    os.replace(tmp, path)
+    return path
+
+def write_yield_curves(folder: str, years: int, n_maturities: int = 4, seed: int = 0) -> List[str]:
+    """Bundesbank CSV layout: 8 header lines, then 'YYYY-MM;d,dd;' rows."""
+    os.makedirs(folder, exist_ok=True)
+    months = pd.period_range(end=END_DATE[:7], periods=years * 12, freq="M").strftime("%Y-%m")
+    rng = np.random.default_rng(seed)
+    level = 3.0 + np.cumsum(rng.normal(0, 0.15, len(months)))
+    paths = []
+    for m in MATURITIES[:n_maturities]:
+        years_m = float(m) / 10 if m.startswith("0") else float(m)
+        y = level + 0.4 * np.log1p(years_m) + rng.normal(0, 0.05, len(months))
+        header = ['"";BBSIS.SYNTHETIC;BBSIS.SYNTHETIC_FLAGS', f'"";Synthetic / {m} Jahr(e) RLZ;',
+                  "Dezimalstellen;2;", "Dimension;Eins;", "Einheit;Prozent;", "Format der Zeitangabe;P1M;",
+                  "Kategorie;GKZR;", "Stand vom;01.01.2025 00:00:00 Uhr;"]
+        rows = [f"{mm};{v:.2f};".replace(".", ",") for mm, v in zip(months, y)]
+        path = os.path.join(folder, f"Zinsstrukturkurve_{m}_Y.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(header + rows) + "\n")
+        paths.append(path)
+    return paths
+
+def ensure_universe(workdir: str, n_tickers: int, years: int, seed: int = 0) -> Tuple[str, str]:
+    """Cached generation: (prices csv, yield curve folder) for one size."""
+    folder = os.path.join(workdir, f"u{n_tickers}x{years}_s{seed}")
+    os.makedirs(folder, exist_ok=True)
+    csv = os.path.join(folder, "equities_synthetic_daily.csv")
+    if not os.path.exists(csv):
+        write_prices(csv, n_tickers, years, seed)
+    yc = os.path.join(folder, "data_raw")
+    if not os.path.isdir(yc):
+        write_yield_curves(yc, years, seed=seed)
+    return csv, yc
@@ -1,30 +1,159 @@
+# Fetches Bundesbank time series (BBSIS yield curve etc.) as CSV into data_raw/
+# Series catalog: extract/buba_series.csv (series,filename) — add rows for more maturities.
+#
+# Downloads run concurrently over one pooled session with retries. Conditional requests
+# (ETag / Last-Modified, kept in data_raw/.buba_state.json) and a content hash skip
+# series that did not change. A per-series report (status, latency, bytes) is printed.
+
+import argparse
+import csv
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ---- Config ----
 BASE_URL = "http://api.statistiken.bundesbank.de/rest/data/"
-SERIES = {
-    "BBSIS/M.I.ZST.ZI.EUR.S1311.B.A604.R005X.R.A.A._Z._Z.A": "Zinsstrukturkurve_05_Y.csv",
-    "BBSIS/M.I.ZST.ZI.EUR.S1311.B.A604.R01XX.R.A.A._Z._Z.A": "Zinsstrukturkurve_1_Y.csv",
-    "BBSIS/M.I.ZST.ZI.EUR.S1311.B.A604.R05XX.R.A.A._Z._Z.A": "Zinsstrukturkurve_5_Y.csv",
-    "BBSIS/M.I.ZST.ZI.EUR.S1311.B.A604.R10XX.R.A.A._Z._Z.A": "Zinsstrukturkurve_10_Y.csv"
-}
 FORMAT = "?format=csv"
+HERE = os.path.dirname(os.path.abspath(__file__))
+CATALOG = os.path.join(HERE, "buba_series.csv")
+STATE_FILE = ".buba_state.json"
+WORKERS = 8
+TIMEOUT = 30
+
+def load_catalog(path: str = CATALOG) -> Dict[str, str]:
+    """series key -> target filename"""
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["series"].strip(): row["filename"].strip() for row in csv.DictReader(f)}
+
+def make_session(pool_size: int = WORKERS, retries: int = 3) -> requests.Session:
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    s = requests.Session()
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
 
-# Resolve save path: one folder above current, into data_raw/
-save_dir = os.path.abspath(os.path.join(os.getcwd(), "..", "data_raw"))
-os.makedirs(save_dir, exist_ok=True)
+def _load_state(save_dir: str) -> dict:
+    path = os.path.join(save_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
 
-# ---- Download loop ----
-for series, filename in SERIES.items():
-    url = BASE_URL + series + FORMAT
+def _save_state(save_dir: str, state: dict) -> None:
+    path = os.path.join(save_dir, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+# ---- Fetch one series ----
+def fetch_series(
+    session: requests.Session,
+    series: str,
+    filename: str,
+    save_dir: str,
+    prev: dict,
+    base_url: str = BASE_URL,
+) -> dict:
+    """Download one series; returns a report row incl. updated validators."""
+    url = base_url + series + FORMAT
     filepath = os.path.join(save_dir, filename)
+    headers = {}
+    if os.path.exists(filepath):
+        if prev.get("etag"):
+            headers["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"):
+            headers["If-Modified-Since"] = prev["last_modified"]
+
+    t0 = time.perf_counter()
+    row = {"series": series, "file": filename, "bytes": 0}
+    try:
+        r = session.get(url, headers=headers, timeout=TIMEOUT)
+    except requests.RequestException as e:
+        row.update(status="error", latency_s=time.perf_counter() - t0, detail=str(e))
+        return row
+    row["latency_s"] = time.perf_counter() - t0
+    row["bytes"] = len(r.content)
+
+    if r.status_code == 304:
+        row.update(status="not modified", state=prev)
+        return row
+    if r.status_code != 200:
+        row.update(status=f"failed ({r.status_code})", detail=url)
+        return row
+
+    digest = hashlib.sha256(r.content).hexdigest()
+    state = {
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+        "sha256": digest,
+    }
+    if digest == prev.get("sha256") and os.path.exists(filepath):
+        row.update(status="unchanged", state=state)
+        return row
+    with open(filepath + ".tmp", "wb") as f:
+        f.write(r.content)
+    os.replace(filepath + ".tmp", filepath)
+    row.update(status="saved", state=state)
+    return row
+
+# ---- Fetch catalog ----
+def fetch_all(
+    catalog: Dict[str, str],
+    save_dir: str,
+    base_url: str = BASE_URL,
+    workers: int = WORKERS,
+    session: Optional[requests.Session] = None,
+) -> List[dict]:
+    os.makedirs(save_dir, exist_ok=True)
+    state = _load_state(save_dir)
+    own_session = session is None
+    session = session or make_session(pool_size=workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = [
+                ex.submit(fetch_series, session, series, filename, save_dir, state.get(series, {}), base_url)
+                for series, filename in catalog.items()
+            ]
+            rows = [f.result() for f in futures]
+    finally:
+        if own_session:
+            session.close()
+
+    for row in rows:
+        if "state" in row:
+            state[row["series"]] = row.pop("state")
+    _save_state(save_dir, state)
+    return rows
+
+def print_report(rows: List[dict]) -> None:
+    for row in rows:
+        mark = "✅" if row["status"] in ("saved", "not modified", "unchanged") else "❌"
+        print(f"{mark} {row['file']:<32} {row['status']:<14} {row.get('latency_s', 0.0) * 1000:8.1f} ms "
+              f"{row['bytes']:>10,d} B")
+    total = sum(r["bytes"] for r in rows)
+    print(f"   {len(rows)} series, {total:,d} bytes transferred")
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Download Bundesbank series listed in the catalog.")
+    ap.add_argument("--catalog", default=CATALOG)
+    # Resolve save path: one folder above current, into data_raw/
+    ap.add_argument("--save-dir", default=os.path.abspath(os.path.join(os.getcwd(), "..", "data_raw")))
+    ap.add_argument("--base-url", default=BASE_URL)
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    args = ap.parse_args(argv)
+
+    catalog = load_catalog(args.catalog)
+    print(f"Downloading {len(catalog)} series -> {args.save_dir} ...")
+    print_report(fetch_all(catalog, args.save_dir, args.base_url, args.workers))
 
-    print(f"Downloading {series} -> {filename} ...")
-    r = requests.get(url)
-    if r.status_code == 200:
-        with open(filepath, "wb") as f:
-            f.write(r.content)
-        print(f"✅ Saved: {filepath}")
-    else:
-        print(f"❌ Failed ({r.status_code}): {url}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,212 @@
 # pipeline/fetch_equities.py
 # Fetches German equities (daily) via yfinance
-# Writes: data_raw/equities_de_daily.csv
+# Writes: data_raw/equities_de_daily.csv (+ columnar store data_raw/equities_de_daily.arrow)
+#
+# Default is incremental: per ticker, the last stored day and everything after it are fetched
+# (batches of tickers on a thread pool) and the new days appended. auto_adjust closes are
+# rescaled back in time after splits / dividends, so the re-fetched last stored day is compared
+# with the stored close; tickers that no longer match are re-downloaded in full.
+# Use --full for a complete re-download.
 
+import argparse
 import os
-import pandas as pd
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 
-try:
-    import yfinance as yf
-except ImportError:
-    raise SystemExit("yfinance not installed. Run: pip install yfinance")
+import pandas as pd
 
 ROOT = os.path.dirname(os.path.dirname(__file__)) if "__file__" in globals() else "."
 RAW  = os.path.join(ROOT, "data_raw")
 os.makedirs(RAW, exist_ok=True)
+sys.path.insert(0, os.path.abspath(ROOT))
+
+from backtest.store import (
+    PriceStore, append_price_store, normalize_prices, store_path_for, write_price_store,
+)
 
 # === Settings ===
 EQ_START = "2010-01-01"
 TICKERS  = ["SAP.DE", "SIE.DE", "ALV.DE", "BAS.DE", "BMW.DE"]
+OUTFILE  = os.path.join(RAW, "equities_de_daily.csv")
+BATCH_SIZE = 50
+WORKERS = 8
+ADJ_TOL = 1e-4   # relative tolerance between the stored and the re-fetched overlap close
+
+# Provider: (tickers, start 'YYYY-MM-DD') -> long frame with columns Date, Ticker, Close_EUR
+Fetcher = Callable[[List[str], str], pd.DataFrame]
 
-def main():
-    print(f"→ Downloading equities via yfinance: {', '.join(TICKERS)} …")
-    px = yf.download(TICKERS, start=EQ_START, progress=False, auto_adjust=True)
+def yf_download(tickers: List[str], start: str) -> pd.DataFrame:
+    try:
+        import yfinance as yf
+    except ImportError:
+        raise SystemExit("yfinance not installed. Run: pip install yfinance")
+    px = yf.download(tickers, start=start, progress=False, auto_adjust=True)
     if "Close" in px.columns:
         px = px["Close"]
+    if isinstance(px, pd.Series):
+        px = px.to_frame(tickers[0])
     px = px.rename_axis("Date").reset_index()
 
     # long format (Date, Ticker, Close_EUR)
-    px_long = (
-        px.melt(id_vars="Date", var_name="Ticker", value_name="Close_EUR")
-          .dropna()
+    return px.melt(id_vars="Date", var_name="Ticker", value_name="Close_EUR").dropna()
+
+# ---------- High-water mark ----------
+def last_stored(outfile: str = OUTFILE) -> Dict[str, Tuple[pd.Timestamp, float]]:
+    """Last stored (date, close) per ticker: from the store if it is current, else from the CSV."""
+    if not os.path.exists(outfile):
+        return {}
+    store_path = store_path_for(outfile)
+    if store_path.exists() and store_path.stat().st_mtime >= os.path.getmtime(outfile):
+        try:
+            store = PriceStore(store_path)
+            closes = store.last_prices()
+            return {t: (store.last[t], closes[t]) for t in closes}
+        except (ImportError, OSError, KeyError):
+            pass
+    df = normalize_prices(pd.read_csv(outfile, usecols=["Date", "Ticker", "Close_EUR"]))
+    tail = df.groupby("ticker").tail(1)
+    return {t: (d, p) for t, d, p in zip(tail["ticker"], tail["dt"], tail["price"])}
+
+def _fetch_jobs(jobs: List[Tuple[List[str], str]], fetch: Fetcher, workers: int) -> pd.DataFrame:
+    """Run (tickers, start) batches on a thread pool; one row per (Date, Ticker), sorted."""
+    if not jobs:
+        return pd.DataFrame(columns=["Date", "Ticker", "Close_EUR"])
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        parts = list(ex.map(lambda job: fetch(*job), jobs))
+    px = pd.concat(parts, ignore_index=True)
+    if px.empty:
+        return px.reindex(columns=["Date", "Ticker", "Close_EUR"])
+    px["Date"] = pd.to_datetime(px["Date"])
+    return (
+        px.drop_duplicates(subset=["Date", "Ticker"], keep="last")
           .sort_values(["Ticker", "Date"])
+          .reset_index(drop=True)[["Date", "Ticker", "Close_EUR"]]
     )
 
-    outfile = os.path.join(RAW, "equities_de_daily.csv")
+def _batches(groups: Dict[str, List[str]], batch_size: int) -> List[Tuple[List[str], str]]:
+    return [
+        (group[i:i + batch_size], start)
+        for start, group in groups.items()
+        for i in range(0, len(group), batch_size)
+    ]
+
+def fetch_missing(
+    tickers: List[str],
+    last: Dict[str, Tuple[pd.Timestamp, float]],
+    fetch: Fetcher = yf_download,
+    batch_size: int = BATCH_SIZE,
+    workers: int = WORKERS,
+    tol: float = ADJ_TOL,
+) -> Tuple[pd.DataFrame, List[str]]:
+    """Fetch each ticker from its last stored day on; batches of tickers share a start date.
+
+    Returns (rows after the last stored day, stale tickers). A ticker is stale when the re-fetched
+    close of its last stored day differs from the stored one by more than 'tol' (relative), or is
+    missing while newer rows came back: its stored history was adjusted since and must be
+    re-downloaded, so none of its rows are returned.
+    """
+    by_start: Dict[str, List[str]] = {}
+    for t in tickers:
+        hw = last.get(t.upper())
+        by_start.setdefault(EQ_START if hw is None else hw[0].strftime("%Y-%m-%d"), []).append(t)
+    new = _fetch_jobs(_batches(by_start, batch_size), fetch, workers)
+    if new.empty:
+        return new, []
+
+    key = new["Ticker"].str.upper()
+    hw_dt = key.map({t: d for t, (d, _) in last.items()})
+    hw_px = key.map({t: p for t, (_, p) in last.items()})
+    overlap = new["Date"] == hw_dt
+    mismatch = overlap & ((new["Close_EUR"] - hw_px).abs() > tol * hw_px.abs())
+    after = hw_dt.isna() | (new["Date"] > hw_dt)
+    unverified = set(key[after & hw_dt.notna()]) - set(key[overlap])
+    stale = sorted(set(key[mismatch]) | unverified)
+    return new[after & ~key.isin(stale)].reset_index(drop=True), stale
+
+# ---------- Runs ----------
+def run_full(tickers: List[str], fetch: Fetcher = yf_download, outfile: str = OUTFILE) -> pd.DataFrame:
+    print(f"→ Downloading equities via yfinance: {', '.join(tickers)} …")
+    px_long = fetch(tickers, EQ_START).sort_values(["Ticker", "Date"])
     px_long.to_csv(outfile, index=False)
     print(f"  ✓ {outfile}  ({len(px_long)} rows, {px_long['Ticker'].nunique()} tickers)")
 
+    # Columnar store for the app (memory-mapped, per-ticker batches); CSV stays the fallback
+    try:
+        store = write_price_store(normalize_prices(px_long), store_path_for(outfile))
+        print(f"  ✓ {store}")
+    except ImportError as e:
+        print(f"  ! skipped columnar store: {e}")
+    return px_long
+
+def run_incremental(
+    tickers: List[str],
+    fetch: Fetcher = yf_download,
+    outfile: str = OUTFILE,
+    batch_size: int = BATCH_SIZE,
+    workers: int = WORKERS,
+) -> pd.DataFrame:
+    last = last_stored(outfile)
+    if not last:
+        return run_full(tickers, fetch, outfile)
+    print(f"→ Incremental update for {len(tickers)} tickers …")
+    new, stale = fetch_missing(tickers, last, fetch, batch_size, workers)
+    if stale:
+        print(f"  ! adjusted closes changed for {', '.join(stale)}; re-downloading their history")
+        return _replace_tickers([t for t in tickers if t.upper() in stale], new, fetch, outfile, batch_size, workers)
+    if new.empty:
+        print("  ✓ up to date")
+        return new
+
+    # Append to the CSV (no rewrite); the loader sorts by ticker/date anyway
+    store_path = store_path_for(outfile)
+    store_current = store_path.exists() and store_path.stat().st_mtime >= os.path.getmtime(outfile)
+    new.to_csv(outfile, mode="a", header=False, index=False, date_format="%Y-%m-%d")
+    print(f"  ✓ {outfile}  (+{len(new)} rows, {new['Ticker'].nunique()} tickers)")
+    try:
+        if store_current:
+            append_price_store(store_path, normalize_prices(new))
+        else:
+            write_price_store(normalize_prices(pd.read_csv(outfile)), store_path)
+        print(f"  ✓ {store_path}")
+    except ImportError as e:
+        print(f"  ! skipped columnar store: {e}")
+    return new
+
+def _replace_tickers(
+    stale: List[str],
+    new: pd.DataFrame,
+    fetch: Fetcher,
+    outfile: str,
+    batch_size: int,
+    workers: int,
+) -> pd.DataFrame:
+    """Full history for 'stale' plus the appended rows of the others; CSV and store rewritten."""
+    full = _fetch_jobs(_batches({EQ_START: stale}, batch_size), fetch, workers)
+    old = pd.read_csv(outfile, parse_dates=["Date"])
+    old = old[~old["Ticker"].str.upper().isin([t.upper() for t in stale])]
+    px_long = pd.concat([old, full, new], ignore_index=True).sort_values(["Ticker", "Date"])
+    px_long.to_csv(outfile, index=False, date_format="%Y-%m-%d")
+    print(f"  ✓ {outfile}  ({len(full)} rows re-downloaded, +{len(new)} rows appended)")
+    try:
+        print(f"  ✓ {write_price_store(normalize_prices(px_long), store_path_for(outfile))}")
+    except ImportError as e:
+        print(f"  ! skipped columnar store: {e}")
+    return pd.concat([full, new], ignore_index=True)
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Fetch daily equity closes into data_raw/.")
+    ap.add_argument("--full", action="store_true", help="re-download the full history from EQ_START")
+    ap.add_argument("--tickers", nargs="+", default=TICKERS)
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    args = ap.parse_args(argv)
+    if args.full:
+        run_full(args.tickers)
+    else:
+        run_incremental(args.tickers, batch_size=args.batch_size, workers=args.workers)
+
 if __name__ == "__main__":
     pd.set_option("display.width", 140)
     pd.set_option("display.max_columns", 20)
-    main()
\ No newline at end of file
+    main()
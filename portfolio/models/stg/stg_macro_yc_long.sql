@@ -0,0 +1,40 @@
+{{ config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key=['obs_month', 'maturity']
+) }}
+
+-- One globbed scan over every Zinsstrukturkurve_<m>_Y.csv; maturity comes from the filename
+-- ('05' = 0,5 years). Dropping in another CSV adds a maturity, no model changes needed.
+WITH src AS (
+  SELECT * FROM read_csv('data_raw/Zinsstrukturkurve_*.csv', delim=';', header=false,
+                         filename=true, all_varchar=true)
+),
+filtered AS (
+  SELECT
+    try_strptime(column0, '%Y-%m')                                     AS month_raw,
+    regexp_extract(filename, 'Zinsstrukturkurve_([0-9]+)_Y', 1)        AS maturity_str,
+    replace(column1, ',', '.')                                         AS value_str
+  FROM src
+  WHERE regexp_matches(column0, '^[0-9]{4}-[0-9]{2}$')
+    AND regexp_matches(column1, '^-?[0-9]+([.,][0-9]+)?$')
+),
+typed AS (
+  SELECT
+    month_raw::date                                                    AS obs_month,
+    lower(maturity_str) || 'y'                                         AS maturity,
+    CASE WHEN maturity_str LIKE '0%' THEN maturity_str::DOUBLE / 10
+         ELSE maturity_str::DOUBLE END                                 AS maturity_years,
+    value_str::DOUBLE                                                  AS yield_pct
+  FROM filtered
+  WHERE month_raw IS NOT NULL AND maturity_str <> ''
+)
+SELECT t.*
+FROM typed t
+{% if is_incremental() %}
+-- Only months after the latest loaded month of each maturity (new maturities load in full)
+LEFT JOIN (
+  SELECT maturity, max(obs_month) AS max_month FROM {{ this }} GROUP BY maturity
+) hw ON hw.maturity = t.maturity
+WHERE hw.max_month IS NULL OR t.obs_month > hw.max_month
+{% endif %}